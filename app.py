@@ -1,30 +1,76 @@
 import streamlit as st
 import requests
+import atexit
 import os
+import subprocess
+import sys
 import threading
 import time
-import json
-import csv
-import io
-from uvicorn import Config, Server
-from backend.main import app as fastapi_app
 from utils.ui_helpers import styled_container, render_footer
 
-# Start FastAPI backend in a separate thread
-def run_fastapi():
-    config = Config(
-        app=fastapi_app,
-        host="0.0.0.0",
-        port=8000,
-        log_level="warning"
-    )
-    server = Server(config)
-    server.run()
+# Backend configuration
+BACKEND_HOST = os.getenv("BACKEND_HOST", "0.0.0.0")
+BACKEND_PORT = int(os.getenv("BACKEND_PORT", 8000))
+# 0 runs the backend in a thread of this process; N starts uvicorn with N worker processes
+BACKEND_WORKERS = int(os.getenv("BACKEND_WORKERS", 0))
+BACKEND_START_TIMEOUT = float(os.getenv("BACKEND_START_TIMEOUT", 30))
+# Point at a backend run elsewhere and none is started here
+BACKEND_URL = os.getenv("BACKEND_URL")
 
-threading.Thread(target=run_fastapi, daemon=True).start()
+# Backend base URL and how many items per section the UI shows
+API_URL = BACKEND_URL or f"http://localhost:{BACKEND_PORT}"
+PREVIEW_ITEMS = 10
 
-# Wait for backend to initialize
-time.sleep(2)
+def backend_healthy(timeout: float = 1.0) -> bool:
+    try:
+        return requests.get(f"{API_URL}/health", timeout=timeout).status_code == 200
+    except requests.RequestException:
+        return False
+
+# Streamlit re-runs this script on every interaction; the backend must start only once per process
+@st.cache_resource
+def start_backend() -> dict:
+    backend = {"ready": False, "process": None, "thread": None}
+    if BACKEND_URL or backend_healthy():
+        # Already running, e.g. started by an earlier process on the same port
+        return backend
+    if BACKEND_WORKERS > 0:
+        backend["process"] = subprocess.Popen([
+            sys.executable, "-m", "uvicorn", "backend.main:app",
+            "--host", BACKEND_HOST,
+            "--port", str(BACKEND_PORT),
+            "--workers", str(BACKEND_WORKERS),
+            "--log-level", "warning"
+        ])
+        atexit.register(backend["process"].terminate)
+        return backend
+    
+    def run_fastapi():
+        # Imported here so the first page renders while the backend loads
+        from uvicorn import Config, Server
+        from backend.main import app as fastapi_app
+        Server(Config(app=fastapi_app, host=BACKEND_HOST, port=BACKEND_PORT, log_level="warning")).run()
+    
+    backend["thread"] = threading.Thread(target=run_fastapi, daemon=True, name="backend")
+    backend["thread"].start()
+    return backend
+
+def wait_for_backend(backend: dict, timeout: float = BACKEND_START_TIMEOUT) -> bool:
+    """Readiness probe: poll /health until the backend answers, once per process"""
+    deadline = time.monotonic() + timeout
+    delay = 0.05
+    while not backend["ready"]:
+        backend["ready"] = backend_healthy()
+        if backend["ready"]:
+            break
+        # A backend that failed to start (port taken, import error) won't come up
+        thread, process = backend["thread"], backend["process"]
+        exited = (thread is not None and not thread.is_alive()) or (process is not None and process.poll() is not None)
+        if exited or time.monotonic() >= deadline:
+            return False
+        time.sleep(delay)
+        delay = min(delay * 2, 0.5)
+    return True
 
 # Configure Streamlit page
 st.set_page_config(
@@ -94,38 +140,15 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
-# Function to convert data to selected format
-def convert_to_format(data, format_type):
-    if format_type == "JSON":
-        return json.dumps(data, indent=2), "application/json"
-    elif format_type == "CSV":
-        # Flatten the data for CSV conversion
-        output = io.StringIO()
-        writer = csv.writer(output)
-        
-        # Write headers
-        if "content" in data:
-            for key in data["content"]:
-                if isinstance(data["content"][key], list) and len(data["content"][key]) > 0:
-                    if key == "tables":
-                        # Handle tables specially
-                        for i, table in enumerate(data["content"][key]):
-                            if "json" in table:
-                                writer.writerow([f"Table {i+1}"])
-                                writer.writerow(table["json"][0].keys())
-                                for row in table["json"]:
-                                    writer.writerow(row.values())
-                                writer.writerow([])
-                    else:
-                        writer.writerow([key.upper()])
-                        if len(data["content"][key]) > 0:
-                            writer.writerow(data["content"][key][0].keys())
-                            for item in data["content"][key]:
-                                writer.writerow(item.values())
-                        writer.writerow([])
-        
-        return output.getvalue(), "text/csv"
-    return data, "application/json"
+backend = start_backend()
+
+def fetch_from_api(endpoint, **params):
+    """GET endpoint data already encoded by the backend (?format=, ?limit=...)"""
+    if not wait_for_backend(backend):
+        raise RuntimeError("Backend is not running")
+    response = requests.get(f"{API_URL}{endpoint}", params=params, timeout=120)
+    response.raise_for_status()
+    return response
 
 # Main UI
 def main():
@@ -143,6 +166,10 @@ def main():
     with st.expander("⚙️ Advanced Options"):
         output_format = st.selectbox("Output Format", ["JSON", "CSV"])
         cache_duration = st.slider("Cache Duration (hours)", 1, 72, 24)
+        follow_links = st.checkbox("Follow links on the same site", help="Apply the extraction to every page the crawl reaches")
+        if follow_links:
+            max_pages = st.slider("Maximum Pages", 1, 200, 50)
+            link_pattern = st.text_input("Only follow paths matching", placeholder="/blog/*")
     
     # Action button
     if st.button("✨ Generate API Endpoint", use_container_width=True, type="primary"):
@@ -151,22 +178,26 @@ def main():
         else:
             with st.spinner("🔍 Analyzing website and creating API..."):
                 try:
-                    response = requests.post(
-                        "http://localhost:8000/generate",
-                        json={
-                            "url": url,
-                            "query": query,
-                            "output_format": output_format,
-                            "cache_hours": cache_duration
-                        },
-                        timeout=120
-                    )
+                    if not wait_for_backend(backend):
+                        raise RuntimeError(f"Backend did not become ready within {BACKEND_START_TIMEOUT:.0f}s")
+                    payload = {
+                        "url": url,
+                        "query": query,
+                        "output_format": output_format,
+                        "cache_hours": cache_duration
+                    }
+                    if follow_links:
+                        payload["crawl"] = {"max_pages": max_pages, "pattern": link_pattern or None}
+                    response = requests.post(f"{API_URL}/generate", json=payload, timeout=120)
                     
                     if response.status_code == 200:
                         res = response.json()
                         st.session_state.api_endpoint = res["api_endpoint"]
                         st.session_state.sample_data = res["sample_data"]
+                        st.session_state.counts = res.get("counts", {})
+                        st.session_state.sizes = res.get("bytes", {})
                         st.session_state.output_format = output_format
+                        st.session_state.pop("download", None)
                         st.experimental_rerun()
                     else:
                         st.error(f"Error: {response.json().get('detail', 'Processing failed')}")
@@ -184,23 +215,43 @@ def main():
         </div>
         """, unsafe_allow_html=True)
         
-        # Convert data to selected format
-        formatted_data, mime_type = convert_to_format(st.session_state.sample_data, st.session_state.output_format)
-        
         st.markdown("### Sample Data Preview")
         
-        if st.session_state.output_format == "JSON":
+        # Only the preview lives in the page; the full data stays in the backend
+        summary = [
+            f"**{name}**: {count:,} items, {st.session_state.sizes.get(name, 0) / 1024:,.1f} KiB"
+            for name, count in st.session_state.counts.items()
+        ]
+        if summary:
+            st.caption(" · ".join(summary))
+        
+        fmt = st.session_state.output_format.lower()
+        if fmt == "json":
             st.json(st.session_state.sample_data)
         else:
-            st.text(formatted_data)
+            try:
+                st.text(fetch_from_api(st.session_state.api_endpoint, format=fmt, limit=PREVIEW_ITEMS).text)
+            except Exception as e:
+                st.error(f"Preview failed: {str(e)}")
         
-        # Download button
-        st.download_button(
-            label=f"📥 Download as {st.session_state.output_format}",
-            data=formatted_data,
-            file_name=f"extracted_data.{st.session_state.output_format.lower()}",
-            mime=mime_type
-        )
+        # Download button: the backend's encoded bytes are passed through untouched
+        if "download" not in st.session_state:
+            if st.button(f"📥 Prepare {st.session_state.output_format} download"):
+                with st.spinner("Fetching full data..."):
+                    try:
+                        download = fetch_from_api(st.session_state.api_endpoint, format=fmt, download=True)
+                        st.session_state.download = (download.content, download.headers.get("content-type"))
+                        st.experimental_rerun()
+                    except Exception as e:
+                        st.error(f"Download failed: {str(e)}")
+        else:
+            content, mime_type = st.session_state.download
+            st.download_button(
+                label=f"📥 Download as {st.session_state.output_format}",
+                data=content,
+                file_name=f"extracted_data.{fmt}",
+                mime=mime_type
+            )
         
         st.divider()
         st.markdown("### Try Your API")
@@ -215,24 +266,13 @@ def main():
         if st.button("🔄 Test Endpoint Now", type="secondary", use_container_width=True):
             with st.spinner("Fetching data..."):
                 try:
-                    test_res = requests.get(f"http://localhost:8000{st.session_state.api_endpoint}")
-                    
-                    # Convert response to selected format
-                    test_data = test_res.json()
-                    test_formatted, test_mime = convert_to_format(test_data, st.session_state.output_format)
+                    # A page of the live endpoint, as a client would see it
+                    test_res = fetch_from_api(st.session_state.api_endpoint, format=fmt, limit=PREVIEW_ITEMS)
                     
-                    if st.session_state.output_format == "JSON":
-                        st.json(test_data)
+                    if fmt == "json":
+                        st.json(test_res.json())
                     else:
-                        st.text(test_formatted)
-                        
-                    # Download button for test results
-                    st.download_button(
-                        label=f"📥 Download Test Results as {st.session_state.output_format}",
-                        data=test_formatted,
-                        file_name=f"test_results.{st.session_state.output_format.lower()}",
-                        mime=test_mime
-                    )
+                        st.text(test_res.text)
                 except Exception as e:
                     st.error(f"Test failed: {str(e)}")
     
@@ -1,15 +1,184 @@
-import requests
+from cachetools import TTLCache
+import asyncio
+import copy
+import httpx
 import os
 import json
 import logging
+import re
+
+from .css import InvalidSelector, validate_selector
 
 logger = logging.getLogger("webtapi.ai")
 
 # Configuration
 AI_SERVER_URL = os.getenv("AI_SERVER_URL", "http://localhost:5000")
+PLAN_CACHE_SIZE = int(os.getenv("PLAN_CACHE_SIZE", 2048))
+PLAN_CACHE_TTL = int(os.getenv("PLAN_CACHE_TTL", 3600))
+
+ELEMENT_TYPES = {"text", "images", "tables", "links", "custom"}
+STRUCTURED_FORMATS = {"list", "dict", "table"}
+
+# Strip punctuation but keep characters that can be part of a CSS selector
+_PUNCTUATION = re.compile(r"[^\w\s#.\-\[\]=>:]+|[.:](?!\w)")
+# No single letters: "a", "b", "i", "p" and "q" are also tag names a query may select by
+_STOPWORDS = {
+    "an", "the", "all", "any", "every", "of", "on", "in", "from", "this", "that",
+    "page", "website", "site", "please", "me", "want", "need", "get", "give",
+    "show", "list", "extract", "find", "scrape", "fetch", "grab", "can", "you"
+}
+
+# Rule-based planner vocabulary: word -> plan element, "headlines" or "urls"
+_INTENT_WORDS = {
+    **dict.fromkeys(["link", "links", "hyperlink", "hyperlinks"], "links"),
+    **dict.fromkeys(["url", "urls", "href", "hrefs", "src"], "urls"),
+    **dict.fromkeys(["image", "images", "img", "imgs", "picture", "pictures", "photo", "photos"], "images"),
+    **dict.fromkeys(["table", "tables", "tabular"], "tables"),
+    **dict.fromkeys(["text", "article", "articles", "content", "body", "paragraph", "paragraphs"], "text"),
+    **dict.fromkeys(["headline", "headlines", "heading", "headings", "title", "titles"], "headlines")
+}
+# "a" and "i" stay in cache keys as possible tag names; among planner vocabulary they're just English
+_FILLER_WORDS = {"and", "or", "with", "plus", "also", "their", "its", "data", "main", "latest", "news", "as", "to", "json",
+                 "a", "i"}
+_ELEMENT_ORDER = ("text", "images", "tables", "links")
+_HEADLINE_SELECTORS = ("h1", "h2", "h3")
 
-def parse_query(query: str) -> dict:
+# Validated plans keyed by normalized query
+plan_cache = TTLCache(maxsize=PLAN_CACHE_SIZE, ttl=PLAN_CACHE_TTL)
+plan_counters = {"rules": 0, "hits": 0, "misses": 0, "coalesced": 0, "fallbacks": 0}
+_inflight = {}
+
+# Shared keep-alive connection pool for AI server calls
+_client = None
+
+def get_client() -> httpx.AsyncClient:
+    """Return the pooled HTTP client, creating it on first use"""
+    global _client
+    if _client is None or _client.is_closed:
+        _client = httpx.AsyncClient(
+            timeout=20,
+            limits=httpx.Limits(max_connections=50, max_keepalive_connections=10)
+        )
+    return _client
+
+async def close_client():
+    """Close the pooled HTTP client"""
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+def normalize_query(query: str) -> str:
+    """Reduce a query to the words that affect the plan"""
+    words = _PUNCTUATION.sub(" ", query.lower()).split()
+    return " ".join(w for w in words if w not in _STOPWORDS)
+
+def validate_plan(plan) -> bool:
+    """Check a model-produced plan against the shape the scraper expects"""
+    if not isinstance(plan, dict):
+        return False
+    elements = plan.get("elements")
+    if not isinstance(elements, list) or not elements or not set(elements) <= ELEMENT_TYPES:
+        return False
+    filters = plan.get("filters", {})
+    if not isinstance(filters, dict):
+        return False
+    for key in ("include_selectors", "exclude_selectors"):
+        selectors = filters.get(key, [])
+        if not isinstance(selectors, list) or not all(isinstance(sel, str) for sel in selectors):
+            return False
+    return plan.get("structured_format", "list") in STRUCTURED_FORMATS
+
+def drop_invalid_selectors(plan: dict):
+    """Remove selectors that don't compile, so one bad guess doesn't sink the extraction"""
+    filters = plan.get("filters", {})
+    for key in ("include_selectors", "exclude_selectors"):
+        if key not in filters:
+            continue
+        valid = []
+        for selector in filters[key]:
+            try:
+                validate_selector(selector)
+                valid.append(selector)
+            except InvalidSelector as e:
+                logger.warning(f"Dropping {key[:7]} selector from plan: {str(e)}")
+        filters[key] = valid
+
+def plan_cache_stats() -> dict:
+    lookups = plan_counters["hits"] + plan_counters["coalesced"] + plan_counters["misses"]
+    return {
+        **plan_counters,
+        "entries": len(plan_cache),
+        "hit_ratio": round((lookups - plan_counters["misses"]) / lookups, 4) if lookups else 0.0
+    }
+
+def plan_from_rules(query: str):
+    """Plan common single-vocabulary requests without the model; None if ambiguous"""
+    intents = []
+    for word in normalize_query(query).split():
+        if word in _FILLER_WORDS:
+            continue
+        intent = _INTENT_WORDS.get(word)
+        if intent is None:
+            # Anything we don't recognize (product names, selectors...) needs the model
+            return None
+        if intent not in intents:
+            intents.append(intent)
+    
+    # "image urls" means the images; bare "urls" means the links
+    if "urls" in intents:
+        intents.remove("urls")
+        if not intents:
+            intents.append("links")
+    if not intents:
+        return None
+    
+    elements = [kind for kind in _ELEMENT_ORDER if kind in intents]
+    filters = {}
+    if "headlines" in intents:
+        elements.append("custom")
+        filters["include_selectors"] = list(_HEADLINE_SELECTORS)
+    
+    return {
+        "elements": elements,
+        "filters": filters,
+        "structured_format": "table" if elements == ["tables"] else "list",
+        "source": "rules"
+    }
+
+async def parse_query(query: str) -> dict:
     """Convert natural language to extraction instructions"""
+    plan = plan_from_rules(query)
+    if plan is not None:
+        plan_counters["rules"] += 1
+        return plan
+    
+    key = normalize_query(query)
+    
+    plan = plan_cache.get(key)
+    if plan is not None:
+        plan_counters["hits"] += 1
+        return {**copy.deepcopy(plan), "source": "cache"}
+    
+    # Single-flight: concurrent identical queries share one model call
+    task = _inflight.get(key)
+    if task is not None:
+        plan_counters["coalesced"] += 1
+    else:
+        plan_counters["misses"] += 1
+        task = asyncio.ensure_future(_plan_from_model(query))
+        _inflight[key] = task
+        task.add_done_callback(lambda _: _inflight.pop(key, None))
+    
+    plan, valid = await asyncio.shield(task)
+    if valid:
+        plan_cache[key] = plan
+    else:
+        plan_counters["fallbacks"] += 1
+    return {**copy.deepcopy(plan), "source": "model" if valid else "fallback"}
+
+async def _plan_from_model(query: str):
+    """Ask the AI server for a plan; returns (plan, valid)"""
     # Fallback response
     default_response = {
         "elements": ["text", "images", "links"],
@@ -19,7 +188,7 @@ def parse_query(query: str) -> dict:
     
     if not AI_SERVER_URL:
         logger.warning("AI server URL not configured, using default extraction")
-        return default_response
+        return default_response, False
     
     prompt = f"""
     Convert this website extraction request to structured instructions:
@@ -43,7 +212,7 @@ def parse_query(query: str) -> dict:
     """
     
     try:
-        response = requests.post(
+        response = await get_client().post(
             f"{AI_SERVER_URL}/api/v1/generate",
             json={
                 "prompt": prompt,
@@ -51,13 +220,12 @@ def parse_query(query: str) -> dict:
                 "temperature": 0.2,
                 "stop": ["###", "\n\n"],
                 "do_sample": False
-            },
-            timeout=20
+            }
         )
         
         if response.status_code != 200:
             logger.error(f"AI server error: {response.text}")
-            return default_response
+            return default_response, False
         
         # Extract JSON from response
         result_text = response.json()["results"][0]["text"].strip()
@@ -66,14 +234,20 @@ def parse_query(query: str) -> dict:
         try:
             json_start = result_text.find("{")
             json_end = result_text.rfind("}") + 1
-            return json.loads(result_text[json_start:json_end])
+            plan = json.loads(result_text[json_start:json_end])
         except json.JSONDecodeError:
             logger.error("Failed to parse AI response as JSON")
-            return default_response
+            return default_response, False
         
-    except requests.exceptions.Timeout:
+        if not validate_plan(plan):
+            logger.error("AI response is not a valid extraction plan")
+            return default_response, False
+        drop_invalid_selectors(plan)
+        return plan, True
+    
+    except httpx.TimeoutException:
         logger.warning("AI server timed out")
-        return default_response
+        return default_response, False
     except Exception as e:
         logger.error(f"AI processing failed: {str(e)}")
-        return default_response
\ No newline at end of file
+        return default_response, False
\ No newline at end of file
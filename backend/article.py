@@ -0,0 +1,170 @@
+from functools import lru_cache
+import lxml.html
+import logging
+import os
+import re
+from .metrics import stage
+
+logger = logging.getLogger("webtapi.article")
+
+# Configuration
+# "fast" scores the shared tree and falls back to readability when unsure; "readability" always uses it
+ARTICLE_EXTRACTOR = os.getenv("ARTICLE_EXTRACTOR", "fast").lower()
+# Share of the page's prose the chosen content must hold for the fast result to be used
+ARTICLE_MIN_CONFIDENCE = float(os.getenv("ARTICLE_MIN_CONFIDENCE", 0.6))
+ARTICLE_MIN_CHARS = int(os.getenv("ARTICLE_MIN_CHARS", 250))
+
+_BLOCKS = {"p", "pre", "blockquote"}
+_HEADINGS = {"h1", "h2", "h3", "h4", "h5", "h6"}
+# Never part of the main content
+_SKIP_TAGS = {"script", "style", "noscript", "template", "nav", "header", "footer", "aside", "form",
+              "button", "select", "textarea", "iframe", "svg"}
+_CONTAINERS = {"div", "section", "ul", "ol", "table", "span"}
+_UNLIKELY = re.compile(r"comment|sidebar|footer|menu|nav|share|social|promo|related|sponsor|advert|banner|popup|cookie", re.I)
+_LIKELY = re.compile(r"article|body|content|entry|main|post|story|text", re.I)
+_WHITESPACE = re.compile(r"\s+")
+
+def _text(el) -> str:
+    return _WHITESPACE.sub(" ", el.text_content()).strip()
+
+def _link_chars(el) -> int:
+    return sum(len(_text(a)) for a in el.iter("a"))
+
+# Pages repeat the same few class names thousands of times
+@lru_cache(maxsize=4096)
+def _hint(names: str) -> int:
+    """+1 for class/id names that suggest content, -1 for boilerplate, 0 otherwise"""
+    if _LIKELY.search(names):
+        return 1
+    return -1 if _UNLIKELY.search(names) else 0
+
+def _names(el) -> str:
+    return f"{el.get('class', '')} {el.get('id', '')}"
+
+def _class_weight(el) -> float:
+    weight = 1.5 if el.tag in ("article", "main") else 1.0
+    return weight * 1.25 if _hint(_names(el)) > 0 else weight
+
+def _excluded(tree) -> set:
+    """Blocks and headings under navigation, sidebars, comments and the like"""
+    excluded = set()
+    for el in tree.iter(*_SKIP_TAGS, *_CONTAINERS):
+        if el in excluded:
+            continue
+        if el.tag in _CONTAINERS and _hint(_names(el)) >= 0:
+            continue
+        excluded.update(el.iter("br", *_BLOCKS, *_HEADINGS, *_SKIP_TAGS, *_CONTAINERS))
+    return excluded
+
+def main_content(tree) -> dict:
+    """Headings and paragraphs of the page's main text, scored in one pass over its blocks.
+    
+    Each paragraph credits its parent with its text length (its grandparent
+    with half) discounted by its share of link text; the best-scoring
+    container, plus sibling containers scoring at least a fifth as much, is
+    the article. Text following a <br> outside any paragraph counts as one,
+    for pages that separate paragraphs with line breaks. `confidence` is
+    the share of the page's prose (`prose` characters in paragraphs that
+    aren't mostly links) it holds.
+    """
+    excluded = _excluded(tree)
+    blocks = []
+    scores = {}
+    for el in tree.iter("br", *_BLOCKS, *_HEADINGS):
+        parent = el.getparent()
+        # Text of nested blocks is already counted with the outer one
+        if el in excluded or parent is None or parent.tag in _BLOCKS:
+            continue
+        text = _text(el) if el.tag != "br" else _WHITESPACE.sub(" ", el.tail or "").strip()
+        if not text:
+            continue
+        if el.tag in _HEADINGS:
+            blocks.append((el, text, "heading", 0.0))
+            continue
+        link_ratio = min(1.0, _link_chars(el) / len(text)) if el.tag != "br" else 0.0
+        blocks.append((el, text, "paragraph", link_ratio))
+        score = (1 + text.count(",") + min(len(text) / 100, 3)) * len(text) / 100 * (1 - link_ratio)
+        scores[parent] = scores.get(parent, 0.0) + score
+        grandparent = parent.getparent()
+        if grandparent is not None:
+            scores[grandparent] = scores.get(grandparent, 0.0) + score / 2
+    
+    prose = sum(len(text) for _, text, kind, link_ratio in blocks if kind == "paragraph" and link_ratio < 0.5)
+    if not scores or not prose:
+        return {"headings": [], "paragraphs": [], "prose": prose, "confidence": 0.0}
+    
+    weighted = {el: score * _class_weight(el) for el, score in scores.items()}
+    top = max(weighted, key=weighted.get)
+    chosen = {top}
+    parent = top.getparent()
+    if parent is not None:
+        chosen.update(sibling for sibling in parent if weighted.get(sibling, 0.0) >= weighted[top] / 5)
+    
+    inside = {el for container in chosen for el in container.iter("br", *_BLOCKS, *_HEADINGS)}
+    headings = []
+    paragraphs = []
+    for el, text, kind, link_ratio in blocks:
+        if el not in inside:
+            continue
+        if kind == "heading":
+            headings.append(text)
+        elif link_ratio < 0.5:
+            paragraphs.append(text)
+    confidence = sum(len(text) for text in paragraphs) / prose
+    return {"headings": headings, "paragraphs": paragraphs, "prose": prose, "confidence": round(confidence, 3)}
+
+# readability is imported on first use, and only needed when the fast path is unsure
+@lru_cache(maxsize=None)
+def tree_document():
+    import readability
+    from readability.cleaners import html_cleaner
+    
+    class TreeDocument(readability.Document):
+        """readability Document that scores a copy of an already-parsed tree"""
+        
+        def _parse(self, input):
+            # The cleaner deep-copies element input, so the shared tree is untouched
+            doc = html_cleaner.clean_html(input)
+            doc.resolve_base_href(handle_failures=self.handle_failures)
+            return doc
+    
+    return TreeDocument
+
+def _title(tree) -> str:
+    from readability.htmls import get_title
+    return get_title(tree)
+
+def readability_article(tree) -> dict:
+    """readability's summary as headings and paragraphs"""
+    summary = lxml.html.fromstring(tree_document()(tree).summary())
+    headings = []
+    paragraphs = []
+    for el in summary.iter(*_HEADINGS, *_BLOCKS):
+        text = _text(el)
+        if text:
+            (headings if el.tag in _HEADINGS else paragraphs).append(text)
+    return {"headings": headings, "paragraphs": paragraphs}
+
+def extract_article(tree, published: str) -> dict:
+    """Main text of the page: title, publication date, headings and plain-text paragraphs"""
+    if ARTICLE_EXTRACTOR == "readability":
+        # The HTML summary articles were served as before the fast path
+        with stage("parse.article.readability"):
+            return {"title": _title(tree), "content": tree_document()(tree).summary()}
+    
+    with stage("parse.article.fast"):
+        article = main_content(tree)
+    extractor = "fast"
+    # Pages with hardly any prose aren't articles, and readability won't find one either
+    if article["prose"] >= ARTICLE_MIN_CHARS and article["confidence"] < ARTICLE_MIN_CONFIDENCE:
+        logger.debug(f"Main content confidence {article['confidence']}; falling back to readability")
+        with stage("parse.article.readability"):
+            article = readability_article(tree)
+        extractor = "readability"
+    return {
+        "title": _title(tree),
+        "published": published,
+        "headings": article["headings"],
+        "paragraphs": article["paragraphs"],
+        "extractor": extractor
+    }
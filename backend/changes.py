@@ -0,0 +1,127 @@
+from cachetools import LRUCache
+import hashlib
+import json
+import logging
+import os
+from .records import encode_record
+from .tables import table_rows
+
+logger = logging.getLogger("webtapi.changes")
+
+# Configuration
+# Item hashes kept in memory, summed over all cached sections
+ITEM_HASH_CACHE_ITEMS = int(os.getenv("ITEM_HASH_CACHE_ITEMS", 1_000_000))
+
+class VersionGone(Exception):
+    """The requested version is older than the endpoint's kept history"""
+
+def items(name: str, value) -> list:
+    """The units a section changes by: list entries, table rows, or the whole section"""
+    if name == "tables":
+        return [
+            {"table_index": table.get("table_index"), "row": dict(zip(table["columns"], row))}
+            for table in value for row in table_rows(table)
+        ]
+    return value if isinstance(value, list) else [value]
+
+def item_hash(item) -> str:
+    body = json.dumps(item, separators=(",", ":"), default=encode_record).encode("utf-8")
+    return hashlib.blake2b(body, digest_size=8).hexdigest()
+
+def etag(meta: dict, sections: list, variant: list):
+    """Strong ETag for a representation of `sections` (all if None).
+    
+    Sections are content-addressed, so their digests plus the page metadata
+    and whatever shapes the response (format, projection, paging) identify
+    the body exactly.
+    """
+    digests = meta["digests"]
+    names = sorted(digests) if sections is None else sorted(set(sections))
+    parts = [[(name, digests.get(name)) for name in names], meta.get("metadata"), variant]
+    key = json.dumps(parts, separators=(",", ":"), sort_keys=True)
+    return '"' + hashlib.sha256(key.encode("utf-8")).hexdigest()[:32] + '"'
+
+def etag_matches(if_none_match: str, tag: str) -> bool:
+    """If-None-Match uses weak comparison, so W/ prefixes are ignored"""
+    if if_none_match.strip() == "*":
+        return True
+    candidates = (candidate.strip() for candidate in if_none_match.split(","))
+    return any(candidate.removeprefix("W/") == tag for candidate in candidates)
+
+class ChangeFeed:
+    """Added and removed items between two versions of an endpoint.
+    
+    Sections whose digest didn't change are skipped without being read.
+    Changed ones are compared by item hash, and the hash lists are cached
+    per section digest, so clients polling the same endpoint share the work.
+    """
+    
+    def __init__(self, store, cache_items: int = ITEM_HASH_CACHE_ITEMS):
+        self.store = store
+        self._hashes = LRUCache(maxsize=cache_items, getsizeof=len)
+        self.counters = {"diffs": 0, "unchanged": 0, "gone": 0, "hash_hits": 0, "hash_misses": 0}
+    
+    def changes(self, meta: dict, since: int, sections: list = None) -> dict:
+        """Changes from version `since` to the endpoint's current `meta`.
+        
+        Raises VersionGone when `since` is no longer (or never was) kept.
+        """
+        version = meta.get("version", 1)
+        if since == version:
+            old = meta["digests"]
+        else:
+            entry = next((entry for entry in meta.get("history", []) if entry["version"] == since), None)
+            if entry is None:
+                self.counters["gone"] += 1
+                raise VersionGone(f"Version {since} is not available; the current version is {version}")
+            old = entry["digests"]
+        new = meta["digests"]
+        
+        names = [name for name in sorted(set(old) | set(new)) if sections is None or name in sections]
+        changed = {}
+        for name in names:
+            if old.get(name) == new.get(name):
+                continue
+            changed[name] = self._diff(name, old.get(name), new.get(name))
+        self.counters["diffs" if changed else "unchanged"] += 1
+        return {"since": since, "version": version, "changed": bool(changed), "sections": changed}
+    
+    def _diff(self, name: str, old: str, new: str) -> dict:
+        values = {}
+        old_hashes, new_hashes = self._item_hashes(name, old, values), self._item_hashes(name, new, values)
+        result = {}
+        sides = (("added", new, new_hashes, set(old_hashes)), ("removed", old, old_hashes, set(new_hashes)))
+        for key, digest, hashes, other in sides:
+            positions = [i for i, value in enumerate(hashes) if value not in other]
+            if positions:
+                section = items(name, values[digest] if digest in values else self._load(digest))
+                result[key] = [{"hash": hashes[i], "item": section[i]} for i in positions]
+            else:
+                result[key] = []
+        return result
+    
+    def _item_hashes(self, name: str, digest: str, values: dict) -> list:
+        if digest is None:
+            return []
+        # Keyed by name as well, since table sections hash per row
+        hashes = self._hashes.get((name, digest))
+        if hashes is not None:
+            self.counters["hash_hits"] += 1
+            return hashes
+        self.counters["hash_misses"] += 1
+        values[digest] = self._load(digest)
+        hashes = [item_hash(item) for item in items(name, values[digest])]
+        if len(hashes) <= self._hashes.maxsize:
+            self._hashes[name, digest] = hashes
+        return hashes
+    
+    def _load(self, digest: str):
+        value = self.store.load_payloads([digest]).get(digest)
+        if value is None:
+            # The blob expired with an older endpoint that shared it
+            self.counters["gone"] += 1
+            raise VersionGone("That version's content has expired")
+        return value
+    
+    def stats(self) -> dict:
+        return {**self.counters, "cached_hashes": self._hashes.currsize}
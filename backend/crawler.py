@@ -0,0 +1,373 @@
+from fnmatch import fnmatchcase
+from urllib.parse import urljoin, urlsplit
+import asyncio
+import hashlib
+import heapq
+import logging
+import math
+import os
+import zlib
+from lxml import etree
+from .fetch_cache import normalize_url
+from .scraper import extract_data, get_client, scheduler, robots
+from .security import validate_url
+from .metrics import stage
+
+logger = logging.getLogger("webtapi.crawler")
+
+# Configuration
+CRAWL_MAX_PAGES = int(os.getenv("CRAWL_MAX_PAGES", 500))
+CRAWL_MAX_DEPTH = int(os.getenv("CRAWL_MAX_DEPTH", 5))
+CRAWL_DEFAULT_PAGES = int(os.getenv("CRAWL_DEFAULT_PAGES", 50))
+CRAWL_DEFAULT_DEPTH = int(os.getenv("CRAWL_DEFAULT_DEPTH", 2))
+# Pages fetched at once per crawl; the host scheduler still applies its own per-host limit
+CRAWL_CONCURRENCY = int(os.getenv("CRAWL_CONCURRENCY", 4))
+# URLs remembered exactly before the visited set switches to a Bloom filter
+CRAWL_EXACT_URLS = int(os.getenv("CRAWL_EXACT_URLS", 100_000))
+CRAWL_BLOOM_CAPACITY = int(os.getenv("CRAWL_BLOOM_CAPACITY", 5_000_000))
+CRAWL_BLOOM_ERROR = float(os.getenv("CRAWL_BLOOM_ERROR", 0.001))
+CRAWL_SITEMAP_MAX_BYTES = int(os.getenv("CRAWL_SITEMAP_MAX_BYTES", 10 * 1024 * 1024))
+CRAWL_SITEMAP_MAX_FILES = int(os.getenv("CRAWL_SITEMAP_MAX_FILES", 10))
+
+# Links to these are never HTML pages; don't spend a request finding that out
+_SKIP_EXTENSIONS = (
+    ".jpg", ".jpeg", ".png", ".gif", ".webp", ".svg", ".ico", ".pdf", ".zip", ".gz", ".mp3", ".mp4",
+    ".avi", ".mov", ".css", ".js", ".xml", ".json", ".rss", ".doc", ".docx", ".xls", ".xlsx"
+)
+_SITEMAP_PARSER = etree.XMLParser(resolve_entities=False, no_network=True, recover=True)
+
+class BloomFilter:
+    """Fixed-size set membership with false positives at about `error` once `capacity` items are in"""
+    
+    def __init__(self, capacity: int, error: float):
+        self.size = max(8, int(-capacity * math.log(error) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+    
+    def _positions(self, key: int):
+        # Double hashing over the two halves of one 64-bit hash
+        first, second = key & 0xFFFFFFFF, (key >> 32) | 1
+        return ((first + i * second) % self.size for i in range(self.hashes))
+    
+    def add(self, key: int):
+        for position in self._positions(key):
+            self.bits[position >> 3] |= 1 << (position & 7)
+    
+    def __contains__(self, key: int) -> bool:
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(key))
+
+class VisitedURLs:
+    """URLs a crawl has already queued, by a 64-bit hash of their normalized form.
+    
+    Hashes are kept in a set up to `exact` URLs, then moved into a Bloom
+    filter whose size doesn't grow with the crawl; a false positive only
+    means one page is skipped.
+    """
+    
+    def __init__(self, exact: int = CRAWL_EXACT_URLS, capacity: int = CRAWL_BLOOM_CAPACITY,
+                 error: float = CRAWL_BLOOM_ERROR):
+        self.exact = exact
+        self.capacity = capacity
+        self.error = error
+        self._hashes = set()
+        self._bloom = None
+        self.count = 0
+    
+    @staticmethod
+    def _key(url: str) -> int:
+        return int.from_bytes(hashlib.blake2b(normalize_url(url).encode("utf-8"), digest_size=8).digest(), "big")
+    
+    def add(self, url: str) -> bool:
+        """Remember `url`; False if it was already there"""
+        key = self._key(url)
+        if key in (self._hashes if self._bloom is None else self._bloom):
+            return False
+        if self._bloom is None and len(self._hashes) >= self.exact:
+            self._bloom = BloomFilter(self.capacity, self.error)
+            for old in self._hashes:
+                self._bloom.add(old)
+            self._hashes = None
+        if self._bloom is None:
+            self._hashes.add(key)
+        else:
+            self._bloom.add(key)
+        self.count += 1
+        return True
+    
+    def __contains__(self, url: str) -> bool:
+        key = self._key(url)
+        return key in (self._hashes if self._bloom is None else self._bloom)
+    
+    @property
+    def bloom(self) -> bool:
+        return self._bloom is not None
+
+class Frontier:
+    """Pages waiting to be fetched: shallowest first, then by sitemap priority, then in discovery order"""
+    
+    def __init__(self):
+        self._heap = []
+        self._order = 0
+    
+    def push(self, url: str, depth: int, priority: float = 0.5):
+        self._order += 1
+        heapq.heappush(self._heap, (depth, -priority, self._order, url))
+    
+    def pop(self):
+        """(url, depth) of the next page"""
+        depth, _, _, url = heapq.heappop(self._heap)
+        return url, depth
+    
+    def __len__(self) -> int:
+        return len(self._heap)
+
+def crawl_options(value) -> dict:
+    """Validated crawl settings from a /generate request's "crawl" field (True for the defaults).
+    
+    Raises ValueError for anything malformed.
+    """
+    if value is True:
+        value = {}
+    if not isinstance(value, dict):
+        raise ValueError("crawl must be true or an object")
+    try:
+        max_pages = int(value.get("max_pages", CRAWL_DEFAULT_PAGES))
+        max_depth = int(value.get("max_depth", CRAWL_DEFAULT_DEPTH))
+    except (TypeError, ValueError):
+        raise ValueError("crawl.max_pages and crawl.max_depth must be integers")
+    if not 1 <= max_pages <= CRAWL_MAX_PAGES:
+        raise ValueError(f"crawl.max_pages must be between 1 and {CRAWL_MAX_PAGES}")
+    if not 0 <= max_depth <= CRAWL_MAX_DEPTH:
+        raise ValueError(f"crawl.max_depth must be between 0 and {CRAWL_MAX_DEPTH}")
+    pattern = value.get("pattern")
+    if pattern is not None and (not isinstance(pattern, str) or not pattern.startswith("/")):
+        raise ValueError("crawl.pattern must be a path pattern such as /blog/*")
+    return {"max_pages": max_pages, "max_depth": max_depth, "pattern": pattern, "sitemap": bool(value.get("sitemap", False))}
+
+def _site(url: str) -> str:
+    host = urlsplit(url).hostname or ""
+    return host[4:] if host.startswith("www.") else host
+
+def _followable(url: str, site: str, pattern: str) -> bool:
+    parts = urlsplit(url)
+    if parts.scheme not in ("http", "https") or _site(url) != site:
+        return False
+    path = parts.path or "/"
+    if path.lower().endswith(_SKIP_EXTENSIONS):
+        return False
+    # Glob rather than regex: patterns come from clients and are matched against every link
+    target = f"{path}?{parts.query}" if parts.query else path
+    return pattern is None or fnmatchcase(target, pattern) or fnmatchcase(path, pattern)
+
+async def _fetch_sitemap(url: str) -> bytes:
+    async with scheduler.slot(url) as observe:
+        async with get_client().stream("GET", url) as response:
+            observe(response.status_code, response.headers)
+            response.raise_for_status()
+            chunks = []
+            received = 0
+            async for chunk in response.aiter_bytes():
+                received += len(chunk)
+                if received > CRAWL_SITEMAP_MAX_BYTES:
+                    raise ValueError(f"Sitemap is larger than {CRAWL_SITEMAP_MAX_BYTES} bytes")
+                chunks.append(chunk)
+    body = b"".join(chunks)
+    if body[:2] == b"\x1f\x8b":
+        # Bounded, so a small .xml.gz can't expand without limit
+        body = zlib.decompressobj(16 + zlib.MAX_WBITS).decompress(body, CRAWL_SITEMAP_MAX_BYTES)
+    return body
+
+async def sitemap_urls(url: str) -> list:
+    """(url, priority) pairs from the site's sitemaps: those robots.txt names, else /sitemap.xml.
+    
+    Sitemap indexes are followed up to CRAWL_SITEMAP_MAX_FILES files in all.
+    """
+    parts = urlsplit(url)
+    origin = f"{parts.scheme}://{parts.netloc}"
+    try:
+        listed = (await robots.rules(url)).site_maps() or []
+    except Exception:
+        listed = []
+    pending = [entry for entry in listed if _site(entry) == _site(url)] or [origin + "/sitemap.xml"]
+    seen = set()
+    found = []
+    while pending and len(seen) < CRAWL_SITEMAP_MAX_FILES:
+        sitemap = pending.pop(0)
+        if sitemap in seen:
+            continue
+        seen.add(sitemap)
+        try:
+            root = etree.fromstring(await _fetch_sitemap(sitemap), _SITEMAP_PARSER)
+        except Exception as e:
+            logger.info(f"Sitemap {sitemap} unavailable: {str(e)}")
+            continue
+        if root is None:
+            continue
+        for entry in root.iter("{*}sitemap"):
+            loc = entry.findtext("{*}loc")
+            if loc and _site(loc.strip()) == _site(url):
+                pending.append(loc.strip())
+        for entry in root.iter("{*}url"):
+            loc = entry.findtext("{*}loc")
+            if not loc:
+                continue
+            try:
+                priority = float(entry.findtext("{*}priority") or 0.5)
+            except ValueError:
+                priority = 0.5
+            found.append((urljoin(sitemap, loc.strip()), priority))
+    return found
+
+def _aggregate(url: str, pages: list, options: dict, visited: VisitedURLs, rejected: int) -> dict:
+    """One endpoint's data from the crawled pages, taken in order.
+    
+    List sections are concatenated, per-page objects (the article) become
+    a list with each page's URL, and table indexes are renumbered across
+    the crawl. `pages` lists every page, failed ones too, with how many
+    items of each section it added.
+    """
+    content = {}
+    index = []
+    tables = 0
+    for page_url, depth, data, error in pages:
+        if error is not None:
+            index.append({"url": page_url, "depth": depth, "error": error})
+            continue
+        counts = {}
+        for name, value in data["content"].items():
+            if name == "tables":
+                value = [{**table, "table_index": tables + i} for i, table in enumerate(value)]
+                tables += len(value)
+            if isinstance(value, list):
+                counts[name] = len(value)
+                content.setdefault(name, []).extend(value)
+            else:
+                # e.g. "article" becomes "articles"
+                counts[name + "s"] = 1
+                content.setdefault(name + "s", []).append({"url": page_url, **value})
+        index.append({
+            "url": page_url,
+            "depth": depth,
+            "status_code": data["metadata"].get("status_code"),
+            "timestamp": data["metadata"].get("timestamp"),
+            "counts": counts
+        })
+    first = next((data for _, _, data, error in pages if error is None), None)
+    return {
+        "metadata": {
+            "url": url,
+            "timestamp": first["metadata"].get("timestamp") if first else "Unknown",
+            "status_code": first["metadata"].get("status_code") if first else None,
+            "crawl": {
+                **options,
+                "pages": sum(1 for *_, error in pages if error is None),
+                "failed": sum(1 for *_, error in pages if error is not None),
+                "discovered": visited.count,
+                "rejected": rejected
+            }
+        },
+        "content": {"pages": index, **content}
+    }
+
+async def crawl(url: str, plan: dict) -> dict:
+    """Apply `plan` to `url` and the same-site pages reachable from it, as one endpoint's data.
+    
+    The crawl settings are `plan["crawl"]` (see crawl_options). Pages are
+    the seed, plus the sitemap's URLs when asked, plus links followed up
+    to `max_depth` hops whose path matches `pattern`, until `max_pages`
+    have been fetched. Discovered URLs pass validate_url before they are
+    queued, and every fetch goes through fetch_page, so the fetch cache,
+    robots.txt and the per-host scheduler apply as for single pages.
+    Raises the seed's error if no page could be extracted.
+    """
+    options = crawl_options(plan["crawl"])
+    # Links are needed to find the next pages, whether or not the plan asked for them
+    page_plan = {key: value for key, value in plan.items() if key != "crawl"}
+    elements = list(page_plan.get("elements", []))
+    keep_links = "links" in elements
+    if not keep_links:
+        page_plan["elements"] = elements + ["links"]
+    
+    site = _site(url)
+    visited = VisitedURLs()
+    frontier = Frontier()
+    rejected = 0
+    
+    async def enqueue(page_url: str, depth: int, priority: float = 0.5):
+        nonlocal rejected
+        if not _followable(page_url, site, options["pattern"]) or not visited.add(page_url):
+            return
+        # Discovered URLs get the same security checks /generate gave the seed
+        if not await validate_url(page_url):
+            rejected += 1
+            return
+        frontier.push(page_url, depth, priority)
+    
+    visited.add(url)
+    frontier.push(url, 0, 1.0)
+    if options["sitemap"]:
+        with stage("crawl.sitemap"):
+            # Highest priority first, so the bound below keeps the entries the crawl would fetch first
+            entries = sorted(await sitemap_urls(url), key=lambda entry: -entry[1])
+            for entry, priority in entries:
+                # The same bound as for links: twice the page budget is plenty to choose from
+                if len(frontier) >= 2 * options["max_pages"]:
+                    break
+                await enqueue(entry, 0, priority)
+    
+    pages = []
+    first_error = None
+    started = 0
+    wakeup = asyncio.Event()
+    active = 0
+    
+    async def fetch(page_url: str, depth: int):
+        nonlocal first_error
+        try:
+            data = await extract_data(page_url, page_plan)
+        except Exception as e:
+            if first_error is None:
+                first_error = e
+            pages.append((page_url, depth, None, str(e)))
+            return
+        links = data["content"].get("links", []) if keep_links else data["content"].pop("links", [])
+        if depth < options["max_depth"]:
+            for link in links:
+                href = link.href.split("#", 1)[0]
+                # Stop queueing once the frontier alone would fill the page budget twice over
+                if len(frontier) >= 2 * (options["max_pages"] - started):
+                    break
+                await enqueue(href, depth + 1)
+        pages.append((page_url, depth, data, None))
+    
+    async def worker():
+        nonlocal started, active
+        while True:
+            while not frontier and active:
+                wakeup.clear()
+                await wakeup.wait()
+            if not frontier or started >= options["max_pages"]:
+                wakeup.set()
+                return
+            page_url, depth = frontier.pop()
+            started += 1
+            active += 1
+            try:
+                await fetch(page_url, depth)
+            finally:
+                active -= 1
+                wakeup.set()
+    
+    with stage("crawl"):
+        await asyncio.gather(*(worker() for _ in range(max(1, CRAWL_CONCURRENCY))))
+    if not any(error is None for *_, error in pages) and first_error is not None:
+        raise first_error
+    # Completion order varies from run to run; the seed first, then by depth and URL doesn't
+    pages.sort(key=lambda page: (page[1], page[0] != url, page[0]))
+    return _aggregate(url, pages, options, visited, rejected)
+
+async def extract_endpoint(url: str, plan: dict) -> dict:
+    """Data for an endpoint's plan: a crawl when it has crawl settings, a single page otherwise"""
+    if plan.get("crawl"):
+        return await crawl(url, plan)
+    return await extract_data(url, plan)
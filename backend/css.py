@@ -0,0 +1,150 @@
+from cssselect import HTMLTranslator, SelectorError, parse
+from cssselect.parser import CombinedSelector
+from functools import lru_cache
+from lxml import etree
+import logging
+import os
+
+logger = logging.getLogger("webtapi.css")
+
+# Configuration
+SELECTOR_CACHE_SIZE = int(os.getenv("SELECTOR_CACHE_SIZE", 1024))
+MAX_SELECTOR_LENGTH = int(os.getenv("MAX_SELECTOR_LENGTH", 512))
+
+# How to step from an element to the one a combinator's left side must match
+_COMBINATOR_AXES = {
+    " ": "ancestor",
+    ">": "parent",
+    "+": "preceding-sibling::*[1]/self",
+    "~": "preceding-sibling"
+}
+
+_translator = HTMLTranslator()
+
+class InvalidSelector(ValueError):
+    """A CSS selector the engine can't compile"""
+
+def _step(tree, axis: str) -> str:
+    if isinstance(tree, CombinedSelector):
+        # The right-most compound is tested on the element, the rest as predicates
+        return f"{_step(tree.subselector, axis)}[{_step(tree.selector, _COMBINATOR_AXES[tree.combinator])}]"
+    expr = _translator.xpath(tree)
+    step = f"{axis}::{expr.element}"
+    return f"{step}[{expr.condition}]" if expr.condition else step
+
+def _compounds(tree):
+    """(combinator, compound) pairs from right to left, excluding the right-most compound"""
+    while isinstance(tree, CombinedSelector):
+        left = tree.selector
+        yield tree.combinator, left.subselector if isinstance(left, CombinedSelector) else left
+        tree = left
+
+def _parse(css: str):
+    if not isinstance(css, str) or not css.strip():
+        raise InvalidSelector("Empty selector")
+    if len(css) > MAX_SELECTOR_LENGTH:
+        raise InvalidSelector(f"Selector is longer than {MAX_SELECTOR_LENGTH} characters")
+    try:
+        selectors = parse(css)
+    except SelectorError as e:
+        raise InvalidSelector(f"Invalid selector {css!r}: {str(e)}")
+    if any(selector.pseudo_element for selector in selectors):
+        raise InvalidSelector(f"Pseudo-elements are not supported: {css!r}")
+    return selectors
+
+def self_match_xpath(css: str) -> str:
+    """XPath that is non-empty when the context element matches `css`.
+    
+    Unlike cssselect's own translation, which finds matches below a root,
+    this tests a single element against its ancestors and earlier siblings.
+    """
+    try:
+        return " | ".join(_step(selector.parsed_tree, "self") for selector in _parse(css))
+    except SelectorError as e:
+        raise InvalidSelector(f"Invalid selector {css!r}: {str(e)}")
+
+def _document_path(selector, exclude: str) -> str:
+    tree = selector.parsed_tree
+    compounds = list(_compounds(tree))
+    if any(combinator in " ~" for combinator, _ in compounds):
+        # cssselect walks descendant combinators top-down, which multiplies on
+        # deeply nested pages; test each candidate's ancestors instead, but only
+        # once every compound on the left is known to occur somewhere at all
+        present = " and ".join(_step(compound, "descendant-or-self") for _, compound in compounds)
+        path = f"self::node()[{present}]/{_step(tree, 'descendant-or-self')}"
+    else:
+        path = _translator.selector_to_xpath(selector, prefix="descendant-or-self::")
+    # Matches inside an excluded subtree are dropped as part of the same query
+    return f"{path}[not(ancestor-or-self::*[{exclude}])]" if exclude else path
+
+@lru_cache(maxsize=SELECTOR_CACHE_SIZE)
+def compile_match(css: str) -> etree.XPath:
+    """Cached XPath testing whether the context element matches `css`"""
+    try:
+        return etree.XPath(self_match_xpath(css))
+    except etree.XPathError as e:
+        raise InvalidSelector(f"Invalid selector {css!r}: {str(e)}")
+
+@lru_cache(maxsize=SELECTOR_CACHE_SIZE)
+def _compile_select(css: str, exclude: str) -> etree.XPath:
+    try:
+        return etree.XPath(" | ".join(_document_path(selector, exclude) for selector in _parse(css)))
+    except (SelectorError, etree.XPathError) as e:
+        raise InvalidSelector(f"Invalid selector {css!r}: {str(e)}")
+
+def validate_selector(css: str):
+    """Raise InvalidSelector unless `css` compiles"""
+    compile_match(css)
+
+class SelectorSet:
+    """A plan's include and exclude selectors, compiled once.
+    
+    Invalid selectors are logged and skipped. Each include selector is one
+    native lxml query in document order; excluded subtrees are filtered out
+    inside that query.
+    """
+    
+    def __init__(self, include: tuple, exclude: tuple):
+        conditions = []
+        for css in exclude:
+            try:
+                conditions.append(self_match_xpath(css))
+                compile_match(css)
+            except InvalidSelector as e:
+                logger.warning(f"Skipping exclude selector: {str(e)}")
+        self.exclude = " or ".join(f"({condition})" for condition in conditions)
+        self.include = []
+        for css in include:
+            try:
+                self.include.append((css, _compile_select(css, self.exclude)))
+            except InvalidSelector as e:
+                logger.warning(f"Skipping include selector: {str(e)}")
+        self._excluded = etree.XPath(f"descendant-or-self::*[ancestor-or-self::*[{self.exclude}]]") if self.exclude else None
+    
+    def select(self, tree):
+        """(selector, matching elements) per include selector"""
+        for css, query in self.include:
+            yield css, query(tree)
+    
+    def excluded(self, tree) -> set:
+        """Every element inside an excluded subtree"""
+        return set(self._excluded(tree)) if self._excluded is not None else set()
+
+@lru_cache(maxsize=SELECTOR_CACHE_SIZE)
+def _selector_set(include: tuple, exclude: tuple) -> SelectorSet:
+    return SelectorSet(include, exclude)
+
+def compile_filters(filters: dict) -> SelectorSet:
+    """Cached SelectorSet for a plan's `filters`"""
+    filters = filters or {}
+    return _selector_set(tuple(filters.get("include_selectors", [])), tuple(filters.get("exclude_selectors", [])))
+
+def selector_cache_stats() -> dict:
+    info = compile_match.cache_info()
+    select = _compile_select.cache_info()
+    sets = _selector_set.cache_info()
+    return {
+        "hits": info.hits + select.hits + sets.hits,
+        "misses": info.misses + select.misses + sets.misses,
+        "entries": info.currsize + select.currsize + sets.currsize
+    }
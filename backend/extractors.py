@@ -0,0 +1,52 @@
+import lxml.html
+from urllib.parse import urljoin
+from .tables import walk_table
+from .records import Link, Image, CustomMatch
+import logging
+
+logger = logging.getLogger("webtapi.extractors")
+
+# Plan element kind -> tag collected for it
+ELEMENT_TAGS = (
+    ("text", "p"),
+    ("images", "img"),
+    ("tables", "table"),
+    ("links", "a")
+)
+
+def text_of(el) -> str:
+    """Concatenate stripped text fragments, like BeautifulSoup's get_text(strip=True)"""
+    return "".join(s.strip() for s in el.itertext())
+
+def html_of(el) -> str:
+    return lxml.html.tostring(el, encoding="unicode", with_tail=False)
+
+def image_record(img, url: str):
+    """Record for an <img>, or None if it has no source"""
+    src = img.get("src", "") or img.get("data-src", "")
+    if not src:
+        return None
+    
+    # Resolve relative URLs
+    return Image(urljoin(url, src), img.get("alt", "")[:100], img.get("width"), img.get("height"))
+
+def link_record(a, url: str):
+    """Record for an <a>, or None for fragment and javascript: links"""
+    href = a.get("href", "")
+    if not href or href.startswith(("#", "javascript:")):
+        return None
+    
+    # Resolve relative URLs
+    return Link(text_of(a)[:200], urljoin(url, href))
+
+def table_record(index: int, table):
+    """Columnar record for a <table>, or None if it has no cells"""
+    try:
+        record = walk_table(table)
+    except Exception as e:
+        logger.debug(f"Table extraction failed: {str(e)}")
+        return None
+    return {"table_index": index, **record} if record else None
+
+def custom_record(selector: str, el) -> CustomMatch:
+    return CustomMatch(selector, text_of(el), html_of(el))
@@ -0,0 +1,208 @@
+from cachetools import LRUCache
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+import time
+
+logger = logging.getLogger("webtapi.fetch_cache")
+
+# Configuration
+FETCH_CACHE_MAX_BYTES = int(os.getenv("FETCH_CACHE_MAX_BYTES", 256 * 1024 * 1024))
+FETCH_CACHE_DIR = os.getenv("FETCH_CACHE_DIR", "")
+FETCH_CACHE_FRESH_SECONDS = int(os.getenv("FETCH_CACHE_FRESH_SECONDS", 30))
+FETCH_CACHE_MAX_TREES = int(os.getenv("FETCH_CACHE_MAX_TREES", 16))
+
+_DEFAULT_PORTS = {"http": 80, "https": 443}
+_MAX_AGE = re.compile(r"max-age=(\d+)")
+
+def normalize_url(url: str) -> str:
+    """Canonical form of a URL used as the cache key"""
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or "").lower()
+    if parts.port and parts.port != _DEFAULT_PORTS.get(scheme):
+        host = f"{host}:{parts.port}"
+    query = urlencode(sorted(parse_qsl(parts.query, keep_blank_values=True)))
+    return urlunsplit((scheme, host, parts.path or "/", query, ""))
+
+def _freshness(headers, fresh_seconds: int):
+    """Seconds a response may be served without revalidation, or None if it must not be stored"""
+    cache_control = headers.get("cache-control", "").lower()
+    if "no-store" in cache_control:
+        return None
+    if "no-cache" in cache_control:
+        return 0
+    match = _MAX_AGE.search(cache_control)
+    if match:
+        return int(match.group(1))
+    return fresh_seconds
+
+class CacheEntry:
+    """A stored response body plus the validators needed to revalidate it"""
+    
+    def __init__(self, url: str, content: bytes, encoding: str, status_code: int,
+                 etag: str = None, last_modified: str = None, expires_at: float = 0.0):
+        self.url = url
+        self.content = content
+        self.encoding = encoding
+        self.status_code = status_code
+        self.etag = etag
+        self.last_modified = last_modified
+        self.expires_at = expires_at
+        self.freshness = 0
+        self.digest = hashlib.sha256(content).hexdigest()
+    
+    @property
+    def size(self) -> int:
+        return len(self.content)
+    
+    def is_fresh(self) -> bool:
+        return time.time() < self.expires_at
+    
+    def validators(self) -> dict:
+        """Conditional request headers for revalidating this entry"""
+        headers = {}
+        if self.etag:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified:
+            headers["If-Modified-Since"] = self.last_modified
+        return headers
+    
+    def refresh(self, headers, fresh_seconds: int):
+        """Apply the headers of a 304 response"""
+        self.etag = headers.get("etag", self.etag)
+        self.last_modified = headers.get("last-modified", self.last_modified)
+        # A 304 without Cache-Control keeps the stored freshness policy
+        if "cache-control" in headers:
+            self.freshness = _freshness(headers, fresh_seconds) or 0
+        self.expires_at = time.time() + self.freshness
+    
+    def to_meta(self) -> dict:
+        return {
+            "url": self.url,
+            "encoding": self.encoding,
+            "status_code": self.status_code,
+            "etag": self.etag,
+            "last_modified": self.last_modified,
+            "expires_at": self.expires_at,
+            "freshness": self.freshness,
+            "digest": self.digest
+        }
+
+class _SpillingLRU(LRUCache):
+    """Byte-bounded LRU that hands evicted entries to a callback"""
+    
+    def __init__(self, maxsize, on_evict):
+        super().__init__(maxsize=maxsize, getsizeof=lambda entry: entry.size)
+        self._on_evict = on_evict
+    
+    def popitem(self):
+        key, entry = super().popitem()
+        self._on_evict(key, entry)
+        return key, entry
+
+class FetchCache:
+    """Content-addressed cache of fetched pages with optional on-disk spill"""
+    
+    def __init__(self, max_bytes: int = FETCH_CACHE_MAX_BYTES, spill_dir: str = FETCH_CACHE_DIR,
+                 fresh_seconds: int = FETCH_CACHE_FRESH_SECONDS, max_trees: int = FETCH_CACHE_MAX_TREES):
+        self.fresh_seconds = fresh_seconds
+        self.spill_dir = spill_dir
+        if spill_dir:
+            os.makedirs(spill_dir, exist_ok=True)
+        self._entries = _SpillingLRU(max_bytes, self._evicted)
+        # Parsed trees are keyed by body digest, so identical pages share one
+        self._trees = LRUCache(maxsize=max_trees)
+        self._tree_lock = threading.Lock()
+        self.counters = {
+            "hits": 0,
+            "misses": 0,
+            "revalidated": 0,
+            "evictions": 0,
+            "spilled": 0,
+            "disk_hits": 0
+        }
+    
+    def get(self, key: str):
+        entry = self._entries.get(key)
+        if entry is None and self.spill_dir:
+            entry = self._load(key)
+            if entry is not None:
+                self.counters["disk_hits"] += 1
+                self._store(key, entry)
+        return entry
+    
+    def put(self, key: str, entry: CacheEntry, headers):
+        """Store a 200 response unless its headers forbid it"""
+        freshness = _freshness(headers, self.fresh_seconds)
+        if freshness is None or entry.size > self._entries.maxsize:
+            return
+        if not (freshness or entry.etag or entry.last_modified):
+            return
+        entry.freshness = freshness
+        entry.expires_at = time.time() + freshness
+        self._store(key, entry)
+    
+    def _store(self, key: str, entry: CacheEntry):
+        self._entries.pop(key, None)
+        self._entries[key] = entry
+    
+    def get_tree(self, digest: str):
+        with self._tree_lock:
+            return self._trees.get(digest)
+    
+    def put_tree(self, digest: str, tree):
+        with self._tree_lock:
+            self._trees[digest] = tree
+    
+    def stats(self) -> dict:
+        lookups = self.counters["hits"] + self.counters["misses"] + self.counters["revalidated"]
+        return {
+            **self.counters,
+            "entries": len(self._entries),
+            "bytes": self._entries.currsize,
+            "max_bytes": self._entries.maxsize,
+            "hit_ratio": round((lookups - self.counters["misses"]) / lookups, 4) if lookups else 0.0
+        }
+    
+    def _paths(self, key: str, digest: str = None):
+        name = hashlib.sha256(key.encode()).hexdigest()
+        meta = os.path.join(self.spill_dir, f"{name}.json")
+        body = os.path.join(self.spill_dir, f"{digest}.body") if digest else None
+        return meta, body
+    
+    def _evicted(self, key: str, entry: CacheEntry):
+        self.counters["evictions"] += 1
+        if not self.spill_dir:
+            return
+        meta_path, body_path = self._paths(key, entry.digest)
+        try:
+            if not os.path.exists(body_path):
+                with open(body_path, "wb") as f:
+                    f.write(entry.content)
+            with open(meta_path, "w") as f:
+                json.dump(entry.to_meta(), f)
+            self.counters["spilled"] += 1
+        except OSError as e:
+            logger.warning(f"Fetch cache spill failed: {str(e)}")
+    
+    def _load(self, key: str):
+        meta_path, _ = self._paths(key)
+        try:
+            with open(meta_path) as f:
+                meta = json.load(f)
+            _, body_path = self._paths(key, meta["digest"])
+            with open(body_path, "rb") as f:
+                content = f.read()
+        except (OSError, ValueError, KeyError):
+            return None
+        entry = CacheEntry(
+            meta["url"], content, meta["encoding"], meta["status_code"],
+            meta["etag"], meta["last_modified"], meta["expires_at"]
+        )
+        entry.freshness = meta["freshness"]
+        return entry
@@ -0,0 +1,319 @@
+import csv
+import io
+import json
+import os
+import logging
+from fastapi.responses import JSONResponse
+from .records import Record, encode_record
+
+logger = logging.getLogger("webtapi.formats")
+
+# Configuration
+STREAM_CHUNK_BYTES = int(os.getenv("STREAM_CHUNK_BYTES", 64 * 1024))
+ARROW_BATCH_ROWS = int(os.getenv("ARROW_BATCH_ROWS", 8192))
+PREVIEW_ITEMS = int(os.getenv("PREVIEW_ITEMS", 10))
+PREVIEW_TEXT_CHARS = int(os.getenv("PREVIEW_TEXT_CHARS", 2000))
+# List items handed to the C JSON encoder per call
+_ITEMS_PER_DUMP = 256
+
+# Output format -> media type
+FORMATS = {
+    "json": "application/json",
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+    "arrow": "application/vnd.apache.arrow.stream",
+    "parquet": "application/vnd.apache.parquet"
+}
+_MEDIA_TYPES = {
+    **{media_type: fmt for fmt, media_type in FORMATS.items()},
+    "application/jsonl": "ndjson",
+    "application/x-parquet": "parquet"
+}
+
+class FormatError(ValueError):
+    """The requested representation can't be produced for this data"""
+
+class RecordJSONResponse(JSONResponse):
+    """JSONResponse that also serializes extraction Records"""
+    
+    def render(self, content) -> bytes:
+        return json.dumps(
+            content, ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":"), default=encode_record
+        ).encode("utf-8")
+
+def negotiate(requested: str = None, accept: str = None, default: str = None) -> str:
+    """Pick the output format from ?format=, then the Accept header, then the endpoint's saved format"""
+    if requested:
+        fmt = requested.lower()
+        if fmt not in FORMATS:
+            raise FormatError(f"Unknown format: {requested}")
+        return fmt
+    
+    if accept:
+        # Highest q-value first; ties keep header order
+        ranges = []
+        for i, part in enumerate(accept.split(",")):
+            media_type, *params = [item.strip() for item in part.split(";")]
+            q = 1.0
+            for param in params:
+                if param.startswith("q="):
+                    try:
+                        q = float(param[2:])
+                    except ValueError:
+                        q = 0.0
+            if q > 0:
+                ranges.append((-q, i, media_type.lower()))
+        for _, _, media_type in sorted(ranges):
+            if media_type in _MEDIA_TYPES:
+                return _MEDIA_TYPES[media_type]
+            if media_type in ("*/*", "application/*", "text/*"):
+                break
+        else:
+            if ranges:
+                raise FormatError(f"None of the accepted media types can be produced: {accept}")
+    
+    default = (default or "json").lower()
+    return default if default in FORMATS else "json"
+
+def parse_fields(fields: str = None):
+    """Turn "content.links.href,metadata.url" into a nested dict of kept keys ({} keeps everything below)"""
+    if not fields:
+        return None
+    tree = {}
+    for path in fields.split(","):
+        parts = [part for part in path.strip().split(".") if part]
+        if not parts:
+            continue
+        node = tree
+        for part in parts[:-1]:
+            if part in node and not node[part]:
+                # A shorter path already keeps this whole subtree
+                break
+            node = node.setdefault(part, {})
+        else:
+            node[parts[-1]] = {}
+    return tree or None
+
+def projected_sections(tree):
+    """Content sections a projection needs, or None if it needs them all"""
+    if tree is None or tree.get("content") == {}:
+        return None
+    return list(tree.get("content", {}))
+
+def project(value, tree):
+    """Keep only the fields in `tree`; lists are projected item by item"""
+    if not tree:
+        return value
+    if isinstance(value, Record):
+        value = value.to_json()
+    if isinstance(value, list):
+        return [project(item, tree) for item in value]
+    if isinstance(value, dict):
+        return {key: project(value[key], sub) for key, sub in tree.items() if key in value}
+    return value
+
+def paginate(data: dict, offset: int = 0, limit: int = None):
+    """Slice every list section of `data`; returns (data, {section: total length})"""
+    totals = {}
+    content = {}
+    for name, value in data.get("content", {}).items():
+        if isinstance(value, list):
+            totals[name] = len(value)
+            value = value[offset:offset + limit if limit is not None else None]
+        content[name] = value
+    return {**data, "content": content}, totals
+
+def _clip(value, text_chars: int):
+    if isinstance(value, Record):
+        value = value.to_json()
+    if isinstance(value, str) and len(value) > text_chars:
+        return value[:text_chars] + "…", True
+    if isinstance(value, dict):
+        clipped = {key: _clip(item, text_chars) for key, item in value.items()}
+        return {key: item for key, (item, _) in clipped.items()}, any(cut for _, cut in clipped.values())
+    return value, False
+
+def preview(data: dict, items: int = PREVIEW_ITEMS, text_chars: int = PREVIEW_TEXT_CHARS):
+    """Bounded copy of `data` for display: (preview, {section: item count}, truncated?)
+    
+    List sections keep their first `items` entries, extracted tables their
+    first `items` rows, lists inside other sections (the article's
+    paragraphs) their first `items` entries, and long strings are cut at
+    `text_chars`.
+    """
+    content = {}
+    counts = {}
+    truncated = False
+    for name, value in data.get("content", {}).items():
+        if not isinstance(value, list):
+            counts[name] = 1
+            if isinstance(value, dict):
+                truncated = truncated or any(isinstance(item, list) and len(item) > items for item in value.values())
+                value = {key: item[:items] if isinstance(item, list) else item for key, item in value.items()}
+            content[name], cut = _clip(value, text_chars)
+            truncated = truncated or cut
+            continue
+        counts[name] = len(value)
+        truncated = truncated or len(value) > items
+        kept = []
+        for item in value[:items]:
+            if name == "tables" and isinstance(item, dict) and "values" in item:
+                truncated = truncated or item.get("rows", 0) > items
+                item = {**item, "values": [column[:items] for column in item["values"]]}
+            item, cut = _clip(item, text_chars)
+            truncated = truncated or cut
+            kept.append(item)
+        content[name] = kept
+    return {**data, "content": content}, counts, truncated
+
+def encode(data: dict, fmt: str):
+    """Iterator of byte chunks encoding `data` as `fmt`"""
+    if fmt == "json":
+        return _chunked(_json_pieces(data, 0))
+    if fmt == "ndjson":
+        return _chunked(_ndjson_lines(data))
+    if fmt == "csv":
+        return _chunked(_csv_pieces(data))
+    if fmt in ("arrow", "parquet"):
+        # Built before streaming starts so an unsuitable shape fails the request cleanly
+        table = _arrow_table(data)
+        return _arrow_stream(table) if fmt == "arrow" else _parquet_bytes(table)
+    raise FormatError(f"Unknown format: {fmt}")
+
+def _dumps(value) -> str:
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":"), default=encode_record)
+
+def _chunked(pieces):
+    # Group small pieces so each write carries a useful amount of data
+    buffer = []
+    size = 0
+    for piece in pieces:
+        buffer.append(piece)
+        size += len(piece)
+        if size >= STREAM_CHUNK_BYTES:
+            yield "".join(buffer).encode("utf-8")
+            buffer = []
+            size = 0
+    if buffer:
+        yield "".join(buffer).encode("utf-8")
+
+def _json_pieces(value, depth: int):
+    # Stream the top two levels (the document and its content sections) and
+    # lists; list items are encoded a slice at a time by the C encoder
+    if isinstance(value, dict) and depth < 2:
+        yield "{"
+        for i, (key, item) in enumerate(value.items()):
+            yield f"{',' if i else ''}{_dumps(key)}:"
+            yield from _json_pieces(item, depth + 1)
+        yield "}"
+    elif isinstance(value, list):
+        yield "["
+        for start in range(0, len(value), _ITEMS_PER_DUMP):
+            # Drop the slice's own brackets, keep its separators
+            yield f"{',' if start else ''}{_dumps(value[start:start + _ITEMS_PER_DUMP])[1:-1]}"
+        yield "]"
+    else:
+        yield _dumps(value)
+
+def _ndjson_lines(data: dict):
+    # One line per item, tagged with its section
+    yield _dumps({"section": "metadata", **data.get("metadata", {})}) + "\n"
+    dumps = json.JSONEncoder(ensure_ascii=False, separators=(",", ":"), default=encode_record).encode
+    for name, value in data.get("content", {}).items():
+        for item in (value if isinstance(value, list) else [value]):
+            if isinstance(item, Record):
+                item = item.to_json()
+            line = {"section": name, **item} if isinstance(item, dict) else {"section": name, "value": item}
+            yield dumps(line) + "\n"
+
+def _blocks(data: dict):
+    """Flat tables in the content: (title, columns, lazy rows) per section, or per extracted table"""
+    for name, value in data.get("content", {}).items():
+        if name == "tables" and isinstance(value, list):
+            for table in value:
+                if isinstance(table, dict) and "columns" in table and "values" in table:
+                    yield f"Table {table.get('table_index', 0) + 1}", table["columns"], zip(*table["values"])
+            continue
+        items = [item.to_json() if isinstance(item, Record) else item for item in value] if isinstance(value, list) else [value]
+        if not items:
+            continue
+        if all(isinstance(item, dict) for item in items):
+            # Union of keys, in first-seen order
+            columns = list(dict.fromkeys(key for item in items for key in item))
+            rows = ([item.get(column) for column in columns] for item in items)
+        else:
+            columns = [name]
+            rows = ([item] for item in items)
+        yield name.upper(), columns, rows
+
+def _cell(value):
+    if value is None:
+        return ""
+    if isinstance(value, (dict, list)):
+        return _dumps(value)
+    return value
+
+def _csv_pieces(data: dict):
+    blocks = list(_blocks(data))
+    output = io.StringIO()
+    writer = csv.writer(output)
+    for title, columns, rows in blocks:
+        # A lone block is plain CSV; several get the titled layout of the Streamlit export
+        if len(blocks) > 1:
+            writer.writerow([title])
+        writer.writerow(columns)
+        for row in rows:
+            writer.writerow([_cell(value) for value in row])
+            if output.tell() >= STREAM_CHUNK_BYTES:
+                yield output.getvalue()
+                output.seek(0)
+                output.truncate()
+        if len(blocks) > 1:
+            writer.writerow([])
+    yield output.getvalue()
+
+def _arrow_table(data: dict):
+    try:
+        import pyarrow as pa
+    except ImportError:
+        raise FormatError("Arrow and Parquet output need pyarrow installed")
+    
+    blocks = list(_blocks(data))
+    if len(blocks) != 1:
+        raise FormatError(
+            "Arrow and Parquet hold a single table: pick one section with ?sections= "
+            "(and one extracted table with ?offset=&limit=1)"
+        )
+    _, columns, rows = blocks[0]
+    rows = list(rows)
+    arrays = {}
+    for i, column in enumerate(columns):
+        values = [row[i] if i < len(row) else None for row in rows]
+        try:
+            arrays[str(column)] = pa.array(values)
+        except (pa.ArrowInvalid, pa.ArrowTypeError):
+            # Mixed types in one column: fall back to text
+            arrays[str(column)] = pa.array([None if value is None else str(_cell(value)) for value in values])
+    return pa.table(arrays)
+
+def _arrow_stream(table):
+    import pyarrow as pa
+    
+    sink = io.BytesIO()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        for batch in table.to_batches(max_chunksize=ARROW_BATCH_ROWS):
+            writer.write_batch(batch)
+            yield sink.getvalue()
+            sink.seek(0)
+            sink.truncate()
+    yield sink.getvalue()
+
+def _parquet_bytes(table):
+    import pyarrow.parquet as pq
+    
+    # Parquet needs its footer written before any of it is usable; encode, then stream out
+    sink = io.BytesIO()
+    pq.write_table(table, sink)
+    view = sink.getbuffer()
+    for start in range(0, len(view), STREAM_CHUNK_BYTES):
+        yield bytes(view[start:start + STREAM_CHUNK_BYTES])
@@ -0,0 +1,229 @@
+from contextlib import asynccontextmanager
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlsplit
+import asyncio
+import os
+import time
+
+# Configuration
+FETCH_HOST_RATE = float(os.getenv("FETCH_HOST_RATE", 10))
+FETCH_HOST_BURST = int(os.getenv("FETCH_HOST_BURST", 10))
+FETCH_HOST_CONCURRENCY = int(os.getenv("FETCH_HOST_CONCURRENCY", 4))
+FETCH_HOST_MAX_CONCURRENCY = int(os.getenv("FETCH_HOST_MAX_CONCURRENCY", 16))
+FETCH_LATENCY_TOLERANCE = float(os.getenv("FETCH_LATENCY_TOLERANCE", 3.0))
+FETCH_RETRY_MAX_WAIT = float(os.getenv("FETCH_RETRY_MAX_WAIT", 10))
+FETCH_MAX_HOSTS = int(os.getenv("FETCH_MAX_HOSTS", 10000))
+
+class HostLimiter:
+    """Global plus per-host concurrency limits for outbound fetches"""
+    
+    def __init__(self, total: int, per_host: int):
+        self.per_host = per_host
+        self._total = asyncio.Semaphore(total)
+        # host -> [semaphore, users]; dropped again once a host goes idle
+        self._hosts = {}
+    
+    @asynccontextmanager
+    async def slot(self, url: str):
+        host = urlsplit(url).hostname or ""
+        entry = self._hosts.get(host)
+        if entry is None:
+            entry = self._hosts[host] = [asyncio.Semaphore(self.per_host), 0]
+        entry[1] += 1
+        try:
+            # Take the host slot first so a busy host can't hold global slots hostage
+            async with entry[0], self._total:
+                yield
+        finally:
+            entry[1] -= 1
+            if not entry[1]:
+                del self._hosts[host]
+
+class HostBusy(Exception):
+    """A host asked us to back off for longer than a request may wait"""
+    
+    def __init__(self, host: str, retry_after: float):
+        super().__init__(f"{host} is rate limiting requests, retry after {retry_after:.0f}s")
+        self.host = host
+        self.retry_after = retry_after
+
+def parse_retry_after(value: str):
+    """Seconds from a Retry-After header (delta-seconds or HTTP date), None if absent or invalid"""
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, when.timestamp() - time.time())
+
+class _Host:
+    """Scheduling state for one host: token bucket, AIMD concurrency window and cooldown"""
+    
+    def __init__(self, rate: float, burst: int, limit: int):
+        self.rate = rate
+        self.burst = burst
+        # Highest rate allowed (0: unlimited); robots.txt Crawl-delay can lower it
+        self.ceiling = rate
+        self.grown = time.monotonic()
+        self.tokens = float(burst)
+        self.refilled = time.monotonic()
+        self.limit = float(limit)
+        self.active = 0
+        self.waiting = 0
+        self.paused_until = 0.0
+        # Time to response headers: recent average and long-term baseline
+        self.latency = None
+        self.baseline = None
+        self.decreased = 0.0
+        self.changed = asyncio.Event()
+    
+    def ready_in(self, now: float) -> float:
+        """0 if a request may start now (taking a token), else seconds to wait; None waits for a release"""
+        if now < self.paused_until:
+            return self.paused_until - now
+        if self.active >= max(1, int(self.limit)):
+            return None
+        if self.ceiling > 0:
+            self.tokens = min(self.burst, self.tokens + (now - self.refilled) * self.rate)
+            self.refilled = now
+            if self.tokens < 1:
+                return (1 - self.tokens) / self.rate
+            self.tokens -= 1
+        return 0.0
+    
+    def wake(self):
+        self.changed.set()
+        self.changed = asyncio.Event()
+
+class HostScheduler:
+    """Polite per-host scheduling for outbound fetches.
+    
+    Every host gets a token bucket (FETCH_HOST_RATE requests/s) and a
+    concurrency window that adapts like TCP congestion control: it grows
+    by one request per window of normal responses and halves when the
+    recent latency exceeds FETCH_LATENCY_TOLERANCE x the long-term average
+    or the host answers 429/503. Throttling also halves the host's rate,
+    which then climbs back linearly while responses stay normal.
+    Retry-After pauses the whole host. State for idle, unpenalized hosts
+    is dropped once more than FETCH_MAX_HOSTS are tracked.
+    """
+    
+    def __init__(self, rate: float = FETCH_HOST_RATE, burst: int = FETCH_HOST_BURST,
+                 concurrency: int = FETCH_HOST_CONCURRENCY, max_concurrency: int = FETCH_HOST_MAX_CONCURRENCY,
+                 tolerance: float = FETCH_LATENCY_TOLERANCE, max_wait: float = FETCH_RETRY_MAX_WAIT):
+        self.rate = rate
+        self.burst = burst
+        self.concurrency = concurrency
+        self.max_concurrency = max(concurrency, max_concurrency)
+        self.tolerance = tolerance
+        self.max_wait = max_wait
+        self._hosts = {}
+        self.counters = {"requests": 0, "retries": 0, "throttled": 0, "slowdowns": 0, "paused": 0, "rejected": 0}
+    
+    def _host(self, host: str) -> _Host:
+        state = self._hosts.get(host)
+        if state is None:
+            if len(self._hosts) >= FETCH_MAX_HOSTS:
+                self._prune()
+            state = self._hosts[host] = _Host(self.rate, self.burst, self.concurrency)
+        return state
+    
+    def _prune(self):
+        now = time.monotonic()
+        for host, state in list(self._hosts.items()):
+            idle = not state.active and not state.waiting and state.paused_until <= now
+            if idle and state.limit >= self.concurrency and state.rate >= state.ceiling:
+                del self._hosts[host]
+    
+    def cap_rate(self, url: str, rate: float):
+        """Never exceed `rate` requests/s to the URL's host (e.g. from a Crawl-delay)"""
+        state = self._host(urlsplit(url).hostname or "")
+        state.ceiling = min(state.ceiling, rate) if state.ceiling > 0 else rate
+        state.rate = min(state.rate, state.ceiling) if state.rate > 0 else state.ceiling
+        # A delay between requests means no bursts either
+        state.burst = 1
+        state.tokens = min(state.tokens, 1.0)
+    
+    @asynccontextmanager
+    async def slot(self, url: str):
+        """Wait for a turn at the URL's host; yields a callback taking the response status and headers"""
+        host = urlsplit(url).hostname or ""
+        state = self._host(host)
+        state.waiting += 1
+        try:
+            while True:
+                now = time.monotonic()
+                wait = state.ready_in(now)
+                if wait == 0:
+                    break
+                if now < state.paused_until and state.paused_until - now > self.max_wait:
+                    self.counters["rejected"] += 1
+                    raise HostBusy(host, state.paused_until - now)
+                changed = state.changed
+                try:
+                    await asyncio.wait_for(changed.wait(), wait)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            state.waiting -= 1
+        
+        state.active += 1
+        self.counters["requests"] += 1
+        start = time.monotonic()
+        
+        def observe(status_code: int, headers=None):
+            self._observe(host, state, status_code, headers or {}, time.monotonic() - start)
+        
+        try:
+            yield observe
+        finally:
+            state.active -= 1
+            state.wake()
+    
+    def _observe(self, host: str, state: _Host, status_code: int, headers, elapsed: float):
+        now = time.monotonic()
+        if status_code in (429, 503):
+            self.counters["throttled"] += 1
+            retry_after = parse_retry_after(headers.get("retry-after"))
+            if retry_after:
+                self.counters["paused"] += 1
+                state.paused_until = max(state.paused_until, now + retry_after)
+            self._decrease(state, now, throttled=True)
+            # No saved-up burst right after being told to slow down
+            state.tokens = 0.0
+            state.grown = now
+            return
+        
+        state.latency = elapsed if state.latency is None else 0.8 * state.latency + 0.2 * elapsed
+        state.baseline = elapsed if state.baseline is None else 0.98 * state.baseline + 0.02 * elapsed
+        if state.latency > state.baseline * self.tolerance:
+            self.counters["slowdowns"] += 1
+            self._decrease(state, now)
+        else:
+            state.limit = min(self.max_concurrency, state.limit + 1 / state.limit)
+            if state.ceiling > 0:
+                # Win back the full rate over ~20 s without throttling
+                state.rate = min(state.ceiling, state.rate + state.ceiling * (now - state.grown) / 20)
+        state.grown = now
+    
+    def _decrease(self, state: _Host, now: float, throttled: bool = False):
+        # At most once per round trip, so one burst of bad responses counts once
+        if now - state.decreased <= (state.latency or 0):
+            return
+        state.decreased = now
+        state.limit = max(1.0, state.limit / 2)
+        if throttled and state.ceiling > 0:
+            state.rate = max(state.ceiling / 16, state.rate / 2)
+    
+    def stats(self) -> dict:
+        now = time.monotonic()
+        return {
+            **self.counters,
+            "hosts": len(self._hosts),
+            "paused_hosts": sum(1 for state in self._hosts.values() if state.paused_until > now),
+            "limited_hosts": sum(1 for state in self._hosts.values() if state.limit < self.concurrency)
+        }
@@ -1,24 +1,69 @@
 from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
-from cachetools import TTLCache
-from datetime import timedelta
+from fastapi.responses import PlainTextResponse, Response, StreamingResponse
+from contextlib import asynccontextmanager
+import asyncio
+import json
+import os
+import time
 import uuid
 import logging
-from .security import validate_url
-from .ai_interpreter import parse_query
-from .scraper import extract_data
+from .security import validate_url, reputation, security_stats
+from .ai_interpreter import parse_query, plan_cache_stats
+from .ai_interpreter import close_client as close_ai_client
+from .scraper import fetch_cache, parser_pool, scheduler, robots, preload, PageTooLarge, UnsupportedContentType
+from .fetch_cache import normalize_url
+from .crawler import crawl_options, extract_endpoint
+from .workers import PoolBusy
+from .scraper import close_client as close_scraper_client
+from .store import create_store
+from .result_cache import ResultCache, RESULT_CACHE_MAX_BYTES
+from .refresher import Refresher
+from .changes import ChangeFeed, VersionGone, etag, etag_matches
+from .limits import HostLimiter, HostBusy
+from .robots import RobotsDisallowed
+from .css import selector_cache_stats
+from .tables import parse_table_formats, render_tables
+from .records import encode_record
+from .formats import FORMATS, FormatError, RecordJSONResponse, negotiate, encode, preview
+from .formats import parse_fields, projected_sections, project, paginate
+from .metrics import PAYLOAD_BYTES, stage, start_trace, trace_summary, register_stats, render_async as render_metrics
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
+logging.getLogger("httpx").setLevel(logging.WARNING)
 logger = logging.getLogger("webtapi")
 
+# Endpoint lifetime bounds; cache_hours is enforced as the endpoint's TTL
+MAX_CACHE_HOURS = float(os.getenv("MAX_CACHE_HOURS", 72))
+
+# Batch configuration
+BATCH_MAX_URLS = int(os.getenv("BATCH_MAX_URLS", 1000))
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", 16))
+BATCH_PER_HOST = int(os.getenv("BATCH_PER_HOST", 4))
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    refresher.start()
+    reputation.start()
+    # Serve /health right away; the parsing libraries finish loading in the background
+    warm = asyncio.create_task(asyncio.to_thread(preload))
+    yield
+    await asyncio.gather(warm, return_exceptions=True)
+    await reputation.stop()
+    await refresher.stop()
+    # Release pooled connections on shutdown
+    await close_ai_client()
+    await close_scraper_client()
+    store.close()
+
 app = FastAPI(
     title="WebToAPI Converter",
     description="Convert websites to reusable API endpoints",
     version="1.0.0",
     docs_url="/docs",
-    redoc_url=None
+    redoc_url=None,
+    lifespan=lifespan
 )
 
 # CORS configuration
@@ -29,67 +74,355 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Cache configuration
-cache = TTLCache(maxsize=1000, ttl=86400)  # Default 24-hour cache
+# Endpoint storage (ENDPOINT_STORE_URL selects SQLite or Redis), with hot sections cached in front
+result_cache = ResultCache() if RESULT_CACHE_MAX_BYTES > 0 else None
+store = create_store(cache=result_cache)
+refresher = Refresher(store, extract_endpoint)
+changes = ChangeFeed(store)
+
+# Component stats are exported as gauges on /metrics
+register_stats("fetch_cache", fetch_cache.stats)
+register_stats("plan_cache", plan_cache_stats)
+register_stats("refresher", refresher.stats)
+register_stats("security", security_stats)
+register_stats("store", store.stats, blocking=True)
+if result_cache is not None:
+    register_stats("result_cache", result_cache.stats)
+register_stats("changes", changes.stats)
+register_stats("scheduler", scheduler.stats)
+register_stats("robots", robots.stats)
+register_stats("selectors", selector_cache_stats)
+register_stats("jobs", lambda: {**job_counters, "in_flight": len(_jobs)})
+if parser_pool is not None:
+    register_stats("parser_pool", parser_pool.stats)
 
 class GenerationRequest:
-    def __init__(self, url: str, query: str, output_format: str, cache_hours: int):
+    def __init__(self, url: str, query: str, output_format: str, cache_hours: int, table_formats=None):
         self.url = url
         self.query = query
         self.output_format = output_format
+        # Checked before use: it becomes the TTL, and a string would be repeated rather than multiplied
+        number = isinstance(cache_hours, (int, float)) and not isinstance(cache_hours, bool)
+        if not number or not 0 < cache_hours <= MAX_CACHE_HOURS:
+            raise HTTPException(400, f"cache_hours must be a number of hours above 0 and at most {MAX_CACHE_HOURS:g}")
         self.cache_hours = cache_hours
+        try:
+            self.table_formats = parse_table_formats(table_formats)
+        except ValueError as e:
+            raise HTTPException(400, str(e))
+    
+    @property
+    def ttl(self) -> int:
+        return max(1, int(self.cache_hours * 3600))
+
+# Scrapes in progress keyed by (normalized URL, plan); identical requests wait on the same one
+_jobs = {}
+job_counters = {"started": 0, "coalesced": 0}
+
+def _job_key(url: str, plan: dict):
+    plan = {key: value for key, value in plan.items() if key != "source"}
+    return normalize_url(url), json.dumps(plan, sort_keys=True)
+
+async def _scrape(url: str, plan: dict, ttl: int):
+    # Plans with crawl settings cover many pages; refreshes re-run the whole crawl
+    data = await extract_endpoint(url, plan)
+    content = await asyncio.to_thread(store.put_content, data, ttl)
+    return data, content
+
+async def scrape_shared(url: str, plan: dict, ttl: int):
+    """Extract and store a page's sections: (data, content for store.save).
+    
+    Concurrent calls for the same page and plan share one scrape, and the
+    result is shared between them, so it must not be modified.
+    """
+    key = _job_key(url, plan)
+    task = _jobs.get(key)
+    if task is not None:
+        job_counters["coalesced"] += 1
+    else:
+        job_counters["started"] += 1
+        task = asyncio.ensure_future(_scrape(url, plan, ttl))
+        _jobs[key] = task
+        task.add_done_callback(lambda _: _jobs.pop(key, None))
+    # One caller going away must not cancel the scrape for the others
+    return await asyncio.shield(task)
+
+async def save_endpoint(gen_request: GenerationRequest, url: str, plan: dict, data: dict, content: dict = None):
+    """Store extracted data under a new endpoint id; returns (id, stored metadata)"""
+    endpoint_id = str(uuid.uuid4())
+    meta = await asyncio.to_thread(
+        store.save,
+        endpoint_id,
+        data,
+        gen_request.output_format,
+        gen_request.ttl,
+        url,
+        plan,
+        content=content
+    )
+    for section, size in meta["sizes"].items():
+        PAYLOAD_BYTES.observe(section, size)
+    return endpoint_id, meta
 
 @app.post("/generate")
 async def generate_endpoint(request: Request):
+    # ?debug=timings adds this request's stage breakdown to the response
+    trace = start_trace() if request.query_params.get("debug") == "timings" else None
+    try:
+        with stage("generate"):
+            data = await request.json()
+            gen_request = GenerationRequest(
+                url=data.get("url"),
+                query=data.get("query"),
+                output_format=data.get("output_format", "JSON"),
+                cache_hours=data.get("cache_hours", 24),
+                table_formats=data.get("table_formats")
+            )
+            
+            # Validate inputs
+            if not gen_request.url or not gen_request.query:
+                raise HTTPException(400, "Missing required parameters: url or query")
+            # "crawl": {...} follows same-site links and aggregates the pages into this endpoint
+            crawl = None
+            if data.get("crawl"):
+                try:
+                    crawl = crawl_options(data["crawl"])
+                except ValueError as e:
+                    raise HTTPException(400, str(e))
+            
+            # Security validation
+            with stage("validate"):
+                allowed = await validate_url(gen_request.url)
+            if not allowed:
+                raise HTTPException(400, "URL failed security checks or is not publicly accessible")
+            
+            # Parse natural language query
+            with stage("plan"):
+                extraction_plan = await parse_query(gen_request.query)
+            if crawl is not None:
+                extraction_plan = {**extraction_plan, "crawl": crawl}
+            
+            # Extract data from website
+            with stage("extract"):
+                extracted_data, content = await scrape_shared(gen_request.url, extraction_plan, gen_request.ttl)
+            
+            # Create API endpoint; identical sections are stored once and shared
+            with stage("save"):
+                endpoint_id, meta = await save_endpoint(gen_request, gen_request.url, extraction_plan, extracted_data, content)
+            
+            # Only a bounded preview goes back; the full data streams from /api/{id}
+            with stage("preview"):
+                sample, counts, truncated = preview(extracted_data)
+                sample = render_tables(sample, gen_request.table_formats)
+        
+        response = {
+            "api_endpoint": f"/api/{endpoint_id}",
+            "version": meta["version"],
+            "sample_data": sample,
+            "counts": counts,
+            "bytes": meta["sizes"],
+            "truncated": truncated
+        }
+        if trace is not None:
+            response["timings"] = trace_summary(trace)
+        return RecordJSONResponse(response)
+    
+    except HTTPException as he:
+        raise he
+    except PoolBusy:
+        raise HTTPException(503, "Server is busy, please retry shortly")
+    except PageTooLarge as e:
+        raise HTTPException(413, str(e))
+    except UnsupportedContentType as e:
+        raise HTTPException(415, str(e))
+    except HostBusy as e:
+        raise HTTPException(503, str(e), headers={"Retry-After": str(int(e.retry_after) + 1)})
+    except RobotsDisallowed as e:
+        raise HTTPException(403, str(e))
+    except Exception as e:
+        logger.error(f"Processing failed: {str(e)}")
+        raise HTTPException(500, "Internal server error")
+
+@app.post("/generate/batch")
+async def generate_batch(request: Request):
+    """Apply one query to many URLs, streaming one NDJSON line per finished page"""
     try:
         data = await request.json()
+        urls = data.get("urls")
         gen_request = GenerationRequest(
-            url=data.get("url"),
+            url=None,
             query=data.get("query"),
             output_format=data.get("output_format", "JSON"),
-            cache_hours=data.get("cache_hours", 24)
+            cache_hours=data.get("cache_hours", 24),
+            table_formats=data.get("table_formats")
         )
-        
-        # Validate inputs
-        if not gen_request.url or not gen_request.query:
-            raise HTTPException(400, "Missing required parameters: url or query")
-        
-        # Security validation
-        if not validate_url(gen_request.url):
-            raise HTTPException(400, "URL failed security checks or is not publicly accessible")
-        
-        # Parse natural language query
-        extraction_plan = parse_query(gen_request.query)
-        
-        # Extract data from website
-        extracted_data = extract_data(gen_request.url, extraction_plan)
-        
-        # Create API endpoint
-        endpoint_id = str(uuid.uuid4())
-        cache[endpoint_id] = {
-            "data": extracted_data,
-            "output_format": gen_request.output_format,
-            "expires": timedelta(hours=gen_request.cache_hours)
-        }
-        
-        return JSONResponse({
-            "api_endpoint": f"/api/{endpoint_id}",
-            "sample_data": extracted_data
-        })
-        
     except HTTPException as he:
         raise he
     except Exception as e:
-        logger.error(f"Processing failed: {str(e)}")
-        raise HTTPException(500, "Internal server error")
+        # Not JSON, or not an object: nothing a retry would fix
+        raise HTTPException(400, f"Invalid batch request: {str(e)}")
+    
+    if not isinstance(urls, list) or not urls or not gen_request.query:
+        raise HTTPException(400, "Missing required parameters: urls or query")
+    if len(urls) > BATCH_MAX_URLS:
+        raise HTTPException(400, f"At most {BATCH_MAX_URLS} URLs per batch")
+    try:
+        concurrency = max(1, min(int(data.get("concurrency", BATCH_CONCURRENCY)), BATCH_CONCURRENCY))
+    except (TypeError, ValueError, OverflowError):
+        raise HTTPException(400, "concurrency must be an integer")
+    
+    # Plan once for the whole batch
+    extraction_plan = await parse_query(gen_request.query)
+    limiter = HostLimiter(concurrency, BATCH_PER_HOST)
+    
+    async def process(url):
+        # Errors stay confined to their own line
+        try:
+            if not isinstance(url, str) or not await validate_url(url):
+                raise ValueError("URL failed security checks or is not publicly accessible")
+            async with limiter.slot(url):
+                extracted_data, content = await scrape_shared(url, extraction_plan, gen_request.ttl)
+            endpoint_id, _ = await save_endpoint(gen_request, url, extraction_plan, extracted_data, content)
+            return {"url": url, "api_endpoint": f"/api/{endpoint_id}", "data": render_tables(extracted_data, gen_request.table_formats)}
+        except Exception as e:
+            return {"url": url, "error": str(e)}
+    
+    async def stream():
+        tasks = [asyncio.create_task(process(url)) for url in urls]
+        try:
+            for finished in asyncio.as_completed(tasks):
+                yield json.dumps(await finished, default=encode_record) + "\n"
+        finally:
+            # Stop outstanding work if the client goes away
+            for task in tasks:
+                task.cancel()
+    
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
+
+def _shape(data: dict, table_formats: list, fields, offset: int, limit: int):
+    data, totals = paginate(data, offset, limit)
+    return project(render_tables(data, table_formats), fields), totals
+
+def _cache_headers(meta: dict, tag: str) -> dict:
+    return {
+        "Age": str(int(time.time() - meta["created_at"])),
+        "X-Endpoint-Version": str(meta.get("version", 1)),
+        "ETag": tag
+    }
 
 @app.get("/api/{endpoint_id}")
-async def get_data(endpoint_id: str):
-    data = cache.get(endpoint_id)
-    if not data:
+async def get_data(endpoint_id: str, request: Request, sections: str = None, tables: str = None,
+                   format: str = None, fields: str = None, offset: int = 0, limit: int = None,
+                   download: bool = False):
+    # ?sections=links,images only decompresses the requested content kinds
+    names = [name.strip() for name in sections.split(",") if name.strip()] if sections else None
+    # ?fields=content.links.href keeps only those fields, and only loads the sections they name
+    projection = parse_fields(fields)
+    needed = projected_sections(projection)
+    if needed is not None:
+        names = needed if names is None else [name for name in names if name in needed]
+    # ?tables=records,markdown renders stored column arrays on the way out
+    try:
+        table_formats = parse_table_formats(tables)
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+    if offset < 0 or (limit is not None and limit < 0):
+        raise HTTPException(400, "offset and limit must not be negative")
+    
+    # A conditional request only needs the metadata to be answered with 304
+    if_none_match = request.headers.get("if-none-match")
+    with stage("api.load"):
+        if if_none_match:
+            meta = await asyncio.to_thread(store.load_meta, endpoint_id)
+            record = (meta, None) if meta else None
+        else:
+            record = await asyncio.to_thread(store.load_record, endpoint_id, names)
+    if not record:
+        raise HTTPException(404, "Endpoint expired or not found")
+    meta, data = record
+    
+    # ?format= wins over Accept, which wins over the endpoint's saved output format
+    try:
+        fmt = negotiate(format, request.headers.get("accept"), meta.get("output_format"))
+    except FormatError as e:
+        raise HTTPException(400 if format else 406, str(e))
+    
+    # Serve what we have; stale or soon-stale endpoints are re-scraped in the background
+    refresher.touch(endpoint_id, meta)
+    variant = [fmt, table_formats, fields, offset, limit]
+    tag = etag(meta, names, variant)
+    if if_none_match and etag_matches(if_none_match, tag):
+        return Response(status_code=304, headers=_cache_headers(meta, tag))
+    if data is None:
+        with stage("api.load"):
+            record = await asyncio.to_thread(store.load_record, endpoint_id, names)
+        if not record:
+            raise HTTPException(404, "Endpoint expired or not found")
+        # Re-read, so the tag has to describe what was actually loaded
+        meta, data = record
+        tag = etag(meta, names, variant)
+    
+    headers = _cache_headers(meta, tag)
+    if meta["fresh_until"] <= time.time():
+        headers["Warning"] = '110 - "Response is Stale"'
+    
+    with stage("api.shape"):
+        data, totals = await asyncio.to_thread(_shape, data, table_formats, projection, offset, limit)
+    if len(totals) == 1:
+        headers["X-Total-Count"] = str(next(iter(totals.values())))
+    if limit is not None and any(total > offset + limit for total in totals.values()):
+        headers["Link"] = f'<{request.url.include_query_params(offset=offset + limit)}>; rel="next"'
+    
+    if download:
+        headers["Content-Disposition"] = f'attachment; filename="{endpoint_id}.{fmt}"'
+    
+    try:
+        body = await asyncio.to_thread(encode, data, fmt)
+    except FormatError as e:
+        raise HTTPException(400, str(e))
+    # Encoded piece by piece as the client reads, never as one big string
+    return StreamingResponse(body, media_type=FORMATS[fmt], headers=headers)
+
+@app.get("/api/{endpoint_id}/changes")
+async def get_changes(endpoint_id: str, since: int, sections: str = None):
+    """Items added and removed since version `since` (the X-Endpoint-Version a client last saw)"""
+    names = [name.strip() for name in sections.split(",") if name.strip()] if sections else None
+    with stage("api.load"):
+        meta = await asyncio.to_thread(store.load_meta, endpoint_id)
+    if meta is None:
         raise HTTPException(404, "Endpoint expired or not found")
-    return data["data"]
+    refresher.touch(endpoint_id, meta)
+    
+    try:
+        with stage("api.changes"):
+            feed = await asyncio.to_thread(changes.changes, meta, since, names)
+    except VersionGone as e:
+        # Too old to diff against; the client has to fetch /api/{id} again
+        raise HTTPException(410, str(e), headers={"X-Endpoint-Version": str(meta.get("version", 1))})
+    return RecordJSONResponse(feed, headers={"X-Endpoint-Version": str(feed["version"])})
 
 @app.get("/health")
 async def health_check():
-    return {"status": "ok", "version": "1.0.0"}
\ No newline at end of file
+    # The store may count its endpoints, which must not stall the loop this probe checks
+    store_stats = await asyncio.to_thread(store.stats)
+    return {
+        "status": "ok",
+        "version": "1.0.0",
+        "fetch_cache": fetch_cache.stats(),
+        "plan_cache": plan_cache_stats(),
+        "refresher": refresher.stats(),
+        "security": security_stats(),
+        "store": store_stats,
+        "result_cache": result_cache.stats() if result_cache is not None else None,
+        "changes": changes.stats(),
+        "scheduler": scheduler.stats(),
+        "robots": robots.stats(),
+        "selectors": selector_cache_stats(),
+        "jobs": {**job_counters, "in_flight": len(_jobs)},
+        "parser_pool": parser_pool.stats() if parser_pool is not None else None
+    }
+
+@app.get("/metrics")
+async def metrics():
+    """Stage latencies, payload sizes and component stats in Prometheus text format"""
+    return PlainTextResponse(await render_metrics(), media_type="text/plain; version=0.0.4")
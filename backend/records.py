@@ -0,0 +1,84 @@
+import sys
+
+def split_url(url: str):
+    """Split an absolute URL into an interned scheme://host prefix and the rest"""
+    start = url.find("://")
+    if start < 0:
+        return "", url
+    end = url.find("/", start + 3)
+    if end < 0:
+        return sys.intern(url), ""
+    return sys.intern(url[:end]), url[end:]
+
+def _intern(value):
+    return sys.intern(value) if value is not None else None
+
+class Record:
+    """Base for the slotted extraction records.
+
+    Pages produce thousands of these, so they keep attributes in slots
+    instead of per-record dicts and share repeated strings (URL hosts,
+    selectors, image sizes). `to_json` returns the dict they stand for,
+    with keys in the order the API has always used; pass `encode_record`
+    as `default=` to json.dumps to serialize them.
+    """
+
+    __slots__ = ()
+
+    def to_json(self) -> dict:
+        raise NotImplementedError
+
+    def __eq__(self, other):
+        return type(other) is type(self) and self.to_json() == other.to_json()
+
+    __hash__ = None
+
+    def __repr__(self):
+        return f"{type(self).__name__}({self.to_json()!r})"
+
+class Link(Record):
+    __slots__ = ("text", "host", "path")
+
+    def __init__(self, text: str, href: str):
+        self.text = text
+        self.host, self.path = split_url(href)
+
+    @property
+    def href(self) -> str:
+        return self.host + self.path
+
+    def to_json(self) -> dict:
+        return {"text": self.text, "href": self.host + self.path}
+
+class Image(Record):
+    __slots__ = ("host", "path", "alt", "width", "height")
+
+    def __init__(self, src: str, alt: str, width: str = None, height: str = None):
+        self.host, self.path = split_url(src)
+        self.alt = alt
+        self.width = _intern(width)
+        self.height = _intern(height)
+
+    @property
+    def src(self) -> str:
+        return self.host + self.path
+
+    def to_json(self) -> dict:
+        return {"src": self.host + self.path, "alt": self.alt, "width": self.width, "height": self.height}
+
+class CustomMatch(Record):
+    __slots__ = ("selector", "text", "html")
+
+    def __init__(self, selector: str, text: str, html: str):
+        self.selector = sys.intern(selector)
+        self.text = text
+        self.html = html
+
+    def to_json(self) -> dict:
+        return {"selector": self.selector, "text": self.text, "html": self.html}
+
+def encode_record(value):
+    """json.dumps `default=` hook for Record instances"""
+    if isinstance(value, Record):
+        return value.to_json()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
@@ -0,0 +1,126 @@
+from cachetools import TTLCache
+import asyncio
+import heapq
+import logging
+import os
+import random
+import time
+from .limits import HostLimiter
+
+logger = logging.getLogger("webtapi.refresher")
+
+# Configuration
+REFRESH_CONCURRENCY = int(os.getenv("REFRESH_CONCURRENCY", 8))
+REFRESH_PER_HOST = int(os.getenv("REFRESH_PER_HOST", 2))
+REFRESH_LEAD = float(os.getenv("REFRESH_LEAD", 0.2))
+REFRESH_JITTER = float(os.getenv("REFRESH_JITTER", 0.1))
+REFRESH_RETRY_SECONDS = int(os.getenv("REFRESH_RETRY_SECONDS", 300))
+# Failed endpoints remembered for backoff; past this, the oldest may retry early
+REFRESH_RETRY_MAX = int(os.getenv("REFRESH_RETRY_MAX", 10000))
+
+class Refresher:
+    """Background re-scraping of live endpoints.
+    
+    A read of a stale endpoint queues an immediate refresh while the stale
+    data is served (stale-while-revalidate). A read of a fresh endpoint
+    schedules a proactive refresh `lead` x TTL before it goes stale, with
+    +/- `jitter` x TTL of randomness, so only endpoints that are actually
+    read get re-scraped and their refreshes spread out. Refreshes run with
+    a global and a per-host concurrency limit.
+    """
+    
+    def __init__(self, store, extract, concurrency: int = REFRESH_CONCURRENCY,
+                 per_host: int = REFRESH_PER_HOST, lead: float = REFRESH_LEAD,
+                 jitter: float = REFRESH_JITTER):
+        self.store = store
+        self.extract = extract
+        self.lead = lead
+        self.jitter = jitter
+        self._limiter = HostLimiter(concurrency, per_host)
+        self._queue = []
+        self._scheduled = {}
+        self._inflight = set()
+        # Entries lapse when their backoff ends, so endpoints that keep failing don't pile up
+        self._retry_at = TTLCache(maxsize=REFRESH_RETRY_MAX, ttl=REFRESH_RETRY_SECONDS, timer=time.time)
+        self._tasks = set()
+        self._wakeup = asyncio.Event()
+        self._runner = None
+        self.counters = {"stale_reads": 0, "refreshed": 0, "failed": 0}
+    
+    def start(self):
+        self._runner = asyncio.create_task(self._run())
+    
+    async def stop(self):
+        if self._runner is not None:
+            self._runner.cancel()
+        for task in list(self._tasks):
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+    
+    def touch(self, endpoint_id: str, meta: dict):
+        """Record a read of an endpoint"""
+        if not meta.get("url") or not meta.get("plan"):
+            return
+        now = time.time()
+        if meta["fresh_until"] <= now:
+            self.counters["stale_reads"] += 1
+            self._schedule(endpoint_id, now)
+        elif endpoint_id not in self._scheduled:
+            offset = self.lead + random.uniform(-self.jitter, self.jitter)
+            self._schedule(endpoint_id, max(now, meta["fresh_until"] - meta["ttl"] * offset))
+    
+    def stats(self) -> dict:
+        return {**self.counters, "scheduled": len(self._scheduled), "in_flight": len(self._inflight),
+                "backing_off": self._retry_at.currsize}
+    
+    def _schedule(self, endpoint_id: str, due: float):
+        due = max(due, self._retry_at.get(endpoint_id, 0))
+        current = self._scheduled.get(endpoint_id)
+        if endpoint_id in self._inflight or (current is not None and current <= due):
+            return
+        self._scheduled[endpoint_id] = due
+        heapq.heappush(self._queue, (due, endpoint_id))
+        self._wakeup.set()
+    
+    async def _run(self):
+        while True:
+            now = time.time()
+            while self._queue and self._queue[0][0] <= now:
+                due, endpoint_id = heapq.heappop(self._queue)
+                # Skip heap entries superseded by an earlier reschedule
+                if self._scheduled.get(endpoint_id) != due:
+                    continue
+                del self._scheduled[endpoint_id]
+                self._inflight.add(endpoint_id)
+                task = asyncio.create_task(self._refresh(endpoint_id))
+                self._tasks.add(task)
+                task.add_done_callback(self._tasks.discard)
+            
+            self._wakeup.clear()
+            timeout = self._queue[0][0] - now if self._queue else None
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+    
+    async def _refresh(self, endpoint_id: str):
+        try:
+            meta = await asyncio.to_thread(self.store.load_meta, endpoint_id)
+            if meta is None:
+                # Expired or deleted; nothing left to back off from
+                self._retry_at.pop(endpoint_id, None)
+                return
+            async with self._limiter.slot(meta["url"]):
+                data = await self.extract(meta["url"], meta["plan"])
+            await asyncio.to_thread(
+                self.store.save, endpoint_id, data, meta["output_format"], meta["ttl"], meta["url"], meta["plan"]
+            )
+            self._retry_at.pop(endpoint_id, None)
+            self.counters["refreshed"] += 1
+        except Exception as e:
+            # Keep serving the stale copy and back off before trying again
+            logger.warning(f"Refresh of {endpoint_id} failed: {str(e)}")
+            self._retry_at[endpoint_id] = time.time() + REFRESH_RETRY_SECONDS
+            self.counters["failed"] += 1
+        finally:
+            self._inflight.discard(endpoint_id)
@@ -0,0 +1,257 @@
+import heapq
+import logging
+import mmap
+import os
+import threading
+
+logger = logging.getLogger("webtapi.result_cache")
+
+# Configuration
+# Compressed section bytes kept in each process; 0 disables the cache
+RESULT_CACHE_MAX_BYTES = int(os.getenv("RESULT_CACHE_MAX_BYTES", 64 * 1024 * 1024))
+# Directory shared by the workers on one host, so each finds the sections the others wrote
+RESULT_CACHE_DIR = os.getenv("RESULT_CACHE_DIR", "")
+RESULT_CACHE_DIR_MAX_BYTES = int(os.getenv("RESULT_CACHE_DIR_MAX_BYTES", 1024 * 1024 * 1024))
+# Each mapping holds a file descriptor: smaller files are read into memory, and mappings are capped
+RESULT_CACHE_MAP_MIN_BYTES = int(os.getenv("RESULT_CACHE_MAP_MIN_BYTES", 256 * 1024))
+RESULT_CACHE_MAX_MAPS = int(os.getenv("RESULT_CACHE_MAX_MAPS", 128))
+
+def _close(blob):
+    try:
+        blob.close()
+    except BufferError:
+        # A reader still holds a view; the mapping is released with its last reference
+        pass
+
+class ResultCache:
+    """Byte-budgeted cache of compressed endpoint sections, keyed by digest.
+    
+    Eviction is GDSF (greedy-dual-size-frequency): an entry's priority is
+    the cache's inflation value plus its hit count divided by its size,
+    and evicting the lowest-priority entry raises the inflation value to
+    its priority. A huge section has to be read proportionally more often
+    than small ones to stay, and entries nobody reads any more age out.
+    Sections are immutable per digest, so nothing is ever invalidated.
+    
+    With `directory` set, sections are also written there and read back,
+    so the uvicorn workers on a host find each other's sections without
+    querying the store. Files of at least `map_min_bytes` are mapped, which
+    shares one copy in the page cache, up to `max_maps` mappings at a time;
+    each holds a file descriptor. Readers get a memoryview of a mapping, so
+    one evicted meanwhile stays valid until they are done with it.
+    """
+    
+    # Directory sizes are re-counted after this many writes
+    TRIM_EVERY = 64
+    
+    def __init__(self, max_bytes: int = RESULT_CACHE_MAX_BYTES, directory: str = RESULT_CACHE_DIR,
+                 directory_max_bytes: int = RESULT_CACHE_DIR_MAX_BYTES, map_min_bytes: int = RESULT_CACHE_MAP_MIN_BYTES,
+                 max_maps: int = RESULT_CACHE_MAX_MAPS):
+        self.max_bytes = max_bytes
+        self.directory = directory
+        self.directory_max_bytes = directory_max_bytes
+        self.map_min_bytes = map_min_bytes
+        self.max_maps = max_maps
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # digest -> [blob, hits, priority, uncompressed size or None]
+        self._entries = {}
+        # (priority, digest); entries whose priority changed since are skipped when popped
+        self._heap = []
+        self._inflation = 0.0
+        self._bytes = 0
+        self._mapped_bytes = 0
+        self._maps = 0
+        self._disk_bytes = 0
+        self._lock = threading.Lock()
+        self.counters = {
+            "hits": 0,
+            "misses": 0,
+            "disk_hits": 0,
+            "evictions": 0,
+            "rejected": 0,
+            "disk_writes": 0,
+            "disk_evictions": 0
+        }
+        if directory:
+            self.trim_directory()
+    
+    def get_many(self, digests, sizes: dict = None) -> dict:
+        """{digest: compressed blob} for the cached subset of `digests`; `sizes` as for `put_many`"""
+        found = {}
+        missing = []
+        with self._lock:
+            for digest in digests:
+                entry = self._entries.get(digest)
+                if entry is None:
+                    missing.append(digest)
+                    continue
+                entry[1] += 1
+                self._prioritize(digest, entry)
+                found[digest] = self._view(entry[0])
+            self.counters["hits"] += len(found)
+        for digest in missing:
+            blob = self._load(digest) if self.directory else None
+            if blob is None:
+                self.counters["misses"] += 1
+                continue
+            self.counters["disk_hits"] += 1
+            with self._lock:
+                found[digest] = self._view(self._admit(digest, blob, (sizes or {}).get(digest)))
+        return found
+    
+    def put_many(self, blobs: dict, sizes: dict = None):
+        """Cache compressed blobs by digest; `sizes` are their uncompressed sizes where known"""
+        sizes = sizes or {}
+        for digest, blob in blobs.items():
+            if len(blob) > self.max_bytes:
+                self.counters["rejected"] += 1
+                continue
+            if self.directory:
+                # Keep the mapping rather than a private copy when the write works
+                blob = self._spill(digest, blob) or blob
+            with self._lock:
+                self._admit(digest, blob, sizes.get(digest))
+    
+    @staticmethod
+    def _view(blob):
+        return memoryview(blob) if isinstance(blob, mmap.mmap) else blob
+    
+    def _admit(self, digest: str, blob, raw_size):
+        """Cache `blob` and return the copy readers should use"""
+        entry = self._entries.get(digest)
+        if entry is not None or len(blob) > self.max_bytes:
+            if entry is not None and isinstance(blob, mmap.mmap):
+                _close(blob)
+                return entry[0]
+            return blob
+        if isinstance(blob, mmap.mmap) and self._maps >= self.max_maps:
+            # Out of mappings: keep a private copy and give the descriptor back
+            mapped, blob = blob, blob[:]
+            _close(mapped)
+        self._bytes += len(blob)
+        while self._bytes > self.max_bytes and self._entries:
+            self._evict()
+        entry = [blob, 1, 0.0, raw_size]
+        if isinstance(blob, mmap.mmap):
+            self._mapped_bytes += len(blob)
+            self._maps += 1
+        self._entries[digest] = entry
+        self._prioritize(digest, entry)
+        return blob
+    
+    def _prioritize(self, digest: str, entry: list):
+        entry[2] = self._inflation + entry[1] / max(1, len(entry[0]))
+        heapq.heappush(self._heap, (entry[2], digest))
+        # Every hit pushes a new heap item; drop the outdated ones now and then
+        if len(self._heap) > 4 * len(self._entries) + 64:
+            self._heap = [(entry[2], digest) for digest, entry in self._entries.items()]
+            heapq.heapify(self._heap)
+    
+    def _evict(self):
+        while self._heap:
+            priority, digest = heapq.heappop(self._heap)
+            entry = self._entries.get(digest)
+            if entry is None or entry[2] != priority:
+                continue
+            del self._entries[digest]
+            self._inflation = priority
+            self._bytes -= len(entry[0])
+            if isinstance(entry[0], mmap.mmap):
+                self._mapped_bytes -= len(entry[0])
+                self._maps -= 1
+                _close(entry[0])
+            self.counters["evictions"] += 1
+            return
+    
+    def _path(self, digest: str) -> str:
+        return os.path.join(self.directory, f"{digest}.section")
+    
+    def _load(self, digest: str):
+        """A shared file's contents: mapped if it is large enough, else read; None if it is gone"""
+        try:
+            with open(self._path(digest), "rb") as f:
+                if os.fstat(f.fileno()).st_size < self.map_min_bytes:
+                    blob = f.read()
+                else:
+                    blob = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError):
+            return None
+        try:
+            # Recently read files survive directory trimming
+            os.utime(self._path(digest))
+        except OSError:
+            pass
+        return blob
+    
+    def _spill(self, digest: str, blob: bytes):
+        """Write `blob` to the shared directory once; returns its mapping if it is to be mapped, else None"""
+        path = self._path(digest)
+        if not os.path.exists(path):
+            # Written under a private name first, so other workers never map half a file
+            temp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            try:
+                with open(temp, "wb") as f:
+                    f.write(blob)
+                os.replace(temp, path)
+            except OSError as e:
+                logger.warning(f"Result cache write failed: {str(e)}")
+                return None
+            self.counters["disk_writes"] += 1
+            self._disk_bytes += len(blob)
+            if self.counters["disk_writes"] % self.TRIM_EVERY == 0:
+                self.trim_directory()
+        if len(blob) < self.map_min_bytes:
+            # Small enough that the private copy costs less than a descriptor
+            return None
+        return self._load(digest)
+    
+    def trim_directory(self):
+        """Delete the least recently read files until the directory fits its budget"""
+        files = []
+        try:
+            with os.scandir(self.directory) as entries:
+                for entry in entries:
+                    if not entry.name.endswith(".section"):
+                        continue
+                    try:
+                        stat = entry.stat()
+                    except OSError:
+                        # Removed by another worker meanwhile
+                        continue
+                    files.append((stat.st_mtime, stat.st_size, entry.path))
+        except OSError as e:
+            logger.warning(f"Result cache directory scan failed: {str(e)}")
+            return
+        total = sum(size for _, size, _ in files)
+        files.sort()
+        for _, size, path in files:
+            if total <= self.directory_max_bytes:
+                break
+            try:
+                # Workers that mapped it keep their mapping
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            self.counters["disk_evictions"] += 1
+        self._disk_bytes = total
+    
+    def stats(self) -> dict:
+        with self._lock:
+            known = [(entry[3], len(entry[0])) for entry in self._entries.values() if entry[3] is not None]
+            entries = len(self._entries)
+        lookups = self.counters["hits"] + self.counters["disk_hits"] + self.counters["misses"]
+        compressed = sum(size for _, size in known)
+        return {
+            **self.counters,
+            "entries": entries,
+            # Private to this process; mapped sections live in the shared page cache
+            "resident_bytes": self._bytes - self._mapped_bytes,
+            "mapped_bytes": self._mapped_bytes,
+            "mappings": self._maps,
+            "max_bytes": self.max_bytes,
+            "disk_bytes": self._disk_bytes,
+            "compression_ratio": round(sum(raw for raw, _ in known) / compressed, 2) if compressed else None,
+            "hit_ratio": round((lookups - self.counters["misses"]) / lookups, 4) if lookups else 0.0
+        }
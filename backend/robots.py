@@ -0,0 +1,109 @@
+from cachetools import LRUCache
+from urllib.parse import urlsplit
+from urllib.robotparser import RobotFileParser
+import asyncio
+import logging
+import os
+import time
+from .limits import HostBusy
+
+logger = logging.getLogger("webtapi.robots")
+
+# Configuration
+FETCH_ROBOTS = os.getenv("FETCH_ROBOTS", "off").lower() in ("1", "true", "yes", "on")
+ROBOTS_USER_AGENT = os.getenv("ROBOTS_USER_AGENT", "webtapi")
+ROBOTS_CACHE_SIZE = int(os.getenv("ROBOTS_CACHE_SIZE", 4096))
+ROBOTS_TTL = int(os.getenv("ROBOTS_TTL", 3600))
+# Unreachable robots.txt means "disallow everything" (RFC 9309), so don't remember that for long
+ROBOTS_ERROR_TTL = int(os.getenv("ROBOTS_ERROR_TTL", 60))
+ROBOTS_MAX_BYTES = int(os.getenv("ROBOTS_MAX_BYTES", 512 * 1024))
+
+class RobotsDisallowed(Exception):
+    """robots.txt does not allow fetching the URL"""
+
+class RobotsCache:
+    """Parsed robots.txt per origin, fetched once and shared by concurrent lookups.
+    
+    `get_client` and `get_scheduler` return the HTTP client and host
+    scheduler to use, so robots.txt fetches count against the host's
+    limits like any other request.
+    """
+    
+    def __init__(self, get_client, get_scheduler, user_agent: str = ROBOTS_USER_AGENT,
+                 size: int = ROBOTS_CACHE_SIZE, ttl: int = ROBOTS_TTL, error_ttl: int = ROBOTS_ERROR_TTL):
+        self._get_client = get_client
+        self._get_scheduler = get_scheduler
+        self.user_agent = user_agent
+        self.ttl = ttl
+        self.error_ttl = error_ttl
+        # origin -> (parser, expires_at)
+        self._cache = LRUCache(maxsize=size)
+        self._inflight = {}
+        self.counters = {"hits": 0, "misses": 0, "coalesced": 0, "disallowed": 0, "errors": 0}
+    
+    async def rules(self, url: str) -> RobotFileParser:
+        parts = urlsplit(url)
+        origin = f"{parts.scheme}://{parts.netloc}"
+        cached = self._cache.get(origin)
+        if cached is not None and cached[1] > time.time():
+            self.counters["hits"] += 1
+            return cached[0]
+        
+        task = self._inflight.get(origin)
+        if task is not None:
+            self.counters["coalesced"] += 1
+        else:
+            self.counters["misses"] += 1
+            task = asyncio.ensure_future(self._fetch(origin))
+            self._inflight[origin] = task
+            task.add_done_callback(lambda _: self._inflight.pop(origin, None))
+        return await asyncio.shield(task)
+    
+    async def _fetch(self, origin: str) -> RobotFileParser:
+        parser = RobotFileParser(origin + "/robots.txt")
+        ttl = self.ttl
+        try:
+            status, body = await self._download(origin + "/robots.txt")
+            if status >= 500:
+                raise ValueError(f"status {status}")
+            if status >= 400:
+                # No robots.txt: everything is allowed
+                parser.allow_all = True
+            else:
+                parser.parse(body.decode("utf-8", "replace").splitlines())
+        except HostBusy:
+            # The page fetch would be turned away too; nothing worth caching
+            raise
+        except Exception as e:
+            logger.warning(f"robots.txt for {origin} unavailable: {str(e)}")
+            self.counters["errors"] += 1
+            parser.disallow_all = True
+            ttl = self.error_ttl
+        self._cache[origin] = (parser, time.time() + ttl)
+        return parser
+    
+    async def _download(self, url: str):
+        """(status, body) with the body cut at ROBOTS_MAX_BYTES while it downloads"""
+        async with self._get_scheduler().slot(url) as observe:
+            async with self._get_client().stream("GET", url) as response:
+                observe(response.status_code, response.headers)
+                body = bytearray()
+                if response.status_code < 400:
+                    async for chunk in response.aiter_bytes():
+                        body += chunk
+                        if len(body) >= ROBOTS_MAX_BYTES:
+                            # RFC 9309: rules past the size limit may be ignored
+                            break
+                return response.status_code, bytes(body[:ROBOTS_MAX_BYTES])
+    
+    async def check(self, url: str):
+        """Raise RobotsDisallowed unless robots.txt allows `url`; returns its Crawl-delay, if any"""
+        parser = await self.rules(url)
+        if not parser.can_fetch(self.user_agent, url):
+            self.counters["disallowed"] += 1
+            raise RobotsDisallowed(f"robots.txt disallows {url}")
+        delay = parser.crawl_delay(self.user_agent)
+        return float(delay) if delay else None
+    
+    def stats(self) -> dict:
+        return {**self.counters, "entries": len(self._cache)}
@@ -1,115 +1,351 @@
-import requests
-from bs4 import BeautifulSoup
-import pandas as pd
-import readability
-from htmldate import find_date
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+import asyncio
+import httpcore
+import httpx
+import lxml.html
+import os
+import random
 import re
-from urllib.parse import urljoin
 import logging
+from .article import extract_article, tree_document
+from .css import compile_filters
+from .extractors import ELEMENT_TAGS, text_of, image_record, link_record, table_record, custom_record
+from .security import HostBlocked, PinnedBackend, resolver
+from .limits import HostScheduler, HostBusy, parse_retry_after, FETCH_RETRY_MAX_WAIT
+from .robots import RobotsCache, RobotsDisallowed, FETCH_ROBOTS
+from .fetch_cache import FetchCache, CacheEntry, normalize_url
+from .streaming import StreamExtractor
+from .workers import ParserPool, PoolBusy, PARSE_WORKERS
+from .metrics import stage
 
 logger = logging.getLogger("webtapi.scraper")
 
-def extract_data(url: str, plan: dict) -> dict:
-    """Extract structured data based on AI-generated plan"""
-    try:
-        headers = {
-            "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36",
-            "Accept-Language": "en-US,en;q=0.9"
-        }
-        
-        response = requests.get(url, headers=headers, timeout=30)
-        response.raise_for_status()
-        
-        soup = BeautifulSoup(response.content, 'lxml')
+# Configuration
+FETCH_MAX_BYTES = int(os.getenv("FETCH_MAX_BYTES", 50 * 1024 * 1024))
+FETCH_BUFFER_BYTES = int(os.getenv("FETCH_BUFFER_BYTES", 8 * 1024 * 1024))
+FETCH_CONTENT_TYPES = set(os.getenv("FETCH_CONTENT_TYPES", "text/html,application/xhtml+xml").split(","))
+FETCH_RETRIES = int(os.getenv("FETCH_RETRIES", 2))
+FETCH_RETRY_BASE = float(os.getenv("FETCH_RETRY_BASE", 0.5))
+
+# Worth another try after a pause; anything else fails straight away
+_RETRY_STATUSES = {429, 502, 503, 504}
+
+_META_CHARSET = re.compile(rb"<meta[^>]+charset", re.I)
+
+HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36",
+    "Accept-Language": "en-US,en;q=0.9"
+}
+
+# Shared keep-alive connection pool for target-site fetches
+_client = None
+
+def get_client() -> httpx.AsyncClient:
+    """Return the pooled HTTP client, creating it on first use"""
+    global _client
+    if _client is None or _client.is_closed:
+        transport = httpx.AsyncHTTPTransport(
+            limits=httpx.Limits(max_connections=100, max_keepalive_connections=20)
+        )
+        # Connect to the addresses validate_url vetted instead of resolving again. httpx has no
+        # public hook for the network backend, so check the pool really has one to replace:
+        # assigning a renamed attribute would silently leave connections unpinned
+        pool = getattr(transport, "_pool", None)
+        if not isinstance(getattr(pool, "_network_backend", None), httpcore.AsyncNetworkBackend):
+            raise RuntimeError("Unsupported httpcore version: cannot pin connections to vetted addresses")
+        pool._network_backend = PinnedBackend(resolver)
+        _client = httpx.AsyncClient(
+            headers=HEADERS,
+            timeout=30,
+            follow_redirects=True,
+            transport=transport
+        )
+    return _client
+
+# Responses and parsed trees shared across /generate calls
+fetch_cache = FetchCache()
+
+# Per-host rate limits, adaptive concurrency and backoff for target sites
+scheduler = HostScheduler()
+robots = RobotsCache(get_client, lambda: scheduler)
+
+# Optional process pool for parsing (PARSE_WORKERS > 0)
+parser_pool = ParserPool() if PARSE_WORKERS > 0 else None
+
+async def close_client():
+    """Close the pooled HTTP client and parser workers"""
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+    if parser_pool is not None:
+        await parser_pool.close()
+
+class PageTooLarge(Exception):
+    """The page exceeds FETCH_MAX_BYTES"""
+
+class UnsupportedContentType(Exception):
+    """The response is not an HTML document"""
+
+class StreamedPage:
+    """An oversized page that was extracted incrementally while downloading"""
+    
+    def __init__(self, results: dict):
+        self.results = results
+
+def sniff_encoding(head: bytes, encoding: str = None):
+    """Encoding to parse with: the header charset, lxml's own <meta> detection, or UTF-8"""
+    if encoding or _META_CHARSET.search(head[:2048]):
+        return encoding
+    return "utf-8"
+
+def _check_content_type(headers):
+    content_type = headers.get("content-type", "").split(";")[0].strip().lower()
+    if content_type and content_type not in FETCH_CONTENT_TYPES:
+        raise UnsupportedContentType(f"Unsupported content type: {content_type}")
+
+async def fetch_page(url: str, plan: dict = None):
+    """Fetch a page through the cache, revalidating stored copies.
+    
+    Bodies up to FETCH_BUFFER_BYTES are buffered and returned as a
+    CacheEntry. Larger ones, up to FETCH_MAX_BYTES, are run through a
+    StreamExtractor for `plan` while they download and come back as a
+    StreamedPage; without a plan they are rejected.
+    
+    Requests go through the per-host scheduler, and 429/5xx answers and
+    connection errors are retried FETCH_RETRIES times with jittered backoff.
+    """
+    key = normalize_url(url)
+    cached = fetch_cache.get(key)
+    if cached is not None and cached.is_fresh():
+        fetch_cache.counters["hits"] += 1
+        return cached
+    
+    if FETCH_ROBOTS:
+        delay = await robots.check(url)
+        if delay:
+            scheduler.cap_rate(url, 1 / delay)
+    
+    headers = cached.validators() if cached is not None else {}
+    attempt = 0
+    while True:
+        retry_after = None
+        try:
+            async with scheduler.slot(url) as observe:
+                async with get_client().stream("GET", url, headers=headers) as response:
+                    observe(response.status_code, response.headers)
+                    if response.status_code not in _RETRY_STATUSES:
+                        return await _receive(url, plan, key, cached, response)
+                    retry_after = parse_retry_after(response.headers.get("retry-after"))
+                    if attempt >= FETCH_RETRIES:
+                        if response.status_code == 429 or retry_after is not None:
+                            raise HostBusy(urlsplit(url).hostname or "", retry_after or 0)
+                        return await _receive(url, plan, key, cached, response)
+        except httpx.TransportError as e:
+            # Refused addresses stay refused
+            if attempt >= FETCH_RETRIES or isinstance(e.__cause__, HostBlocked):
+                raise
         
-        results = {
+        # Full jitter keeps retries from many requests from arriving together
+        delay = random.uniform(0, FETCH_RETRY_BASE * 2 ** attempt)
+        if retry_after is not None:
+            if retry_after > FETCH_RETRY_MAX_WAIT:
+                raise HostBusy(urlsplit(url).hostname or "", retry_after)
+            delay = max(delay, retry_after)
+        attempt += 1
+        scheduler.counters["retries"] += 1
+        await asyncio.sleep(delay)
+
+async def _receive(url: str, plan: dict, key: str, cached, response: httpx.Response):
+    if response.status_code == 304 and cached is not None:
+        fetch_cache.counters["revalidated"] += 1
+        cached.refresh(response.headers, fetch_cache.fresh_seconds)
+        return cached
+    
+    response.raise_for_status()
+    _check_content_type(response.headers)
+    declared = response.headers.get("content-length", "")
+    if declared.isdigit() and int(declared) > FETCH_MAX_BYTES:
+        raise PageTooLarge(f"Page is larger than {FETCH_MAX_BYTES} bytes")
+    fetch_cache.counters["misses"] += 1
+    
+    chunks = []
+    received = 0
+    feeder = None
+    async for chunk in response.aiter_bytes():
+        received += len(chunk)
+        if received > FETCH_MAX_BYTES:
+            raise PageTooLarge(f"Page is larger than {FETCH_MAX_BYTES} bytes")
+        if feeder is None and received > FETCH_BUFFER_BYTES:
+            if plan is None:
+                raise PageTooLarge(f"Page is larger than {FETCH_BUFFER_BYTES} bytes")
+            # Too big to buffer: switch to incremental extraction
+            head = b"".join(chunks)
+            chunks = None
+            feeder = _StreamFeeder(StreamExtractor(url, plan, sniff_encoding(head, response.charset_encoding)))
+            await feeder.feed(head)
+        if feeder is not None:
+            await feeder.feed(chunk)
+        else:
+            chunks.append(chunk)
+    
+    if feeder is not None:
+        extractor = feeder.extractor
+        content = await feeder.close()
+        return StreamedPage({
             "metadata": {
                 "url": url,
-                "timestamp": find_date(response.text) or "Unknown",
+                "timestamp": extractor.timestamp or "Unknown",
                 "status_code": response.status_code
             },
-            "content": {}
-        }
-        
-        # Extract based on AI plan
-        if "text" in plan["elements"]:
-            try:
-                doc = readability.Document(response.text)
-                results["content"]["article"] = {
-                    "title": doc.title(),
-                    "content": doc.summary()
-                }
-            except Exception as e:
-                logger.warning(f"Article extraction failed: {str(e)}")
-                results["content"]["text"] = [p.get_text(strip=True) for p in soup.find_all("p")]
-        
-        if "images" in plan["elements"]:
-            images = []
-            for img in soup.find_all("img"):
-                src = img.get("src", "") or img.get("data-src", "")
-                if not src:
-                    continue
-                    
-                # Resolve relative URLs
-                src = urljoin(url, src)
-                
-                images.append({
-                    "src": src,
-                    "alt": img.get("alt", "")[:100],
-                    "width": img.get("width"),
-                    "height": img.get("height")
-                })
-            results["content"]["images"] = images
-        
-        if "tables" in plan["elements"]:
-            tables = []
-            for i, table in enumerate(soup.find_all("table")):
-                try:
-                    df = pd.read_html(str(table))[0]
-                    tables.append({
-                        "table_index": i,
-                        "html": str(table),
-                        "markdown": df.to_markdown(),
-                        "json": df.to_dict(orient="records")
-                    })
-                except Exception as e:
-                    logger.debug(f"Table extraction failed: {str(e)}")
-                    continue
-            results["content"]["tables"] = tables
-        
-        if "links" in plan["elements"]:
-            links = []
-            for a in soup.find_all("a"):
-                href = a.get("href", "")
-                if not href or href.startswith(("#", "javascript:")):
-                    continue
-                    
-                # Resolve relative URLs
-                href = urljoin(url, href)
-                
-                links.append({
-                    "text": a.get_text(strip=True)[:200],
-                    "href": href
-                })
-            results["content"]["links"] = links
-        
-        # Add custom extraction based on plan filters
-        if plan.get("filters"):
-            custom_elements = []
-            for selector in plan["filters"].get("include_selectors", []):
-                for el in soup.select(selector):
-                    custom_elements.append({
-                        "selector": selector,
-                        "text": el.get_text(strip=True),
-                        "html": str(el)
-                    })
-            results["content"]["custom"] = custom_elements
-        
-        return results
+            "content": content
+        })
+    
+    entry = CacheEntry(
+        url,
+        b"".join(chunks),
+        response.charset_encoding,
+        response.status_code,
+        etag=response.headers.get("etag"),
+        last_modified=response.headers.get("last-modified")
+    )
+    fetch_cache.put(key, entry, response.headers)
+    return entry
+
+class _StreamFeeder:
+    """Feeds a StreamExtractor from one dedicated thread, overlapping parsing with the download"""
+    
+    def __init__(self, extractor: StreamExtractor):
+        self.extractor = extractor
+        # lxml parsers must stay on one thread
+        self._executor = ThreadPoolExecutor(max_workers=1)
+        self._pending = None
+    
+    async def feed(self, chunk: bytes):
+        # At most one chunk in flight keeps memory bounded when parsing lags
+        if self._pending is not None:
+            await self._pending
+        self._pending = asyncio.get_running_loop().run_in_executor(self._executor, self.extractor.feed, chunk)
+    
+    async def close(self) -> dict:
+        try:
+            if self._pending is not None:
+                await self._pending
+            return await asyncio.get_running_loop().run_in_executor(self._executor, self.extractor.close)
+        finally:
+            self._executor.shutdown(wait=False)
+
+async def extract_data(url: str, plan: dict) -> dict:
+    """Extract structured data based on AI-generated plan"""
+    try:
+        with stage("fetch"):
+            page = await fetch_page(url, plan)
+        if isinstance(page, StreamedPage):
+            return page.results
         
-    except requests.exceptions.RequestException as re:
-        logger.error(f"Network error: {str(re)}")
+        # Parsing is CPU-bound, keep it off the event loop
+        with stage("parse"):
+            if parser_pool is not None:
+                return await parser_pool.submit(url, page.content, page.encoding, page.status_code, plan)
+            return await asyncio.to_thread(
+                parse_page, url, page.content, page.encoding, page.status_code, plan, page.digest
+            )
+    
+    except (PoolBusy, PageTooLarge, UnsupportedContentType, HostBusy, RobotsDisallowed):
+        raise
+    except httpx.HTTPError as e:
+        logger.error(f"Network error: {str(e)}")
         raise Exception("Network error occurred during scraping")
     except Exception as e:
         logger.error(f"Extraction failed: {str(e)}")
-        raise Exception("Data extraction failed")
\ No newline at end of file
+        raise Exception("Data extraction failed")
+
+# htmldate is imported on first use: it loads dateparser and its locale
+# data, which alone is ~0.4 s of startup
+def _find_date(tree):
+    from htmldate import find_date
+    return find_date(tree)
+
+def preload():
+    """Import the parsing libraries ahead of the first page (blocking; run it in a thread)"""
+    tree_document()
+    import htmldate
+
+def build_tree(content: bytes, encoding: str = None) -> lxml.html.HtmlElement:
+    """Parse a page once into the lxml tree shared by every extractor"""
+    encoding = sniff_encoding(content, encoding)
+    
+    if not content.strip():
+        content = b"<html></html>"
+    
+    parser = lxml.html.HTMLParser(encoding=encoding)
+    return lxml.html.document_fromstring(content, parser=parser)
+
+def parse_page(url: str, content: bytes, encoding: str, status_code: int, plan: dict, digest: str = None) -> dict:
+    """Run the extraction plan against an already-fetched page"""
+    # Extractors only read the tree, so a cached one can be reused as-is
+    tree = fetch_cache.get_tree(digest) if digest else None
+    if tree is None:
+        with stage("parse.tree"):
+            tree = build_tree(content, encoding)
+        if digest:
+            fetch_cache.put_tree(digest, tree)
+    elements = plan["elements"]
+    
+    with stage("parse.date"):
+        timestamp = _find_date(tree) or "Unknown"
+    results = {
+        "metadata": {
+            "url": url,
+            "timestamp": timestamp,
+            "status_code": status_code
+        },
+        "content": {}
+    }
+    
+    # Compiled once per distinct set of selectors, shared across requests
+    selectors = compile_filters(plan.get("filters"))
+    
+    # Collect every requested element kind in a single traversal, skipping excluded subtrees
+    wanted = {tag for kind, tag in ELEMENT_TAGS if kind in elements}
+    found = {tag: [] for tag in wanted}
+    if wanted:
+        with stage("parse.collect"):
+            excluded = selectors.excluded(tree)
+            for el in tree.iter(*wanted):
+                if el not in excluded:
+                    found[el.tag].append(el)
+    
+    # Extract based on AI plan
+    if "text" in elements:
+        with stage("parse.article"):
+            try:
+                results["content"]["article"] = extract_article(tree, timestamp)
+            except Exception as e:
+                logger.warning(f"Article extraction failed: {str(e)}")
+                results["content"]["text"] = [text_of(p) for p in found["p"]]
+    
+    if "images" in elements:
+        with stage("parse.images"):
+            images = (image_record(img, url) for img in found["img"])
+            results["content"]["images"] = [record for record in images if record]
+    
+    if "tables" in elements:
+        with stage("parse.tables"):
+            tables = (table_record(i, table) for i, table in enumerate(found["table"]))
+            results["content"]["tables"] = [record for record in tables if record]
+    
+    if "links" in elements:
+        with stage("parse.links"):
+            links = (link_record(a, url) for a in found["a"])
+            results["content"]["links"] = [record for record in links if record]
+    
+    # Add custom extraction based on plan filters
+    if plan.get("filters"):
+        with stage("parse.custom"):
+            results["content"]["custom"] = [
+                custom_record(selector, el) for selector, matches in selectors.select(tree) for el in matches
+            ]
+    
+    return results
@@ -1,47 +1,292 @@
-import re
-import subprocess
+from cachetools import TLRUCache
 from urllib.parse import urlparse
+import asyncio
+import httpcore
+import ipaddress
+import os
+import re
+import shutil
+import socket
+import time
 import logging
 
 logger = logging.getLogger("webtapi.security")
 
-def validate_url(url: str) -> bool:
+# Configuration
+DNS_CACHE_SIZE = int(os.getenv("DNS_CACHE_SIZE", 4096))
+DNS_CACHE_TTL = int(os.getenv("DNS_CACHE_TTL", 300))
+DNS_CACHE_MIN_TTL = int(os.getenv("DNS_CACHE_MIN_TTL", 5))
+DNS_NEGATIVE_TTL = int(os.getenv("DNS_NEGATIVE_TTL", 30))
+# Hosts allowed to resolve to private addresses (local development, benchmarks)
+ALLOWED_PRIVATE_HOSTS = {host for host in os.getenv("ALLOWED_PRIVATE_HOSTS", "").split(",") if host}
+
+REPUTATION_SCAN = os.getenv("REPUTATION_SCAN", "auto")
+REPUTATION_TTL = int(os.getenv("REPUTATION_TTL", 86400))
+REPUTATION_TIMEOUT = int(os.getenv("REPUTATION_TIMEOUT", 10))
+REPUTATION_QUEUE_SIZE = int(os.getenv("REPUTATION_QUEUE_SIZE", 256))
+
+# Forms inet_aton accepts besides dotted quads: 2130706433, 0x7f000001, 0177.1
+_NUMERIC_HOST = re.compile(r"^(0x[0-9a-f]+|[0-9]+)(\.(0x[0-9a-f]+|[0-9]+)){0,3}$", re.I)
+
+class HostBlocked(httpcore.ConnectError):
+    """A connection was attempted to a host that resolves to a non-public address"""
+
+# Well-known NAT64 prefix (RFC 6052): the last 32 bits are the IPv4 destination
+_NAT64 = ipaddress.ip_network("64:ff9b::/96")
+# Local-use NAT64 (RFC 8215) and deprecated IPv4-compatible addresses also carry IPv4; never public
+_EMBEDDED_IPV4 = (ipaddress.ip_network("64:ff9b:1::/48"), ipaddress.ip_network("::/96"))
+
+def is_public_address(ip) -> bool:
+    """True for globally routable unicast addresses; IPv6 that embeds IPv4 is judged by the IPv4 address"""
+    if ip.version == 6:
+        if any(ip in network for network in _EMBEDDED_IPV4):
+            return False
+        if ip in _NAT64:
+            ip = ipaddress.IPv4Address(int(ip) & 0xFFFFFFFF)
+        elif ip.ipv4_mapped is not None or ip.sixtofour is not None:
+            ip = ip.ipv4_mapped or ip.sixtofour
+    return ip.is_global and not ip.is_multicast
+
+def _literal_address(host: str):
+    try:
+        return ipaddress.ip_address(host)
+    except ValueError:
+        pass
+    if _NUMERIC_HOST.match(host):
+        try:
+            return ipaddress.ip_address(socket.inet_aton(host))
+        except OSError:
+            pass
+    return None
+
+class Resolver:
+    """Resolves hostnames once and caches the addresses for their DNS TTL.
+    
+    TTLs come from dnspython when it is installed; otherwise, and for names
+    only the system resolver knows (/etc/hosts), getaddrinfo is used and
+    entries live for DNS_CACHE_TTL. The cached addresses are the ones the
+    fetch connects to, so a name is never looked up twice per request.
+    """
+    
+    def __init__(self, maxsize: int = DNS_CACHE_SIZE):
+        # Entries are (addresses, ttl) and expire individually
+        self._cache = TLRUCache(maxsize=maxsize, ttu=lambda key, value, now: now + value[1], timer=time.monotonic)
+        self._inflight = {}
+        self.counters = {"hits": 0, "misses": 0, "coalesced": 0, "failures": 0}
+        try:
+            import dns.asyncresolver
+            self._dns = dns.asyncresolver.Resolver()
+        except Exception:
+            self._dns = None
+    
+    async def resolve(self, host: str) -> list:
+        """Addresses for `host`, empty if it doesn't resolve"""
+        literal = _literal_address(host)
+        if literal is not None:
+            return [literal]
+        
+        cached = self._cache.get(host)
+        if cached is not None:
+            self.counters["hits"] += 1
+            return cached[0]
+        
+        # Single-flight: concurrent lookups of one name share a query
+        task = self._inflight.get(host)
+        if task is not None:
+            self.counters["coalesced"] += 1
+        else:
+            self.counters["misses"] += 1
+            task = asyncio.ensure_future(self._lookup(host))
+            self._inflight[host] = task
+            task.add_done_callback(lambda _: self._inflight.pop(host, None))
+        
+        addresses, ttl = await asyncio.shield(task)
+        self._cache[host] = (addresses, ttl)
+        return addresses
+    
+    async def _lookup(self, host: str):
+        if self._dns is not None:
+            try:
+                return await self._lookup_dns(host)
+            except Exception:
+                pass
+        try:
+            infos = await asyncio.get_running_loop().getaddrinfo(host, None, type=socket.SOCK_STREAM)
+        except OSError as e:
+            logger.info(f"Could not resolve {host}: {str(e)}")
+            self.counters["failures"] += 1
+            return [], DNS_NEGATIVE_TTL
+        addresses = list(dict.fromkeys(ipaddress.ip_address(info[4][0].split("%")[0]) for info in infos))
+        return addresses, DNS_CACHE_TTL
+    
+    async def _lookup_dns(self, host: str):
+        import dns.resolver
+        
+        async def query(rdtype):
+            try:
+                answer = await self._dns.resolve(host, rdtype, lifetime=5)
+            except dns.resolver.NoAnswer:
+                return [], None
+            return [ipaddress.ip_address(record.address) for record in answer], answer.rrset.ttl
+        
+        results = await asyncio.gather(query("A"), query("AAAA"))
+        addresses = [address for found, _ in results for address in found]
+        if not addresses:
+            raise LookupError(host)
+        ttl = min(ttl for found, ttl in results if ttl is not None)
+        return addresses, max(ttl, DNS_CACHE_MIN_TTL)
+    
+    async def public_addresses(self, host: str) -> list:
+        """Addresses to connect to, or [] if any of them is non-public"""
+        addresses = await self.resolve(host)
+        if host in ALLOWED_PRIVATE_HOSTS:
+            return addresses
+        # One private record is enough to refuse: rebinding setups mix them in
+        if not all(is_public_address(address) for address in addresses):
+            return []
+        return addresses
+    
+    def stats(self) -> dict:
+        return {**self.counters, "entries": len(self._cache), "ttl_source": "dns" if self._dns else "fixed"}
+
+class PinnedBackend(httpcore.AsyncNetworkBackend):
+    """Network backend that connects only to addresses the Resolver vetted.
+    
+    Requests keep their hostname for Host/SNI, but the TCP connection goes
+    to the cached address that validate_url checked, and hosts reached via
+    redirects are checked the same way before connecting.
+    """
+    
+    def __init__(self, resolver: Resolver, backend: httpcore.AsyncNetworkBackend = None):
+        self.resolver = resolver
+        self.backend = backend or httpcore.AnyIOBackend()
+    
+    async def connect_tcp(self, host, port, timeout=None, local_address=None, socket_options=None):
+        addresses = await self.resolver.public_addresses(host)
+        if not addresses:
+            raise HostBlocked(f"Refusing to connect to {host}: not a public address")
+        
+        error = None
+        for address in addresses:
+            try:
+                return await self.backend.connect_tcp(
+                    str(address), port, timeout=timeout, local_address=local_address, socket_options=socket_options
+                )
+            except (httpcore.ConnectError, httpcore.ConnectTimeout) as e:
+                error = e
+        raise error
+    
+    async def connect_unix_socket(self, path, timeout=None, socket_options=None):
+        raise HostBlocked("Unix sockets are not allowed")
+    
+    async def sleep(self, seconds: float):
+        await self.backend.sleep(seconds)
+
+class ReputationCache:
+    """Per-host verdicts from an out-of-band scanner.
+    
+    Hosts are scanned in the background after their first request; a host
+    the scanner flags is rejected by validate_url until its verdict expires.
+    Unknown hosts are allowed meanwhile. The scanner is gobuster, enabled
+    when REPUTATION_SCAN is "on", or "auto" and gobuster is on the PATH.
+    """
+    
+    def __init__(self, ttl: int = REPUTATION_TTL):
+        self.enabled = REPUTATION_SCAN == "on" or (REPUTATION_SCAN == "auto" and shutil.which("gobuster") is not None)
+        self._verdicts = TLRUCache(maxsize=DNS_CACHE_SIZE, ttu=lambda key, value, now: now + ttl, timer=time.monotonic)
+        self._queue = asyncio.Queue(maxsize=REPUTATION_QUEUE_SIZE)
+        self._pending = set()
+        self._task = None
+        self.counters = {"scanned": 0, "flagged": 0, "dropped": 0}
+    
+    def allowed(self, host: str) -> bool:
+        return self._verdicts.get(host, True)
+    
+    def schedule(self, url: str, host: str):
+        """Queue a scan of `host` unless it has a verdict or one is pending"""
+        if not self.enabled or self._task is None or host in self._verdicts or host in self._pending:
+            return
+        try:
+            self._queue.put_nowait((url, host))
+            self._pending.add(host)
+        except asyncio.QueueFull:
+            self.counters["dropped"] += 1
+    
+    def start(self):
+        if self.enabled and self._task is None:
+            self._task = asyncio.create_task(self._run())
+    
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+    
+    async def _run(self):
+        while True:
+            url, host = await self._queue.get()
+            try:
+                self._verdicts[host] = await self._scan(url)
+                self.counters["scanned"] += 1
+                if not self._verdicts[host]:
+                    self.counters["flagged"] += 1
+                    logger.warning(f"Host flagged by reputation scan: {host}")
+            except Exception as e:
+                logger.error(f"Reputation scan failed for {host}: {str(e)}")
+            finally:
+                self._pending.discard(host)
+    
+    async def _scan(self, url: str) -> bool:
+        # Check for disallowed paths
+        process = await asyncio.create_subprocess_exec(
+            "gobuster", "dir", "-u", url, "-w", "common.txt", "-t", "5", "-r",
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.DEVNULL
+        )
+        try:
+            stdout, _ = await asyncio.wait_for(process.communicate(), REPUTATION_TIMEOUT)
+        except asyncio.TimeoutError:
+            process.kill()
+            await process.wait()
+            return True  # Fail open, as an unscanned host would
+        return b"403" not in stdout and b"401" not in stdout
+    
+    def stats(self) -> dict:
+        return {**self.counters, "enabled": self.enabled, "verdicts": len(self._verdicts), "queued": self._queue.qsize()}
+
+resolver = Resolver()
+reputation = ReputationCache()
+
+async def validate_url(url: str) -> bool:
     """Perform security checks on target URL"""
     try:
         # Basic URL validation
         if not re.match(r"^https?://", url):
             return False
         
-        parsed = urlparse(url)
-        
-        # Block private/local networks
-        if parsed.hostname in ["localhost", "127.0.0.1"]:
-            return False
-        if parsed.hostname and (
-            parsed.hostname.startswith(("192.168.", "10.")) or 
-            parsed.hostname.startswith("172.") and 16 <= int(parsed.hostname.split(".")[1]) <= 31
-        ):
-            return False
-        
         # Check for common attack patterns
         if any(char in url for char in ["'", "\"", "<", ">", "\\", ".."]):
             return False
         
-        # Run security scans (if tools available)
-        try:
-            # Check for disallowed paths
-            gobuster = subprocess.run(
-                ["gobuster", "dir", "-u", url, "-w", "common.txt", "-t", "5", "-r"],
-                capture_output=True,
-                timeout=10
-            )
-            if b"403" in gobuster.stdout or b"401" in gobuster.stdout:
-                return False
-        except (subprocess.TimeoutExpired, FileNotFoundError):
-            pass  # Fail open if tools not available
+        host = urlparse(url).hostname
+        if not host:
+            return False
         
-        return True
+        # Block private/local networks by what the name actually resolves to
+        if not await resolver.public_addresses(host):
+            return False
         
+        if not reputation.allowed(host):
+            return False
+        reputation.schedule(url, host)
+        return True
+    
     except Exception as e:
         logger.error(f"Security validation error: {str(e)}")
-        return False
\ No newline at end of file
+        return False
+
+def security_stats() -> dict:
+    return {"dns": resolver.stats(), "reputation": reputation.stats()}
@@ -0,0 +1,485 @@
+from functools import lru_cache
+from urllib.parse import urlsplit
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from .records import encode_record
+
+logger = logging.getLogger("webtapi.store")
+
+# Configuration
+ENDPOINT_STORE_URL = os.getenv("ENDPOINT_STORE_URL", "sqlite:///endpoints.db")
+# Share of its TTL an endpoint outlives its freshness by, serving stale data while it refreshes
+ENDPOINT_STALE_FRACTION = float(os.getenv("ENDPOINT_STALE_FRACTION", 0.1))
+# Earlier versions of an endpoint kept for /api/{id}/changes
+ENDPOINT_HISTORY = int(os.getenv("ENDPOINT_HISTORY", 8))
+# Codec for new sections: "zstd" (needs the zstandard package, else zlib is used) or "zlib"
+ENDPOINT_COMPRESSION = os.getenv("ENDPOINT_COMPRESSION", "zstd").lower()
+# How often stats() re-counts live endpoints; counting scans the whole store
+ENDPOINT_COUNT_SECONDS = float(os.getenv("ENDPOINT_COUNT_SECONDS", 60))
+
+_ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+
+@lru_cache(maxsize=None)
+def _zstd():
+    """The zstandard module, or None when it isn't installed"""
+    try:
+        import zstandard
+    except ImportError:
+        return None
+    return zstandard
+
+def _encode(value) -> bytes:
+    return json.dumps(value, separators=(",", ":"), default=encode_record).encode("utf-8")
+
+def _compress(body: bytes) -> bytes:
+    zstd = _zstd() if ENDPOINT_COMPRESSION == "zstd" else None
+    if zstd is not None:
+        return zstd.ZstdCompressor(level=3).compress(body)
+    return zlib.compress(body, 6)
+
+def _unpack(blob):
+    # Sections of either codec stay readable, whatever ENDPOINT_COMPRESSION says now
+    if blob[:4] == _ZSTD_MAGIC:
+        zstd = _zstd()
+        if zstd is None:
+            raise RuntimeError("This section is zstd-compressed; install the zstandard package to read it")
+        return json.loads(zstd.ZstdDecompressor().decompress(blob))
+    return json.loads(zlib.decompress(blob))
+
+class EndpointStore:
+    """Persistent storage for generated endpoints.
+    
+    Each endpoint is stored as a small JSON metadata record plus one
+    compressed blob per content section (links, images, tables...), so a
+    client asking for a subset only pays for decompressing that subset.
+    Blobs are addressed by the SHA-256 of their JSON, so endpoints with
+    identical sections share one stored copy.
+    Saving new content under an existing id bumps its version and keeps
+    the previous section digests in `history`, along with their blobs.
+    With a `cache` (a ResultCache), compressed sections are served from
+    memory, or from its shared directory, before asking the backend.
+    Backends implement `_existing`, `_put_payloads`, `_write`, `_read`,
+    `_payloads`, `delete` and `count`.
+    """
+    
+    def __init__(self, cache=None, count_interval: float = ENDPOINT_COUNT_SECONDS):
+        self.cache = cache
+        self.count_interval = count_interval
+        self.counters = {"payloads_written": 0, "payloads_shared": 0, "bytes_encoded": 0, "bytes_compressed": 0}
+        # (count, when it was taken); /health and /metrics read this rather than counting each time
+        self._counted = (0, float("-inf"))
+    
+    def put_content(self, data: dict, ttl: int, stale_ttl: int = None) -> dict:
+        """Store each content section of `data` under its digest, compressing only new ones.
+        
+        Returns {"digests": {...}, "sizes": {...}} per section, for `save(content=...)`.
+        """
+        if stale_ttl is None:
+            stale_ttl = int(ttl * ENDPOINT_STALE_FRACTION)
+        encoded = {name: _encode(value) for name, value in data.get("content", {}).items()}
+        digests = {name: hashlib.sha256(body).hexdigest() for name, body in encoded.items()}
+        known = self._existing(set(digests.values()))
+        payloads = {}
+        sizes = {}
+        for name, digest in digests.items():
+            if digest not in known and digest not in payloads:
+                payloads[digest] = _compress(encoded[name])
+                sizes[digest] = len(encoded[name])
+        if payloads:
+            self._put_payloads(payloads, ttl + stale_ttl)
+            # Fresh endpoints are usually read right away
+            if self.cache is not None:
+                self.cache.put_many(payloads, sizes)
+        self.counters["payloads_written"] += len(payloads)
+        self.counters["bytes_encoded"] += sum(sizes.values())
+        self.counters["bytes_compressed"] += sum(len(blob) for blob in payloads.values())
+        self.counters["payloads_shared"] += len(set(digests.values())) - len(payloads)
+        return {"digests": digests, "sizes": {name: len(body) for name, body in encoded.items()}}
+    
+    def save(self, endpoint_id: str, data: dict, output_format: str, ttl: int,
+             url: str = None, plan: dict = None, stale_ttl: int = None, content: dict = None):
+        """Store extracted data, fresh for `ttl` seconds and kept `stale_ttl` longer.
+        
+        `stale_ttl` defaults to ENDPOINT_STALE_FRACTION of `ttl`. The
+        lifetime is fixed when the endpoint is created: saving over it (a
+        refresh) updates the data but never extends `expires_at`.
+        `url` and `plan` are kept so the endpoint can be re-scraped later.
+        `content` is the result of `put_content(data)` if the caller already
+        stored the sections. Returns the stored metadata record.
+        """
+        if stale_ttl is None:
+            stale_ttl = int(ttl * ENDPOINT_STALE_FRACTION)
+        if content is None:
+            content = self.put_content(data, ttl, stale_ttl)
+        previous = self.load_meta(endpoint_id)
+        version, history = self._next_version(previous, content["digests"])
+        now = time.time()
+        expires_at = previous["expires_at"] if previous is not None else now + ttl + stale_ttl
+        meta = {
+            "metadata": data.get("metadata", {}),
+            "sections": list(content["digests"]),
+            # Uncompressed JSON bytes per section
+            "sizes": content["sizes"],
+            "digests": content["digests"],
+            "version": version,
+            "history": history,
+            "output_format": output_format,
+            "url": url,
+            "plan": plan,
+            "ttl": ttl,
+            "created_at": now,
+            "fresh_until": min(now + ttl, expires_at),
+            "expires_at": expires_at
+        }
+        retained = {digest for entry in history for digest in entry["digests"].values()}
+        while self._write(endpoint_id, json.dumps(meta), content["digests"], expires_at - now, retained):
+            # A shared payload expired between storing and referencing it; store it again
+            self.put_content(data, ttl, stale_ttl)
+        return meta
+    
+    def _next_version(self, previous: dict, digests: dict):
+        """(version, history) for saving `digests` over `previous`, the endpoint's current meta"""
+        if previous is None:
+            return 1, []
+        version = previous.get("version", 1)
+        history = previous.get("history", [])
+        if previous["digests"] == digests:
+            # A refresh that found nothing new doesn't make a new version
+            return version, history
+        history = history + [{"version": version, "digests": previous["digests"], "created_at": previous["created_at"]}]
+        return version + 1, history[-ENDPOINT_HISTORY:] if ENDPOINT_HISTORY > 0 else []
+    
+    def load(self, endpoint_id: str, sections: list = None):
+        """Return the stored data, limited to `sections` if given, or None when missing or expired"""
+        record = self.load_record(endpoint_id, sections)
+        return record[1] if record is not None else None
+    
+    def load_record(self, endpoint_id: str, sections: list = None):
+        """Like `load`, but returns (meta, data)"""
+        record = self._read(endpoint_id, sections) if self.cache is None else self._read_cached(endpoint_id, sections)
+        if record is None:
+            return None
+        meta, blobs = record
+        return meta, {
+            "metadata": meta["metadata"],
+            "content": {name: _unpack(blobs[name]) for name in meta["sections"] if name in blobs}
+        }
+    
+    def load_meta(self, endpoint_id: str):
+        record = self._read(endpoint_id, [])
+        return record[0] if record is not None else None
+    
+    def load_payloads(self, digests) -> dict:
+        """Decoded sections by digest; digests no longer stored are left out"""
+        return {digest: _unpack(blob) for digest, blob in self._blobs(set(digests)).items()}
+    
+    def _read_cached(self, endpoint_id: str, sections: list = None):
+        """`_read`, with the sections of current endpoints looked up in the cache first"""
+        record = self._read(endpoint_id, [])
+        if record is None:
+            return None
+        meta = record[0]
+        names = [name for name in meta["sections"] if sections is None or name in sections]
+        digests = meta["digests"]
+        sizes = {digests[name]: meta["sizes"][name] for name in names if name in meta.get("sizes", {})}
+        blobs = self._blobs({digests[name] for name in names}, sizes)
+        return meta, {name: blobs[digests[name]] for name in names if digests[name] in blobs}
+    
+    def _blobs(self, digests: set, sizes: dict = None) -> dict:
+        """{digest: compressed blob} from the cache, then the backend"""
+        if self.cache is None:
+            return self._payloads(digests)
+        blobs = self.cache.get_many(digests, sizes)
+        missing = digests - blobs.keys()
+        if missing:
+            loaded = self._payloads(missing)
+            self.cache.put_many(loaded, sizes)
+            blobs.update(loaded)
+        return blobs
+    
+    def stats(self) -> dict:
+        encoded = self.counters["bytes_encoded"]
+        ratio = round(encoded / self.counters["bytes_compressed"], 2) if encoded else None
+        endpoints, counted_at = self._counted
+        if time.monotonic() - counted_at >= self.count_interval:
+            endpoints = self.count()
+            self._counted = (endpoints, time.monotonic())
+        return {**self.counters, "compression_ratio": ratio, "endpoints": endpoints}
+    
+    def close(self):
+        pass
+    
+    def _existing(self, digests: set) -> set:
+        """The subset of `digests` already stored"""
+        raise NotImplementedError
+    
+    def _put_payloads(self, payloads: dict, ttl: int):
+        """Store compressed sections (digest -> blob), kept at least `ttl` seconds"""
+        raise NotImplementedError
+    
+    def _write(self, endpoint_id: str, meta: str, digests: dict, ttl: int, retained: set = frozenset()) -> set:
+        """Store meta and point each section name at its digest.
+        
+        `retained` are digests of earlier versions, kept while the endpoint
+        lives if they are still stored. Returns the digests that are not
+        stored; nothing is written then.
+        """
+        raise NotImplementedError
+    
+    def _read(self, endpoint_id: str, sections: list = None):
+        """(meta dict, {section: blob}) for live endpoints, None otherwise"""
+        raise NotImplementedError
+    
+    def _payloads(self, digests: set) -> dict:
+        """{digest: blob} for the stored subset of `digests`"""
+        raise NotImplementedError
+    
+    def delete(self, endpoint_id: str):
+        raise NotImplementedError
+    
+    def count(self) -> int:
+        raise NotImplementedError
+
+class SQLiteStore(EndpointStore):
+    """Single-node store on an SQLite database in WAL mode"""
+    
+    PURGE_EVERY = 100
+    
+    def __init__(self, path: str, cache=None):
+        super().__init__(cache)
+        self.path = path
+        self._local = threading.local()
+        self._writes = 0
+        with self._conn() as conn:
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS endpoints (
+                    id TEXT PRIMARY KEY,
+                    meta TEXT NOT NULL,
+                    expires_at REAL NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS endpoints_expires ON endpoints (expires_at);
+                CREATE TABLE IF NOT EXISTS payloads (
+                    digest TEXT PRIMARY KEY,
+                    body BLOB NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS section_refs (
+                    endpoint_id TEXT NOT NULL REFERENCES endpoints (id) ON DELETE CASCADE,
+                    name TEXT NOT NULL,
+                    digest TEXT NOT NULL,
+                    PRIMARY KEY (endpoint_id, name)
+                );
+                CREATE INDEX IF NOT EXISTS section_refs_digest ON section_refs (digest);
+                CREATE TABLE IF NOT EXISTS history_refs (
+                    endpoint_id TEXT NOT NULL REFERENCES endpoints (id) ON DELETE CASCADE,
+                    digest TEXT NOT NULL,
+                    PRIMARY KEY (endpoint_id, digest)
+                );
+                CREATE INDEX IF NOT EXISTS history_refs_digest ON history_refs (digest);
+            """)
+    
+    def _conn(self) -> sqlite3.Connection:
+        # One connection per thread; WAL lets readers proceed during writes
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA foreign_keys=ON")
+            self._local.conn = conn
+        return conn
+    
+    def _existing(self, digests):
+        if not digests:
+            return set()
+        placeholders = ",".join("?" * len(digests))
+        rows = self._conn().execute(f"SELECT digest FROM payloads WHERE digest IN ({placeholders})", tuple(digests))
+        return {row[0] for row in rows}
+    
+    def _put_payloads(self, payloads, ttl):
+        conn = self._conn()
+        with conn:
+            conn.executemany("INSERT OR IGNORE INTO payloads (digest, body) VALUES (?, ?)", list(payloads.items()))
+    
+    def _write(self, endpoint_id, meta, digests, ttl, retained=frozenset()):
+        conn = self._conn()
+        with conn:
+            # Take the write lock up front so the payload check below holds until commit
+            conn.execute("BEGIN IMMEDIATE")
+            missing = set(digests.values()) - self._existing(set(digests.values()))
+            if missing:
+                conn.rollback()
+                return missing
+            conn.execute(
+                "INSERT OR REPLACE INTO endpoints (id, meta, expires_at) VALUES (?, ?, ?)",
+                (endpoint_id, meta, time.time() + ttl)
+            )
+            conn.execute("DELETE FROM section_refs WHERE endpoint_id = ?", (endpoint_id,))
+            conn.executemany(
+                "INSERT INTO section_refs (endpoint_id, name, digest) VALUES (?, ?, ?)",
+                [(endpoint_id, name, digest) for name, digest in digests.items()]
+            )
+            conn.execute("DELETE FROM history_refs WHERE endpoint_id = ?", (endpoint_id,))
+            conn.executemany(
+                "INSERT INTO history_refs (endpoint_id, digest) VALUES (?, ?)",
+                [(endpoint_id, digest) for digest in retained]
+            )
+        self._writes += 1
+        if self._writes % self.PURGE_EVERY == 0:
+            self.purge_expired()
+        return set()
+    
+    def _read(self, endpoint_id, sections=None):
+        conn = self._conn()
+        row = conn.execute(
+            "SELECT meta FROM endpoints WHERE id = ? AND expires_at > ?",
+            (endpoint_id, time.time())
+        ).fetchone()
+        if row is None:
+            return None
+        meta = json.loads(row[0])
+        if sections is not None and not sections:
+            return meta, {}
+        query = "SELECT r.name, p.body FROM section_refs r JOIN payloads p ON p.digest = r.digest WHERE r.endpoint_id = ?"
+        if sections is None:
+            rows = conn.execute(query, (endpoint_id,))
+        else:
+            placeholders = ",".join("?" * len(sections))
+            rows = conn.execute(f"{query} AND r.name IN ({placeholders})", (endpoint_id, *sections))
+        return meta, dict(rows)
+    
+    def _payloads(self, digests):
+        if not digests:
+            return {}
+        placeholders = ",".join("?" * len(digests))
+        rows = self._conn().execute(f"SELECT digest, body FROM payloads WHERE digest IN ({placeholders})", tuple(digests))
+        return dict(rows)
+    
+    def delete(self, endpoint_id):
+        conn = self._conn()
+        with conn:
+            conn.execute("DELETE FROM endpoints WHERE id = ?", (endpoint_id,))
+            self._collect(conn)
+    
+    def count(self):
+        row = self._conn().execute("SELECT COUNT(*) FROM endpoints WHERE expires_at > ?", (time.time(),)).fetchone()
+        return row[0]
+    
+    def purge_expired(self):
+        conn = self._conn()
+        with conn:
+            conn.execute("DELETE FROM endpoints WHERE expires_at <= ?", (time.time(),))
+            self._collect(conn)
+    
+    def _collect(self, conn: sqlite3.Connection):
+        # Drop payloads no endpoint points at any more, now or in its history
+        conn.execute(
+            "DELETE FROM payloads WHERE NOT EXISTS (SELECT 1 FROM section_refs r WHERE r.digest = payloads.digest)"
+            " AND NOT EXISTS (SELECT 1 FROM history_refs h WHERE h.digest = payloads.digest)"
+        )
+    
+    def close(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+class RedisStore(EndpointStore):
+    """Shared store for multi-worker deployments on any Redis-protocol server"""
+    
+    PREFIX = "webtapi:endpoint:"
+    PAYLOAD_PREFIX = "webtapi:payload:"
+    
+    def __init__(self, url: str, cache=None):
+        super().__init__(cache)
+        # Optional dependency, only needed for this backend
+        import redis
+        self._redis = redis.Redis.from_url(url)
+    
+    def _existing(self, digests):
+        digests = list(digests)
+        pipe = self._redis.pipeline(transaction=False)
+        for digest in digests:
+            pipe.exists(self.PAYLOAD_PREFIX + digest)
+        return {digest for digest, found in zip(digests, pipe.execute()) if found}
+    
+    def _put_payloads(self, payloads, ttl):
+        pipe = self._redis.pipeline(transaction=False)
+        for digest, body in payloads.items():
+            pipe.set(self.PAYLOAD_PREFIX + digest, body, ex=max(1, int(ttl)), nx=True)
+        pipe.execute()
+    
+    def _write(self, endpoint_id, meta, digests, ttl, retained=frozenset()):
+        ttl = max(1, int(ttl))
+        shared = list(set(digests.values()))
+        # A payload lives as long as the longest-lived endpoint pointing at it (EXPIRE GT, Redis 7+)
+        pipe = self._redis.pipeline()
+        for digest in retained:
+            pipe.expire(self.PAYLOAD_PREFIX + digest, ttl, gt=True)
+        for digest in shared:
+            pipe.expire(self.PAYLOAD_PREFIX + digest, ttl, gt=True)
+        for digest in shared:
+            pipe.exists(self.PAYLOAD_PREFIX + digest)
+        missing = {digest for digest, found in zip(shared, pipe.execute()[len(retained) + len(shared):]) if not found}
+        if missing:
+            return missing
+        
+        key = self.PREFIX + endpoint_id
+        mapping = {"meta": meta, **{f"s:{name}": digest for name, digest in digests.items()}}
+        pipe = self._redis.pipeline()
+        pipe.delete(key)
+        pipe.hset(key, mapping=mapping)
+        # Redis enforces the per-entry TTL itself
+        pipe.expire(key, ttl)
+        pipe.execute()
+        return set()
+    
+    def _read(self, endpoint_id, sections=None):
+        key = self.PREFIX + endpoint_id
+        if sections is None:
+            fields = self._redis.hgetall(key)
+            if b"meta" not in fields:
+                return None
+            meta = json.loads(fields.pop(b"meta"))
+            refs = {name.decode()[2:]: value for name, value in fields.items()}
+        else:
+            values = self._redis.hmget(key, ["meta", *(f"s:{name}" for name in sections)])
+            if values[0] is None:
+                return None
+            meta = json.loads(values[0])
+            refs = {name: value for name, value in zip(sections, values[1:]) if value is not None}
+        if not refs:
+            return meta, {}
+        names = list(refs)
+        bodies = self._redis.mget([self.PAYLOAD_PREFIX + refs[name].decode() for name in names])
+        return meta, {name: body for name, body in zip(names, bodies) if body is not None}
+    
+    def _payloads(self, digests):
+        digests = list(digests)
+        if not digests:
+            return {}
+        bodies = self._redis.mget([self.PAYLOAD_PREFIX + digest for digest in digests])
+        return {digest: body for digest, body in zip(digests, bodies) if body is not None}
+    
+    def delete(self, endpoint_id):
+        self._redis.delete(self.PREFIX + endpoint_id)
+    
+    def count(self):
+        return sum(1 for _ in self._redis.scan_iter(match=self.PREFIX + "*", count=1000))
+    
+    def close(self):
+        self._redis.close()
+
+def create_store(url: str = ENDPOINT_STORE_URL, cache=None) -> EndpointStore:
+    """Build the store named by a `sqlite:///path` or `redis://host:port/db` URL"""
+    scheme = urlsplit(url).scheme
+    if scheme == "sqlite":
+        return SQLiteStore(url[len("sqlite:///"):], cache)
+    if scheme in ("redis", "rediss", "unix"):
+        return RedisStore(url, cache)
+    raise ValueError(f"Unsupported endpoint store URL: {url}")
@@ -0,0 +1,143 @@
+from lxml import etree
+import logging
+from .css import InvalidSelector, compile_match
+from .extractors import ELEMENT_TAGS, text_of, image_record, link_record, table_record, custom_record
+
+logger = logging.getLogger("webtapi.streaming")
+
+_DATE_META = {"article:published_time", "og:published_time", "datepublished", "date", "pubdate"}
+
+class StreamExtractor:
+    """Incremental extraction for pages too large to buffer.
+    
+    Chunks are fed to an lxml pull parser as they arrive. Links, images,
+    paragraphs, tables and custom-selector matches are turned into records
+    as soon as their closing tag is parsed, and finished subtrees are
+    discarded, so memory stays bounded by the largest single element being
+    extracted rather than by the page size.
+    
+    Whole-document extractors can't run without the full tree: "text"
+    yields plain paragraphs instead of a readability article, the date
+    comes from <meta>/<time> tags only, and selectors that depend on
+    preceding siblings may miss matches.
+    """
+    
+    def __init__(self, url: str, plan: dict, encoding: str = None):
+        self.url = url
+        self.elements = plan["elements"]
+        self.tags = {tag for kind, tag in ELEMENT_TAGS if kind in self.elements}
+        filters = plan.get("filters") or {}
+        self.selectors = self._compile(filters.get("include_selectors", []))
+        self.excludes = [match for _, match in self._compile(filters.get("exclude_selectors", []))]
+        self.has_filters = bool(filters)
+        
+        self._parser = etree.HTMLPullParser(events=("start", "end"), encoding=encoding)
+        self._carry = b""
+        # Elements whose subtree must survive until their own end event
+        self._keep = {}
+        self._open_keepers = 0
+        # Open excluded elements; nothing inside them is extracted
+        self._excluding = set()
+        self._table_index = 0
+        self.timestamp = None
+        self.content = {kind: [] for kind in ("text", "images", "tables", "links") if kind in self.elements}
+        self.custom = []
+    
+    @staticmethod
+    def _compile(selectors: list) -> list:
+        compiled = []
+        for selector in selectors:
+            try:
+                compiled.append((selector, compile_match(selector)))
+            except InvalidSelector as e:
+                logger.warning(f"Skipping selector: {str(e)}")
+        return compiled
+    
+    def feed(self, chunk: bytes):
+        # libxml2's push parser only discards consumed input when a chunk ends
+        # on a tag boundary, so hold back everything after the last ">"
+        chunk = self._carry + chunk
+        cut = chunk.rfind(b">") + 1
+        self._carry = chunk[cut:]
+        if cut:
+            self._parser.feed(chunk[:cut])
+            self._drain()
+    
+    def close(self) -> dict:
+        """Finish parsing and return the extracted content sections"""
+        try:
+            if self._carry:
+                self._parser.feed(self._carry)
+            self._parser.close()
+        except etree.XMLSyntaxError:
+            pass
+        self._drain()
+        content = dict(self.content)
+        if self.has_filters:
+            # Group by selector, as the full-tree extractor does
+            order = {selector: i for i, (selector, _) in enumerate(self.selectors)}
+            content["custom"] = sorted(self.custom, key=lambda record: order[record.selector])
+        return content
+    
+    def _drain(self):
+        for event, el in self._parser.read_events():
+            if not isinstance(el.tag, str):
+                continue
+            if event == "start":
+                self._start(el)
+            else:
+                self._end(el)
+    
+    def _start(self, el):
+        if self._excluding or any(match(el) for match in self.excludes):
+            self._excluding.add(el)
+            return
+        matches = [selector for selector, match in self.selectors if match(el)]
+        if el.tag in self.tags or matches:
+            self._keep[el] = matches
+            self._open_keepers += 1
+    
+    def _end(self, el):
+        tag = el.tag
+        if tag == "meta" and self.timestamp is None:
+            name = (el.get("property") or el.get("name") or el.get("itemprop") or "").lower()
+            if name in _DATE_META and el.get("content"):
+                self.timestamp = el.get("content")[:10]
+        elif tag == "time" and self.timestamp is None and el.get("datetime"):
+            self.timestamp = el.get("datetime")[:10]
+        
+        self._excluding.discard(el)
+        matches = self._keep.pop(el, None)
+        if matches is None:
+            if not self._open_keepers:
+                self._release(el)
+            return
+        
+        self._open_keepers -= 1
+        if tag == "a" and "links" in self.content:
+            self._append("links", link_record(el, self.url))
+        elif tag == "img" and "images" in self.content:
+            self._append("images", image_record(el, self.url))
+        elif tag == "p" and "text" in self.content:
+            self.content["text"].append(text_of(el))
+        elif tag == "table" and "tables" in self.content:
+            self._append("tables", table_record(self._table_index, el))
+            self._table_index += 1
+        for selector in matches:
+            self.custom.append(custom_record(selector, el))
+        
+        if not self._open_keepers:
+            self._release(el)
+    
+    def _append(self, kind: str, record):
+        if record:
+            self.content[kind].append(record)
+    
+    @staticmethod
+    def _release(el):
+        # Drop the finished subtree and any already-processed siblings before it
+        el.clear(keep_tail=True)
+        parent = el.getparent()
+        if parent is not None:
+            while el.getprevious() is not None:
+                del parent[0]
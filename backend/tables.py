@@ -0,0 +1,195 @@
+from tabulate import tabulate
+import csv
+import html
+import io
+import re
+import logging
+
+logger = logging.getLogger("webtapi.tables")
+
+# Rendered forms a client can ask for alongside the stored columns
+TABLE_FORMATS = {"records", "markdown", "csv", "html"}
+
+# Guards against absurd spans blowing up the grid
+MAX_SPAN = 1000
+
+_WHITESPACE = re.compile(r"\s+")
+_NUMBER = re.compile(r"^[-+]?(\d{1,3}(,\d{3})+|\d+)?(\.\d+)?([eE][-+]?\d+)?$")
+# Placeholders that don't stop a column from being numeric
+_MISSING = {"", "-", "N/A", "n/a", "NA", "NaN", "nan", "null", "NULL", "None", "#N/A"}
+
+def _cell_text(cell) -> str:
+    text = cell.text if len(cell) == 0 else "".join(cell.itertext())
+    return _WHITESPACE.sub(" ", text).strip() if text else ""
+
+def _span(cell, name: str) -> int:
+    value = cell.get(name)
+    if value is None:
+        return 1
+    try:
+        return min(max(int(value), 1), MAX_SPAN)
+    except ValueError:
+        return 1
+
+def _rows(table):
+    """<thead> rows, then body rows in document order, then <tfoot> rows"""
+    head, body, foot = [], [], []
+    for child in table.iterchildren("tr", "thead", "tbody", "tfoot"):
+        if child.tag == "tr":
+            body.append(child)
+        else:
+            rows = child.findall("tr")
+            (head if child.tag == "thead" else foot if child.tag == "tfoot" else body).extend(rows)
+    return head, body + foot
+
+def _grid(rows) -> list:
+    """Expand rowspan/colspan into a grid of (text, is_header) cells, None for gaps"""
+    grid = []
+    # column -> (text, is_header, rows left) carried down from a rowspan above
+    pending = {}
+    for tr in rows:
+        row = []
+        below = {}
+        cells = tr.iterchildren("td", "th")
+        cell = next(cells, None)
+        while True:
+            col = len(row)
+            if col in pending:
+                text, is_header, left = pending.pop(col)
+                if left > 1:
+                    below[col] = (text, is_header, left - 1)
+                row.append((text, is_header))
+                continue
+            if cell is None:
+                # Pad the gap before any spans further right
+                if pending:
+                    row.append(None)
+                    continue
+                break
+            text, is_header = _cell_text(cell), cell.tag == "th"
+            rowspan = _span(cell, "rowspan")
+            for offset in range(_span(cell, "colspan")):
+                # Overlapping spans are malformed; the later cell takes the slot
+                pending.pop(col + offset, None)
+                if rowspan > 1:
+                    below[col + offset] = (text, is_header, rowspan - 1)
+                row.append((text, is_header))
+            cell = next(cells, None)
+        grid.append(row)
+        pending = below
+    return grid
+
+def _column_names(header_rows: list, width: int) -> list:
+    names = []
+    for i in range(width):
+        parts = []
+        for row in header_rows:
+            text = row[i][0] if i < len(row) and row[i] else ""
+            # A colspan header repeats across its columns; keep each level once
+            if text and (not parts or parts[-1] != text):
+                parts.append(text)
+        names.append(" ".join(parts) or (f"Unnamed: {i}" if header_rows else str(i)))
+    
+    # Duplicate names would collide in records, so number them like pandas does
+    seen = {}
+    for i, name in enumerate(names):
+        if name in seen:
+            seen[name] += 1
+            names[i] = f"{name}.{seen[name]}"
+        else:
+            seen[name] = 0
+    return names
+
+def _typed(values: list) -> list:
+    """Convert a column to numbers when every non-empty cell is one"""
+    numbers = []
+    is_int = True
+    for value in values:
+        if value is None or value in _MISSING:
+            numbers.append(None)
+            continue
+        if not _NUMBER.match(value) or not any(c.isdigit() for c in value):
+            return [value if value != "" else None for value in values]
+        value = value.replace(",", "")
+        is_int = is_int and "." not in value and "e" not in value.lower()
+        numbers.append(value)
+    convert = int if is_int else float
+    return [convert(value) if value is not None else None for value in numbers]
+
+def walk_table(table):
+    """Read a <table> element into column arrays, or None if it has no cells.
+    
+    Rowspan/colspan cells are repeated into every position they cover.
+    Header rows are the <thead> rows or, without one, the leading rows made
+    only of <th> cells; several header rows are joined into one name per
+    column. Columns whose cells are all numeric become ints or floats.
+    """
+    head, body = _rows(table)
+    grid = _grid(head + body)
+    if not any(grid):
+        return None
+    
+    header_count = len(head)
+    if not header_count:
+        while header_count < len(grid) and grid[header_count] and all(
+            cell is not None and cell[1] for cell in grid[header_count]
+        ):
+            header_count += 1
+    header_rows, body_rows = grid[:header_count], grid[header_count:]
+    
+    width = max(len(row) for row in grid)
+    columns = _column_names(header_rows, width)
+    values = [
+        _typed([row[i][0] if i < len(row) and row[i] else None for row in body_rows])
+        for i in range(width)
+    ]
+    return {"columns": columns, "values": values, "rows": len(body_rows)}
+
+def table_rows(record: dict):
+    return zip(*record["values"]) if record["values"] else iter(())
+
+def render_table(record: dict, fmt: str):
+    """Render a stored columnar table as records, markdown, CSV or HTML"""
+    columns = record["columns"]
+    if fmt == "records":
+        return [dict(zip(columns, row)) for row in table_rows(record)]
+    if fmt == "markdown":
+        return tabulate(list(table_rows(record)), headers=columns, tablefmt="pipe")
+    if fmt == "csv":
+        output = io.StringIO()
+        writer = csv.writer(output)
+        writer.writerow(columns)
+        writer.writerows(table_rows(record))
+        return output.getvalue()
+    if fmt == "html":
+        head = "".join(f"<th>{html.escape(str(name))}</th>" for name in columns)
+        body = "".join(
+            "<tr>" + "".join(f"<td>{'' if value is None else html.escape(str(value))}</td>" for value in row) + "</tr>"
+            for row in table_rows(record)
+        )
+        return f"<table><thead><tr>{head}</tr></thead><tbody>{body}</tbody></table>"
+    raise ValueError(f"Unknown table format: {fmt}")
+
+def parse_table_formats(value) -> list:
+    """Table formats from a comma-separated string or a list; raises ValueError on unknown ones"""
+    if not value:
+        return []
+    if isinstance(value, str):
+        names = value.split(",")
+    elif isinstance(value, list) and all(isinstance(name, str) for name in value):
+        names = value
+    else:
+        raise ValueError("table_formats must be a comma-separated string or a list of strings")
+    formats = [name.strip() for name in names if name.strip()]
+    unknown = set(formats) - TABLE_FORMATS
+    if unknown:
+        raise ValueError(f"Unknown table format(s): {', '.join(sorted(unknown))}")
+    return formats
+
+def render_tables(data: dict, formats: list) -> dict:
+    """Copy of `data` whose tables also carry the requested renderings"""
+    tables = data.get("content", {}).get("tables")
+    if not formats or not tables:
+        return data
+    rendered = [{**table, **{fmt: render_table(table, fmt) for fmt in formats}} for table in tables]
+    return {**data, "content": {**data["content"], "tables": rendered}}
@@ -0,0 +1,206 @@
+import asyncio
+import logging
+import multiprocessing
+import os
+import signal
+
+logger = logging.getLogger("webtapi.workers")
+
+# Configuration
+PARSE_WORKERS = int(os.getenv("PARSE_WORKERS", 0))
+PARSE_QUEUE_SIZE = int(os.getenv("PARSE_QUEUE_SIZE", 64))
+PARSE_CPU_TIMEOUT = float(os.getenv("PARSE_CPU_TIMEOUT", 20))
+PARSE_MAX_JOBS = int(os.getenv("PARSE_MAX_JOBS", 200))
+
+# Wall-clock allowance on top of the CPU limit before a worker is killed outright
+KILL_GRACE = 5.0
+# The wall-clock backstop allows this many times the CPU limit, scaled by CPU contention
+KILL_SLACK = 2.0
+
+class PoolBusy(Exception):
+    """The parse queue is full"""
+
+class JobTimeout(Exception):
+    """A page exceeded its parse time budget"""
+
+def _on_cpu_timeout(signum, frame):
+    raise JobTimeout("Page exceeded the parse CPU time limit")
+
+def _worker_main(conn, cpu_timeout: float):
+    """Worker process loop: receive parse_page arguments, send back the result"""
+    from .scraper import parse_page, preload
+    
+    # Workers are long-lived, so load everything before the first job arrives
+    preload()
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGPROF, _on_cpu_timeout)
+    conn.send("ready")
+    while True:
+        try:
+            job = conn.recv()
+        except EOFError:
+            break
+        if job is None:
+            break
+        
+        # ITIMER_PROF counts this process's CPU time, not time spent waiting
+        signal.setitimer(signal.ITIMER_PROF, cpu_timeout)
+        try:
+            reply = ("ok", parse_page(*job))
+        except JobTimeout as e:
+            reply = ("timeout", str(e))
+        except Exception as e:
+            reply = ("error", str(e))
+        finally:
+            signal.setitimer(signal.ITIMER_PROF, 0)
+        conn.send(reply)
+
+class _Worker:
+    def __init__(self, ctx, cpu_timeout: float):
+        self.conn, child_conn = ctx.Pipe()
+        self.process = ctx.Process(target=_worker_main, args=(child_conn, cpu_timeout), daemon=True)
+        self.process.start()
+        child_conn.close()
+        # Start-up isn't charged to the first job's deadline
+        while not self.conn.poll(1):
+            if not self.process.is_alive():
+                self.conn.close()
+                raise OSError("Parser worker exited during start-up")
+        self.conn.recv()
+        self.jobs = 0
+    
+    async def run(self, job: tuple, timeout: float):
+        loop = asyncio.get_running_loop()
+        ready = loop.create_future()
+        fd = self.conn.fileno()
+        loop.add_reader(fd, lambda: ready.done() or ready.set_result(None))
+        try:
+            self.conn.send(job)
+            await asyncio.wait_for(ready, timeout)
+        finally:
+            loop.remove_reader(fd)
+        
+        status, value = self.conn.recv()
+        self.jobs += 1
+        if status == "timeout":
+            raise JobTimeout(value)
+        if status == "error":
+            raise Exception(value)
+        return value
+    
+    def stop(self):
+        try:
+            self.conn.send(None)
+        except OSError:
+            pass
+        self.conn.close()
+        self.process.join(1)
+        if self.process.is_alive():
+            self.process.kill()
+    
+    def kill(self):
+        self.process.kill()
+        self.process.join()
+        self.conn.close()
+
+class ParserPool:
+    """Process pool running scraper.parse_page off the main interpreter.
+    
+    Jobs wait in a bounded queue (PoolBusy when full). Each job gets a CPU
+    time budget enforced inside the worker, backed by a wall-clock kill,
+    and workers are replaced after `max_jobs` jobs to cap memory growth.
+    """
+    
+    def __init__(self, workers: int = PARSE_WORKERS, max_queue: int = PARSE_QUEUE_SIZE,
+                 cpu_timeout: float = PARSE_CPU_TIMEOUT, max_jobs: int = PARSE_MAX_JOBS):
+        self.workers = workers
+        self.max_queue = max_queue
+        self.cpu_timeout = cpu_timeout
+        self.max_jobs = max_jobs
+        # The CPU limit inside each worker is the real bound; the wall-clock kill only catches
+        # workers stuck without using CPU, so it allows for workers sharing too few cores
+        contention = max(1.0, workers / (os.cpu_count() or 1))
+        self.wall_timeout = cpu_timeout * contention * KILL_SLACK + KILL_GRACE
+        methods = multiprocessing.get_all_start_methods()
+        self._ctx = multiprocessing.get_context("forkserver" if "forkserver" in methods else "spawn")
+        if "forkserver" in methods:
+            # Import the parsing stack once in the fork server, not in every worker
+            self._ctx.set_forkserver_preload([__name__.rsplit(".", 1)[0] + ".scraper", "readability", "htmldate"])
+        self._queue = None
+        self._drivers = []
+        self.counters = {"jobs": 0, "timeouts": 0, "crashes": 0, "rejected": 0, "recycled": 0}
+    
+    def start(self):
+        self._queue = asyncio.Queue(maxsize=self.max_queue)
+        self._drivers = [asyncio.create_task(self._drive()) for _ in range(self.workers)]
+    
+    async def close(self):
+        for driver in self._drivers:
+            driver.cancel()
+        await asyncio.gather(*self._drivers, return_exceptions=True)
+        self._drivers = []
+        self._queue = None
+    
+    async def submit(self, *job):
+        """Run parse_page(*job) in a worker and return its result"""
+        if self._queue is None:
+            self.start()
+        future = asyncio.get_running_loop().create_future()
+        try:
+            self._queue.put_nowait((job, future))
+        except asyncio.QueueFull:
+            self.counters["rejected"] += 1
+            raise PoolBusy("Parse queue is full")
+        return await future
+    
+    def stats(self) -> dict:
+        return {
+            **self.counters,
+            "workers": self.workers,
+            "queued": self._queue.qsize() if self._queue is not None else 0
+        }
+    
+    async def _drive(self):
+        """Feed one worker process from the shared queue, replacing it as needed"""
+        worker = None
+        try:
+            while True:
+                job, future = await self._queue.get()
+                if future.done():
+                    continue
+                if worker is None:
+                    try:
+                        worker = await asyncio.to_thread(_Worker, self._ctx, self.cpu_timeout)
+                    except OSError as e:
+                        self.counters["crashes"] += 1
+                        logger.error(f"Parser worker failed to start: {str(e)}")
+                        future.done() or future.set_exception(Exception("Parser worker crashed"))
+                        continue
+                
+                try:
+                    result = await worker.run(job, self.wall_timeout)
+                except (asyncio.TimeoutError, JobTimeout) as e:
+                    self.counters["timeouts"] += 1
+                    if isinstance(e, asyncio.TimeoutError):
+                        worker.kill()
+                        worker = None
+                    future.done() or future.set_exception(JobTimeout("Page exceeded the parse time limit"))
+                except (EOFError, OSError) as e:
+                    self.counters["crashes"] += 1
+                    logger.error(f"Parser worker died: {str(e)}")
+                    worker.kill()
+                    worker = None
+                    future.done() or future.set_exception(Exception("Parser worker crashed"))
+                except Exception as e:
+                    future.done() or future.set_exception(e)
+                else:
+                    self.counters["jobs"] += 1
+                    future.done() or future.set_result(result)
+                
+                if worker is not None and worker.jobs >= self.max_jobs:
+                    self.counters["recycled"] += 1
+                    await asyncio.to_thread(worker.stop)
+                    worker = None
+        finally:
+            if worker is not None:
+                worker.kill()
@@ -0,0 +1,68 @@
+"""Main-content extraction time and quality on the article layouts, fast path vs readability.
+
+"readability" is readability-lxml on a copy of the parsed tree, which is
+what every request with "text" in its plan used to pay; "fast" is
+backend.article as shipped: one scoring pass over the shared tree, with
+readability only when that pass isn't confident (the "fallback" column).
+Quality is word-level F1 against the layout's gold paragraphs, and
+"agree" is F1 between the two modes' outputs.
+
+Usage: python -m benchmarks.bench_article [--repeat 5]
+"""
+import argparse
+import statistics
+import time
+from collections import Counter
+
+import lxml.html
+
+from backend import article
+from benchmarks import corpus
+
+
+def f1(found: list, expected: list) -> float:
+    """Word-level F1 of two lists of paragraphs, ignoring order"""
+    found, expected = Counter(" ".join(found).split()), Counter(" ".join(expected).split())
+    overlap = sum((found & expected).values())
+    if not overlap:
+        return 0.0
+    precision, recall = overlap / sum(found.values()), overlap / sum(expected.values())
+    return 2 * precision * recall / (precision + recall)
+
+
+def _median_ms(repeat: int, body) -> tuple:
+    runs = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = body()
+        runs.append((time.perf_counter() - start) * 1000)
+    return statistics.median(runs), result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    article.tree_document()
+    pages = {name: (page, gold) for name, (page, gold) in corpus.load_articles().items()}
+    pages["article"] = (corpus.load()["article"], None)
+    pages["huge_dom"] = (corpus.load()["huge_dom"], None)
+
+    print(f"{'page':<12} {'readability ms':>14} {'fast ms':>8} {'speedup':>8} {'extractor':>11} "
+          f"{'F1 readability':>14} {'F1 fast':>8} {'agree':>6}")
+    fallbacks = 0
+    for name, (page, gold) in pages.items():
+        tree = lxml.html.document_fromstring(page)
+        old_ms, old = _median_ms(args.repeat, lambda: article.readability_article(tree))
+        new_ms, new = _median_ms(args.repeat, lambda: article.extract_article(tree, None))
+        fallbacks += new["extractor"] != "fast"
+        scores = (f"{f1(old['paragraphs'], gold):>14.2f} {f1(new['paragraphs'], gold):>8.2f}" if gold is not None
+                  else f"{'-':>14} {'-':>8}")
+        print(f"{name:<12} {old_ms:>14.1f} {new_ms:>8.1f} {old_ms / new_ms if new_ms else 0:>7.1f}x "
+              f"{new['extractor']:>11} {scores} {f1(new['paragraphs'], old['paragraphs']):>6.2f}")
+    print(f"fell back to readability on {fallbacks} of {len(pages)} pages")
+
+
+if __name__ == "__main__":
+    main()
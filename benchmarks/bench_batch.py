@@ -0,0 +1,60 @@
+"""Batch /generate/batch speedup against local fixture sites.
+
+Several stub sites on distinct loopback addresses act as separate hosts so
+the per-host limit (BATCH_PER_HOST) and the global limit both come into play.
+
+Usage: python -m benchmarks.bench_batch [--urls 64] [--hosts 8] [--latency 0.2]
+"""
+import argparse
+import json
+import time
+from contextlib import ExitStack
+
+import httpx
+
+from benchmarks.bench_generate import _free_port, _start_backend
+from benchmarks.stubs import site_server
+
+
+def _run(base: str, urls: list, concurrency: int) -> tuple:
+    errors = 0
+    start = time.perf_counter()
+    with httpx.stream("POST", f"{base}/generate/batch", timeout=600,
+                      json={"urls": urls, "query": "all links", "concurrency": concurrency}) as res:
+        res.raise_for_status()
+        for line in res.iter_lines():
+            errors += "error" in json.loads(line)
+    return time.perf_counter() - start, errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--urls", type=int, default=64)
+    parser.add_argument("--hosts", type=int, default=8)
+    parser.add_argument("--latency", type=float, default=0.2, help="stub site latency in seconds")
+    parser.add_argument("--levels", type=int, nargs="+", default=[1, 2, 4, 8, 16])
+    args = parser.parse_args()
+
+    with ExitStack() as stack:
+        sites = [
+            stack.enter_context(site_server(latency=args.latency, host=f"127.0.0.{i + 1}"))
+            for i in range(args.hosts)
+        ]
+        port = _free_port()
+        server = _start_backend(port, [f"127.0.0.{i + 1}" for i in range(args.hosts)])
+        base = f"http://127.0.0.1:{port}"
+
+        print(f"{'conc':>5} {'seconds':>8} {'pages/s':>8} {'speedup':>8} {'errors':>7}")
+        baseline = None
+        for level in args.levels:
+            # Fresh paths each round so the fetch cache doesn't help
+            urls = [f"{sites[i % len(sites)].url}/c{level}/p{i}" for i in range(args.urls)]
+            elapsed, errors = _run(base, urls, level)
+            baseline = baseline or elapsed
+            print(f"{level:>5} {elapsed:>8.2f} {args.urls / elapsed:>8.1f} {baseline / elapsed:>7.1f}x {errors:>7}")
+
+        server.should_exit = True
+
+
+if __name__ == "__main__":
+    main()
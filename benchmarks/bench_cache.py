@@ -0,0 +1,161 @@
+"""Result cache: eviction policy under a byte budget, and what a cached /api read saves.
+
+"policy" replays a Zipf-popular request stream over sections whose
+compressed sizes range from a few KiB to several MiB. Popularity is
+independent of size. It compares a count-bounded LRU of 1000 entries
+(the old TTLCache, whose bytes grow with whatever gets scraped), an LRU
+bounded by bytes, and the GDSF ResultCache, with the same byte budget for
+the last two.
+
+"read" times getting the compressed sections of each corpus endpoint
+(from SQLite, or from the cache) and the whole store.load_record, which
+also decodes them: without a cache, from a warm cache, and from another
+worker's cache that only shares the mmap directory. Last, each codec's
+compression ratio and decode time; zstd only when zstandard is installed.
+
+Usage: python -m benchmarks.bench_cache [--requests 50000] [--budget-mib 64]
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import tempfile
+import time
+import zlib
+
+from cachetools import LRUCache
+
+from backend import store as store_module
+from backend.result_cache import ResultCache
+from backend.scraper import parse_page
+from backend.store import SQLiteStore
+from benchmarks import corpus
+
+PLAN = {"elements": ["images", "tables", "links", "text"], "filters": {}, "structured_format": "list"}
+
+
+def _population(count: int, rng: random.Random) -> list:
+    """Compressed section sizes: mostly small, with a long tail of huge table dumps"""
+    return [min(int(rng.lognormvariate(9.5, 1.6)), 16 * 1024 * 1024) for _ in range(count)]
+
+
+def _stream(count: int, sections: int, rng: random.Random) -> list:
+    weights = [1 / (rank + 1) ** 0.9 for rank in range(sections)]
+    order = list(range(sections))
+    rng.shuffle(order)
+    return rng.choices(order, weights=weights, k=count)
+
+
+def _replay(name: str, stream: list, sizes: list, buffer: memoryview, lookup, admit, resident) -> tuple:
+    hits = hit_bytes = total_bytes = peak = 0
+    for i, section in enumerate(stream):
+        key = str(section)
+        total_bytes += sizes[section]
+        if lookup(key):
+            hits += 1
+            hit_bytes += sizes[section]
+        else:
+            admit(key, buffer[:sizes[section]])
+        if i % 100 == 0:
+            peak = max(peak, resident())
+    return name, hits / len(stream), hit_bytes / total_bytes, peak
+
+
+def policy(requests: int, budget: int):
+    rng = random.Random(0)
+    sizes = _population(5000, rng)
+    stream = _stream(requests, len(sizes), rng)
+    buffer = memoryview(bytes(max(sizes)))
+
+    by_count = LRUCache(maxsize=1000)
+    by_bytes = LRUCache(maxsize=budget, getsizeof=len)
+    gdsf = ResultCache(budget)
+
+    def put(cache, key, blob):
+        if len(blob) <= budget:
+            cache[key] = blob
+
+    rows = [
+        _replay("LRU, 1000 entries", stream, sizes, buffer, lambda key: by_count.get(key) is not None,
+                lambda key, blob: put(by_count, key, blob), lambda: sum(len(blob) for blob in by_count.values())),
+        _replay("LRU, byte budget", stream, sizes, buffer, lambda key: by_bytes.get(key) is not None,
+                lambda key, blob: put(by_bytes, key, blob), lambda: by_bytes.currsize),
+        _replay("GDSF, byte budget", stream, sizes, buffer, lambda key: bool(gdsf.get_many([key])),
+                lambda key, blob: gdsf.put_many({key: blob}), lambda: gdsf.stats()["resident_bytes"])
+    ]
+    print(f"{len(sizes)} sections, {sum(sizes) / 2 ** 20:.0f} MiB in all, {requests} requests, budget {budget / 2 ** 20:.0f} MiB")
+    print(f"{'policy':<20} {'hit ratio':>9} {'byte hits':>9} {'peak MiB':>9}")
+    for name, hit_ratio, byte_ratio, peak in rows:
+        print(f"{name:<20} {hit_ratio:>9.3f} {byte_ratio:>9.3f} {peak / 2 ** 20:>9.1f}")
+    print(f"GDSF evictions: {gdsf.stats()['evictions']}")
+
+
+def _median_ms(body, repeat: int = 20) -> float:
+    runs = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        body()
+        runs.append((time.perf_counter() - start) * 1000)
+    return statistics.median(runs)
+
+
+def read(budget: int):
+    pages = corpus.load()
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.db")
+        shared = os.path.join(tmp, "sections")
+        writer = SQLiteStore(path, ResultCache(budget, shared))
+        plain = SQLiteStore(path)
+        for name, page in pages.items():
+            writer.save(name, parse_page("https://example.com/", page, "utf-8", 200, PLAN), "JSON", 3600)
+
+        print(f"\n{'page':<10} {'fetch ms':>8} {'cached ms':>9} {'no cache ms':>11} {'warm ms':>8} {'other worker ms':>15}")
+        for name in pages:
+            # Getting the compressed sections alone, then the whole read including decoding
+            digests = set(plain.load_meta(name)["digests"].values())
+            fetch = _median_ms(lambda: plain._payloads(digests))
+            cached = _median_ms(lambda: writer.cache.get_many(digests))
+            cold = _median_ms(lambda: plain.load_record(name))
+            warm = _median_ms(lambda: writer.load_record(name))
+            # A worker that never saw the endpoint: its first read maps the shared files
+            worker = SQLiteStore(path, ResultCache(budget, shared))
+            start = time.perf_counter()
+            worker.load_record(name)
+            other = (time.perf_counter() - start) * 1000
+            worker.close()
+            print(f"{name:<10} {fetch:>8.3f} {cached:>9.3f} {cold:>11.2f} {warm:>8.2f} {other:>15.2f}")
+
+        bodies = [json.dumps(value, separators=(",", ":")).encode("utf-8")
+                  for name in pages for value in plain.load(name)["content"].values()]
+        raw = sum(len(body) for body in bodies)
+        codecs = [("zlib", lambda body: zlib.compress(body, 6), zlib.decompress)]
+        zstd = store_module._zstd()
+        if zstd is not None:
+            codecs.append(("zstd", lambda body: zstd.ZstdCompressor(level=3).compress(body),
+                           lambda blob: zstd.ZstdDecompressor().decompress(blob)))
+        print(f"\n{'codec':<6} {'ratio':>6} {'decode ms':>10}")
+        for codec, compress, decompress in codecs:
+            blobs = [compress(body) for body in bodies]
+            decode = _median_ms(lambda: [decompress(blob) for blob in blobs], 5)
+            print(f"{codec:<6} {raw / sum(len(blob) for blob in blobs):>6.2f} {decode:>10.2f}")
+        if zstd is None:
+            print("zstd    (zstandard not installed)")
+        print(f"\nstore: {writer.stats()}")
+        writer.close()
+        plain.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=50000)
+    parser.add_argument("--budget-mib", type=int, default=64)
+    args = parser.parse_args()
+
+    budget = args.budget_mib * 1024 * 1024
+    policy(args.requests, budget)
+    read(budget)
+
+
+if __name__ == "__main__":
+    main()
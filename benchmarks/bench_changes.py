@@ -0,0 +1,80 @@
+"""Bytes and time a polling client spends on a slowly changing endpoint.
+
+Each corpus page is saved as an endpoint, then saved again with a fraction
+of its links, images and table rows replaced, as a refresh would. "full" is
+re-downloading /api/{id} as JSON; "changes" is /api/{id}/changes?since=1,
+timed cold (item hashes computed) and warm (hashes cached, median of 5).
+A poll that finds nothing new costs a 304 with no body at all.
+
+Usage: python -m benchmarks.bench_changes [--pages link_farm gallery tables] [--churn 0.01]
+"""
+import argparse
+import copy
+import json
+import os
+import random
+import statistics
+import tempfile
+import time
+
+from backend.changes import ChangeFeed, items
+from backend.records import Link, encode_record
+from backend.scraper import parse_page
+from backend.store import SQLiteStore
+from benchmarks import corpus
+
+PLAN = {"elements": ["images", "tables", "links"], "filters": {}, "structured_format": "list"}
+
+
+def _mutate(data: dict, churn: float, rng: random.Random) -> dict:
+    """Replace `churn` of the links and images and change that share of table rows"""
+    data = copy.deepcopy(data)
+    content = data["content"]
+    for name in ("links", "images"):
+        for i in rng.sample(range(len(content.get(name, []))), int(len(content.get(name, [])) * churn)):
+            content[name][i] = Link(f"changed {i}", f"https://example.com/changed/{i}")
+    rows = [(table, i) for table in content.get("tables", []) if table["values"] for i in range(table["rows"])]
+    for table, i in rng.sample(rows, int(len(rows) * churn)):
+        table["values"][0][i] = f"changed {i}"
+    return data
+
+
+def _size(value) -> int:
+    return len(json.dumps(value, separators=(",", ":"), default=encode_record).encode("utf-8"))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--pages", nargs="+", default=["link_farm", "gallery", "tables"])
+    parser.add_argument("--churn", type=float, default=0.01, help="share of items replaced between versions")
+    args = parser.parse_args()
+
+    pages = corpus.load()
+    rng = random.Random(0)
+    with tempfile.TemporaryDirectory() as tmp:
+        store = SQLiteStore(os.path.join(tmp, "bench.db"))
+        print(f"{'page':<10} {'items':>7} {'full KiB':>9} {'changes KiB':>12} {'cold ms':>8} {'warm ms':>8}")
+        for name in args.pages:
+            data = parse_page("https://example.com/", pages[name], "utf-8", 200, PLAN)
+            store.save(name, data, "JSON", 3600)
+            meta = store.save(name, _mutate(data, args.churn, rng), "JSON", 3600)
+            full = store.load(name)
+
+            feed = ChangeFeed(store)
+            start = time.perf_counter()
+            changes = feed.changes(meta, 1)
+            cold = (time.perf_counter() - start) * 1000
+            runs = []
+            for _ in range(5):
+                start = time.perf_counter()
+                feed.changes(meta, 1)
+                runs.append((time.perf_counter() - start) * 1000)
+            warm = statistics.median(runs)
+
+            count = sum(len(items(section, value)) for section, value in full["content"].items())
+            print(f"{name:<10} {count:>7} {_size(full) / 1024:>9.1f} {_size(changes) / 1024:>12.1f} {cold:>8.1f} {warm:>8.1f}")
+        store.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+"""Crawl mode end to end: /generate with "crawl" against a local fixture blog, plus visited-set memory.
+
+Each case POSTs /generate to a backend running in-process, with the stub AI
+server planning and FETCH_ROBOTS on. The fixture site counts every
+request, so the run checks what a crawl must never do: fetch a page twice
+(fragments and reordered queries included), leave the site, fetch
+outside the pattern, disallowed by robots.txt or failing validate_url, or
+go past the per-host concurrency limit. The endpoint is then read back through /api.
+
+"visited" compares holding N crawled URLs as strings, as 64-bit hashes
+(VisitedURLs below CRAWL_EXACT_URLS), and in the Bloom filter it
+switches to, with the filter's measured false-positive rate.
+
+Usage: python -m benchmarks.bench_crawl [--posts 300] [--latency 0.01] [--urls 200000]
+"""
+import argparse
+import fnmatch
+import time
+import tracemalloc
+
+import httpx
+
+from backend.crawler import BloomFilter, VisitedURLs
+from backend.fetch_cache import normalize_url
+from benchmarks.bench_generate import _free_port, _start_backend
+from benchmarks.stubs import ai_server, crawl_site_server
+
+CASES = [
+    ("links, /blog/*", {"max_pages": 60, "max_depth": 3, "pattern": "/blog/*"}),
+    ("sitemap, posts", {"max_pages": 60, "max_depth": 0, "sitemap": True, "pattern": "/blog/post-*"}),
+    ("links, whole site", {"max_pages": 40, "max_depth": 2})
+]
+# Fetched by robots.txt and sitemap handling rather than as pages
+SUPPORT = ("/robots.txt", "/sitemap_index.xml", "/sitemap-pages.xml", "/sitemap-posts.xml.gz")
+
+
+def _run_case(base: str, site, options: dict, limit: int) -> dict:
+    from backend import scraper
+    from backend.fetch_cache import FetchCache
+
+    # Every case starts cold, so the site sees each page the crawl wants
+    scraper.fetch_cache = FetchCache()
+    site.counters["paths"].clear()
+    site.counters["peak_in_flight"] = 0
+
+    start = time.perf_counter()
+    response = httpx.post(f"{base}/generate", json={"url": site.url + "/", "query": "articles", "crawl": options},
+                          timeout=300)
+    seconds = time.perf_counter() - start
+    assert response.status_code == 200, response.text
+    body = response.json()
+    crawl = body["sample_data"]["metadata"]["crawl"]
+
+    fetched = {path: count for path, count in site.counters["paths"].items() if path not in SUPPORT}
+    repeated = [path for path, count in fetched.items() if count > 1]
+    pattern = options.get("pattern")
+    outside = [path for path in fetched if pattern and path != "/" and not fnmatch.fnmatchcase(path.split("?")[0], pattern)]
+    assert not repeated, f"fetched more than once: {repeated}"
+    assert not outside, f"fetched outside {pattern}: {outside}"
+    assert not any(path.startswith("/private/") for path in fetched), "fetched a path robots.txt disallows"
+    assert not any("trap" in path for path in fetched), "fetched a URL validate_url rejects"
+    assert site.counters["peak_in_flight"] <= limit, "exceeded the per-host concurrency limit"
+    # Pages robots.txt disallows count as failed without being fetched
+    assert crawl["pages"] <= len(fetched) <= crawl["pages"] + crawl["failed"] <= options["max_pages"]
+
+    stored = httpx.get(f"{base}{body['api_endpoint']}?sections=pages,articles").json()
+    assert len(stored["content"]["pages"]) == crawl["pages"] + crawl["failed"]
+    return {**crawl, "seconds": seconds, "peak": site.counters["peak_in_flight"],
+            "articles": len(stored["content"].get("articles", []))}
+
+
+def crawl_cases(posts: int, latency: float):
+    from backend import ai_interpreter, scraper
+    from backend.limits import HostScheduler
+
+    with crawl_site_server(posts=posts, latency=latency) as site, ai_server() as ai:
+        ai_interpreter.AI_SERVER_URL = ai.url
+        port = _free_port()
+        server = _start_backend(port)
+        # _start_backend lifts the per-host limits for load tests; a crawl runs under the real ones
+        scheduler = scraper.scheduler = HostScheduler()
+        from backend import crawler
+        crawler.scheduler = scheduler
+        scraper.FETCH_ROBOTS = True
+        base = f"http://127.0.0.1:{port}"
+
+        print(f"{'case':<18} {'pages':>6} {'failed':>7} {'found':>6} {'rejected':>9} {'articles':>9} {'peak':>5} "
+              f"{'s':>6} {'pages/s':>8}")
+        for name, options in CASES:
+            row = _run_case(base, site, options, scheduler.max_concurrency)
+            print(f"{name:<18} {row['pages']:>6} {row['failed']:>7} {row['discovered']:>6} {row['rejected']:>9} "
+                  f"{row['articles']:>9} {row['peak']:>5} {row['seconds']:>6.2f} {row['pages'] / row['seconds']:>8.1f}")
+        server.should_exit = True
+
+
+def _measure(body) -> tuple:
+    tracemalloc.start()
+    result = body()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return result, size
+
+
+def visited(count: int):
+    urls = [f"https://example.com/blog/{i}/post-{i * 7919 % 100003}?page={i % 17}" for i in range(count)]
+    # Normalized copies, as a crawler keeping strings would hold them
+    strings, string_bytes = _measure(lambda: {normalize_url(url) for url in urls})
+    exact, exact_bytes = _measure(lambda: _fill(VisitedURLs(exact=count + 1), urls))
+    bloom, bloom_bytes = _measure(lambda: _fill(VisitedURLs(exact=0, capacity=count), urls))
+    probes = [f"https://example.com/other/{i}" for i in range(100_000)]
+    false_positives = sum(url in bloom for url in probes) / len(probes)
+    assert all(url in exact for url in urls[:1000]) and all(url in bloom for url in urls[:1000])
+
+    print(f"\n{count} URLs")
+    print(f"{'visited set':<20} {'MiB':>8} {'false positives':>16}")
+    print(f"{'set of strings':<20} {string_bytes / 2 ** 20:>8.1f} {0:>16.4f}")
+    print(f"{'64-bit hashes':<20} {exact_bytes / 2 ** 20:>8.1f} {0:>16.4f}")
+    print(f"{'Bloom filter':<20} {bloom_bytes / 2 ** 20:>8.1f} {false_positives:>16.4f}")
+    print(f"(Bloom sized for {count} at {BloomFilter(count, 0.001).hashes} hashes per URL)")
+
+
+def _fill(seen: VisitedURLs, urls: list) -> VisitedURLs:
+    for url in urls:
+        seen.add(url)
+    return seen
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--posts", type=int, default=300)
+    parser.add_argument("--latency", type=float, default=0.01, help="fixture site latency in seconds")
+    parser.add_argument("--urls", type=int, default=200000)
+    args = parser.parse_args()
+
+    crawl_cases(args.posts, args.latency)
+    visited(args.urls)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""Encoding time, size and peak memory of /api output formats for a large endpoint.
+
+"json (buffered)" is what the endpoint used to do: render the whole
+response body as one string. The other rows drive formats.encode the way
+StreamingResponse does, one chunk at a time.
+
+Usage: python -m benchmarks.bench_formats [--links 50000]
+"""
+import argparse
+import json
+import time
+import tracemalloc
+
+from backend import formats
+
+
+def _endpoint(links: int) -> dict:
+    return {
+        "metadata": {"url": "https://example.com/", "timestamp": "2024-01-01", "status_code": 200},
+        "content": {
+            "links": [
+                {"text": f"Link number {i} to somewhere", "href": f"https://example.com/dir/{i % 97}/{i}?ref=list"}
+                for i in range(links)
+            ]
+        }
+    }
+
+
+def _buffered(data: dict):
+    yield json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def _measure(chunks) -> tuple:
+    tracemalloc.start()
+    start = time.perf_counter()
+    size = 0
+    largest = 0
+    for chunk in chunks():
+        size += len(chunk)
+        largest = max(largest, len(chunk))
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return elapsed, size, largest, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--links", type=int, default=50000)
+    args = parser.parse_args()
+
+    data = _endpoint(args.links)
+    cases = {"json (buffered)": lambda: _buffered(data)}
+    for fmt in formats.FORMATS:
+        cases[fmt] = lambda fmt=fmt: formats.encode(data, fmt)
+
+    print(f"{'format':<16} {'ms':>8} {'KiB':>9} {'largest chunk KiB':>18} {'peak MiB':>9}")
+    for name, chunks in cases.items():
+        try:
+            elapsed, size, largest, peak = _measure(chunks)
+        except formats.FormatError as e:
+            print(f"{name:<16} skipped: {e}")
+            continue
+        print(f"{name:<16} {elapsed * 1000:>8.1f} {size / 1024:>9.1f} {largest / 1024:>18.1f} {peak / 2**20:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""Concurrent /generate load benchmark against local stub site and AI servers.
+
+Usage: python -m benchmarks.bench_generate [--requests 64] [--latency 0.2]
+"""
+import argparse
+import asyncio
+import os
+import socket
+import threading
+import time
+
+import httpx
+import uvicorn
+
+from benchmarks.stubs import ai_server, site_server
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _start_backend(port: int, site_hosts=("127.0.0.1",)) -> uvicorn.Server:
+    from backend import main, scraper, security
+    from backend.limits import HostScheduler
+
+    # The stub sites live on loopback addresses, which the security check rightly rejects
+    security.ALLOWED_PRIVATE_HOSTS.update(site_hosts)
+    # Each stub host stands in for many sites, so don't hold it to one site's politeness limits
+    scraper.scheduler = HostScheduler(rate=0, concurrency=1024, max_concurrency=1024)
+
+    server = uvicorn.Server(uvicorn.Config(main.app, host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return server
+
+
+def _percentile(samples: list, q: float) -> float:
+    return samples[max(0, int(len(samples) * q + 0.5) - 1)]
+
+
+async def _run_level(base: str, site: str, concurrency: int, total: int, paths=None) -> dict:
+    """Drive `total` /generate calls, `concurrency` at a time; `paths` cycles over site pages"""
+    sem = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async with httpx.AsyncClient(base_url=base, timeout=120) as client:
+        async def one(i):
+            async with sem:
+                start = time.perf_counter()
+                # Unique URLs so the fetch cache never answers
+                path = f"{paths[i % len(paths)]}?n={i}" if paths else f"/page/{i}"
+                res = await client.post("/generate", json={"url": f"{site}{path}", "query": "all links"})
+                res.raise_for_status()
+                latencies.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(one(i) for i in range(total)))
+        elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    return {
+        "concurrency": concurrency,
+        "requests": total,
+        "throughput_rps": total / elapsed,
+        "p50_ms": _percentile(latencies, 0.5) * 1000,
+        "p90_ms": _percentile(latencies, 0.9) * 1000,
+        "p99_ms": _percentile(latencies, 0.99) * 1000
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=64)
+    parser.add_argument("--latency", type=float, default=0.2, help="stub site and AI latency in seconds")
+    parser.add_argument("--levels", type=int, nargs="+", default=[1, 2, 4, 8, 16])
+    args = parser.parse_args()
+
+    with site_server(latency=args.latency) as site, ai_server(latency=args.latency) as ai:
+        os.environ["AI_SERVER_URL"] = ai.url
+        from backend import ai_interpreter
+        ai_interpreter.AI_SERVER_URL = ai.url
+
+        port = _free_port()
+        server = _start_backend(port)
+        base = f"http://127.0.0.1:{port}"
+
+        print(f"{'conc':>5} {'rps':>8} {'p50 ms':>8} {'p99 ms':>8}")
+        for level in args.levels:
+            row = asyncio.run(_run_level(base, site.url, level, args.requests))
+            print(f"{row['concurrency']:>5} {row['throughput_rps']:>8.2f} {row['p50_ms']:>8.1f} {row['p99_ms']:>8.1f}")
+
+        server.should_exit = True
+
+
+if __name__ == "__main__":
+    main()
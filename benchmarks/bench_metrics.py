@@ -0,0 +1,49 @@
+"""Per-call overhead of metrics.stage, with and without an active request trace.
+
+The budget is a few microseconds per stage: /generate records about a
+dozen stages against fetch and parse times measured in milliseconds.
+
+Usage: python -m benchmarks.bench_metrics [--calls 200000]
+"""
+import argparse
+import time
+
+from backend import metrics
+
+
+def _per_call(calls: int, body) -> float:
+    start = time.perf_counter()
+    for _ in range(calls):
+        body()
+    return (time.perf_counter() - start) / calls
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--calls", type=int, default=200000)
+    args = parser.parse_args()
+
+    def empty():
+        pass
+
+    def staged():
+        with metrics.stage("bench"):
+            pass
+
+    baseline = _per_call(args.calls, empty)
+    untraced = _per_call(args.calls, staged) - baseline
+    metrics.start_trace()
+    traced = _per_call(args.calls, staged) - baseline
+
+    start = time.perf_counter()
+    text = metrics.render()
+    render_ms = (time.perf_counter() - start) * 1000
+
+    print(f"{'case':<20} {'us/call':>8}")
+    print(f"{'stage (no trace)':<20} {untraced * 1e6:>8.2f}")
+    print(f"{'stage (traced)':<20} {traced * 1e6:>8.2f}")
+    print(f"render: {render_ms:.2f} ms, {len(text.splitlines())} lines")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""Per-page parse time and peak memory of scraper.parse_page on the saved corpus.
+
+Compares the single-parse lxml engine against the previous implementation,
+which built a BeautifulSoup tree and re-parsed the page for htmldate,
+readability and every table.
+
+Usage: python -m benchmarks.bench_parse [--repeat 5]
+"""
+import argparse
+import multiprocessing
+import resource
+import statistics
+import time
+from io import StringIO
+from urllib.parse import urljoin
+
+from backend.scraper import parse_page
+from benchmarks import corpus
+
+PLAN = {
+    "elements": ["text", "images", "tables", "links"],
+    "filters": {"include_selectors": ["h3 a", ".price"]},
+    "structured_format": "list"
+}
+
+
+def legacy_parse_page(url: str, content: bytes, encoding: str, status_code: int, plan: dict) -> dict:
+    """The BeautifulSoup-based extraction this engine replaced, kept for comparison"""
+    import pandas as pd
+    import readability
+    from bs4 import BeautifulSoup
+    from htmldate import find_date
+
+    text = content.decode(encoding or "utf-8", "replace")
+    soup = BeautifulSoup(content, "lxml")
+    results = {
+        "metadata": {"url": url, "timestamp": find_date(text) or "Unknown", "status_code": status_code},
+        "content": {}
+    }
+    if "text" in plan["elements"]:
+        doc = readability.Document(text)
+        results["content"]["article"] = {"title": doc.title(), "content": doc.summary()}
+    if "images" in plan["elements"]:
+        results["content"]["images"] = [
+            {"src": urljoin(url, img.get("src", "") or img.get("data-src", "")), "alt": img.get("alt", "")[:100],
+             "width": img.get("width"), "height": img.get("height")}
+            for img in soup.find_all("img") if img.get("src", "") or img.get("data-src", "")
+        ]
+    if "tables" in plan["elements"]:
+        tables = []
+        for i, table in enumerate(soup.find_all("table")):
+            df = pd.read_html(StringIO(str(table)))[0]
+            tables.append({"table_index": i, "html": str(table), "markdown": df.to_markdown(),
+                           "json": df.to_dict(orient="records")})
+        results["content"]["tables"] = tables
+    if "links" in plan["elements"]:
+        results["content"]["links"] = [
+            {"text": a.get_text(strip=True)[:200], "href": urljoin(url, a.get("href", ""))}
+            for a in soup.find_all("a") if a.get("href", "") and not a.get("href").startswith(("#", "javascript:"))
+        ]
+    if plan.get("filters"):
+        results["content"]["custom"] = [
+            {"selector": sel, "text": el.get_text(strip=True), "html": str(el)}
+            for sel in plan["filters"].get("include_selectors", []) for el in soup.select(sel)
+        ]
+    return results
+
+
+IMPLEMENTATIONS = {"before": legacy_parse_page, "after": parse_page}
+
+
+def _time(fn, page: bytes, repeat: int) -> float:
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn("https://example.com/", page, "utf-8", 200, PLAN)
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples)
+
+
+def _peak_rss_child(impl: str, page: bytes, queue):
+    # ru_maxrss is in KiB on Linux; the delta is the extra peak caused by one parse
+    before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    IMPLEMENTATIONS[impl]("https://example.com/", page, "utf-8", 200, PLAN)
+    queue.put(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - before)
+
+
+def _peak_rss(impl: str, page: bytes) -> int:
+    ctx = multiprocessing.get_context("fork")
+    queue = ctx.Queue()
+    proc = ctx.Process(target=_peak_rss_child, args=(impl, page, queue))
+    proc.start()
+    delta = queue.get()
+    proc.join()
+    return delta
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'page':<10} {'KiB':>7} {'before ms':>10} {'after ms':>9} {'speedup':>8} {'before MiB':>11} {'after MiB':>10}")
+    for name, page in corpus.load().items():
+        times = {impl: _time(fn, page, args.repeat) for impl, fn in IMPLEMENTATIONS.items()}
+        peaks = {impl: _peak_rss(impl, page) / 1024 for impl in IMPLEMENTATIONS}
+        print(
+            f"{name:<10} {len(page) / 1024:>7.0f} {times['before'] * 1000:>10.1f} {times['after'] * 1000:>9.1f} "
+            f"{times['before'] / times['after']:>7.1f}x {peaks['before']:>11.1f} {peaks['after']:>10.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
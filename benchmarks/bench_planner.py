@@ -0,0 +1,78 @@
+"""Rule-based planner bypass rate, agreement and latency on a labelled query corpus.
+
+Agreement is measured against the labels in benchmarks/queries.json (the plan
+the model path is expected to produce). Model-path latency comes from the stub
+AI server unless --ai-url points at a real one.
+
+Usage: python -m benchmarks.bench_planner [--latency 0.5] [--ai-url URL]
+"""
+import argparse
+import asyncio
+import json
+import time
+from contextlib import nullcontext
+from pathlib import Path
+
+from backend import ai_interpreter
+from benchmarks.stubs import ai_server
+
+QUERIES = Path(__file__).parent / "queries.json"
+
+
+def _percentile(samples: list, pct: float) -> float:
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * pct))]
+
+
+def _agrees(plan: dict, label: dict) -> bool:
+    return (
+        set(plan["elements"]) == set(label["elements"])
+        and set(plan["filters"].get("include_selectors", [])) == set(label.get("include_selectors", []))
+    )
+
+
+async def _model_latencies(queries: list) -> list:
+    latencies = []
+    for query in queries:
+        start = time.perf_counter()
+        await ai_interpreter._plan_from_model(query)
+        latencies.append(time.perf_counter() - start)
+    await ai_interpreter.close_client()
+    return latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--latency", type=float, default=0.5, help="stub AI server latency in seconds")
+    parser.add_argument("--ai-url", help="measure the model path against a real AI server")
+    parser.add_argument("--repeat", type=int, default=1000)
+    args = parser.parse_args()
+
+    corpus = json.loads(QUERIES.read_text())
+    bypassed, agreed, rule_latencies = 0, 0, []
+    for label in corpus:
+        plan = ai_interpreter.plan_from_rules(label["query"])
+        start = time.perf_counter()
+        for _ in range(args.repeat):
+            ai_interpreter.plan_from_rules(label["query"])
+        rule_latencies.append((time.perf_counter() - start) / args.repeat)
+        if plan is not None:
+            bypassed += 1
+            agreed += _agrees(plan, label)
+
+    stub = nullcontext() if args.ai_url else ai_server(latency=args.latency)
+    with stub as server:
+        ai_interpreter.AI_SERVER_URL = args.ai_url or server.url
+        model_latencies = asyncio.run(_model_latencies([label["query"] for label in corpus]))
+
+    print(f"queries        {len(corpus)}")
+    print(f"bypass rate    {bypassed / len(corpus):.1%}")
+    print(f"agreement      {agreed / bypassed:.1%} of bypassed plans match the labels" if bypassed else "agreement      n/a")
+    for pct in (0.5, 0.99):
+        rules = _percentile(rule_latencies, pct) * 1e6
+        model = _percentile(model_latencies, pct) * 1e3
+        print(f"p{int(pct * 100):<2} rules {rules:8.1f} us   model {model:8.1f} ms   saved {model - rules / 1e3:8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""Fetching from a rate-limited site with and without the per-host scheduler.
+
+The fixture site allows --site-rate requests/s and answers 429 with
+Retry-After: 1 above that; it also slows down once more than 8 requests
+are in flight. "unscheduled" is the old behaviour: every fetch goes out
+at once and is never retried. The scheduled rows use HostScheduler with
+the given starting rate, adapting from there, and FETCH_RETRIES retries.
+
+Usage: python -m benchmarks.bench_politeness [--pages 200] [--concurrency 32] [--site-rate 20]
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+from backend import scraper, security
+from backend.limits import HostScheduler
+from benchmarks.stubs import rate_limited_server
+
+
+async def _crawl(base: str, pages: int, concurrency: int) -> dict:
+    sem = asyncio.Semaphore(concurrency)
+    latencies = []
+    failed = 0
+
+    async def one(i):
+        nonlocal failed
+        async with sem:
+            start = time.perf_counter()
+            try:
+                await scraper.fetch_page(f"{base}/page/{i}")
+                latencies.append(time.perf_counter() - start)
+            except Exception:
+                failed += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(pages)))
+    elapsed = time.perf_counter() - start
+    await scraper.close_client()
+    return {"ok": len(latencies), "failed": failed, "seconds": elapsed,
+            "p50_ms": statistics.median(latencies) * 1000 if latencies else 0.0}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--pages", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--site-rate", type=float, default=20)
+    args = parser.parse_args()
+
+    security.ALLOWED_PRIVATE_HOSTS.add("127.0.0.1")
+    cases = {
+        "unscheduled": (HostScheduler(rate=0, concurrency=1024, max_concurrency=1024), 0),
+        "scheduled, rate 10": (HostScheduler(rate=10), scraper.FETCH_RETRIES),
+        "scheduled, rate 50": (HostScheduler(rate=50), scraper.FETCH_RETRIES)
+    }
+
+    print(f"{'case':<20} {'ok':>5} {'failed':>7} {'429s':>6} {'peak conc':>10} {'s':>7} {'ok/s':>7} {'p50 ms':>8}")
+    for name, (scheduler, retries) in cases.items():
+        scraper.scheduler = scheduler
+        scraper.FETCH_RETRIES = retries
+        with rate_limited_server(rate=args.site_rate) as site:
+            row = asyncio.run(_crawl(site.url, args.pages, args.concurrency))
+            seen = site.counters
+        print(f"{name:<20} {row['ok']:>5} {row['failed']:>7} {seen['throttled']:>6} {seen['peak_in_flight']:>10} "
+              f"{row['seconds']:>7.1f} {row['ok'] / row['seconds']:>7.1f} {row['p50_ms']:>8.0f}")
+
+
+if __name__ == "__main__":
+    main()
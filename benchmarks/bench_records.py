@@ -0,0 +1,90 @@
+"""Retained memory of extraction results: slotted records against plain dicts.
+
+"before" patches the scraper back to building one dict per link, image and
+custom match; "after" is the slotted Record model. Both must serialize to
+identical JSON bytes. "per 256 MiB" is how many such results fit in that
+much memory.
+
+Usage: python -m benchmarks.bench_records [--pages link_farm gallery catalog]
+"""
+import argparse
+import gc
+import json
+import tracemalloc
+from contextlib import contextmanager
+from urllib.parse import urljoin
+
+from backend import scraper
+from backend.extractors import html_of, text_of
+from backend.records import encode_record
+from benchmarks import corpus
+
+PLAN = {
+    "elements": ["images", "links", "custom"],
+    "filters": {"include_selectors": ["h3 a", ".price", "li"]},
+    "structured_format": "list"
+}
+BUDGET = 256 * 2**20
+
+
+def legacy_image_record(img, url: str):
+    src = img.get("src", "") or img.get("data-src", "")
+    if not src:
+        return None
+    return {"src": urljoin(url, src), "alt": img.get("alt", "")[:100], "width": img.get("width"), "height": img.get("height")}
+
+
+def legacy_link_record(a, url: str):
+    href = a.get("href", "")
+    if not href or href.startswith(("#", "javascript:")):
+        return None
+    return {"text": text_of(a)[:200], "href": urljoin(url, href)}
+
+
+def legacy_custom_record(selector: str, el) -> dict:
+    return {"selector": selector, "text": text_of(el), "html": html_of(el)}
+
+
+@contextmanager
+def _legacy_records():
+    saved = scraper.image_record, scraper.link_record, scraper.custom_record
+    scraper.image_record, scraper.link_record, scraper.custom_record = (
+        legacy_image_record, legacy_link_record, legacy_custom_record
+    )
+    try:
+        yield
+    finally:
+        scraper.image_record, scraper.link_record, scraper.custom_record = saved
+
+
+def _retained(page: bytes):
+    gc.collect()
+    tracemalloc.start()
+    results = scraper.parse_page("https://example.com/", page, "utf-8", 200, PLAN)
+    gc.collect()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return results, size
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--pages", nargs="+", default=["link_farm", "gallery", "catalog"])
+    args = parser.parse_args()
+
+    pages = corpus.load()
+    print(f"{'page':<10} {'records':>8} {'before KiB':>11} {'after KiB':>10} {'saved':>6} "
+          f"{'per 256 MiB':>12} {'same JSON':>10}")
+    for name in args.pages:
+        with _legacy_records():
+            before, before_size = _retained(pages[name])
+        after, after_size = _retained(pages[name])
+
+        same = json.dumps(before) == json.dumps(after, default=encode_record)
+        records = sum(len(value) for value in after["content"].values())
+        print(f"{name:<10} {records:>8} {before_size / 1024:>11.1f} {after_size / 1024:>10.1f} "
+              f"{1 - after_size / before_size:>6.0%} {f'{BUDGET // before_size} -> {BUDGET // after_size}':>12} {str(same):>10}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+"""validate_url latency: first call per host (DNS lookup) against cached calls.
+
+The old validator spawned a gobuster subprocess on every request; the
+"spawn" row times starting a trivial process, the floor of that cost even
+when the scan itself returns at once.
+
+Usage: python -m benchmarks.bench_security [--hosts localhost example.com] [--repeat 10000]
+"""
+import argparse
+import asyncio
+import subprocess
+import time
+
+from backend import security
+
+
+async def _measure(hosts: list, repeat: int) -> list:
+    rows = []
+    for host in hosts:
+        url = f"http://{host}/path"
+        start = time.perf_counter()
+        allowed = await security.validate_url(url)
+        cold = time.perf_counter() - start
+
+        start = time.perf_counter()
+        for _ in range(repeat):
+            await security.validate_url(url)
+        warm = (time.perf_counter() - start) / repeat
+        rows.append((host, allowed, cold, warm))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--hosts", nargs="+", default=["localhost", "example.com", "93.184.215.14", "2130706433"])
+    parser.add_argument("--repeat", type=int, default=10000)
+    args = parser.parse_args()
+
+    # Resolvable everywhere; the private-range check would otherwise reject it up front
+    security.ALLOWED_PRIVATE_HOSTS.add("localhost")
+
+    print(f"{'host':<22} {'allowed':>7} {'first us':>10} {'cached us':>10}")
+    for host, allowed, cold, warm in asyncio.run(_measure(args.hosts, args.repeat)):
+        print(f"{host:<22} {str(allowed):>7} {cold * 1e6:>10.1f} {warm * 1e6:>10.1f}")
+
+    start = time.perf_counter()
+    for _ in range(20):
+        subprocess.run(["true"], capture_output=True)
+    print(f"{'spawn (old path floor)':<22} {'':>7} {(time.perf_counter() - start) / 20 * 1e6:>10.1f}")
+    print(security.security_stats()["dns"])
+
+
+if __name__ == "__main__":
+    main()
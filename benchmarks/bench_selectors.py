@@ -0,0 +1,80 @@
+"""Time to apply a plan's include/exclude selectors to a parsed corpus page.
+
+"legacy" builds a fresh CSSSelector per selector and request and drops
+excluded matches afterwards, which is how parse_page used to run them;
+"compiled" is backend.css: selectors compiled once and cached, descendant
+combinators tested bottom-up, exclusions folded into each query.
+
+Usage: python -m benchmarks.bench_selectors [--pages huge_dom catalog] [--counts 1 10 50] [--repeat 5]
+"""
+import argparse
+import statistics
+import time
+
+import lxml.html
+from lxml.cssselect import CSSSelector
+
+from backend.css import compile_filters
+from benchmarks import corpus
+
+EXCLUDE = ["div.reply", "footer"]
+
+
+def selectors(count: int) -> list:
+    """A mix of the shapes model plans produce: ids, attributes, descendants, misses"""
+    kinds = [
+        lambda i: f"#r{i}-2 > p",
+        lambda i: f'a[href="/t/{i}"]',
+        lambda i: f"section.thread h3 a[href$='/{i}']",
+        lambda i: f".missing-{i}",
+        lambda i: f"div.reply span.author a[href='/u/{i}']",
+        lambda i: "h3 a" if i == 0 else f"h3 > a[href='/t/{i + 1}']"
+    ]
+    return [kinds[i % len(kinds)](i) for i in range(count)]
+
+
+def legacy(tree, include: list, exclude: list) -> list:
+    excluded = set()
+    for css in exclude:
+        for el in CSSSelector(css)(tree):
+            excluded.update(el.iter())
+    return [(css, el) for css in include for el in CSSSelector(css)(tree) if el not in excluded]
+
+
+def compiled(tree, include: list, exclude: list) -> list:
+    filters = {"include_selectors": include, "exclude_selectors": exclude}
+    return [(css, el) for css, matches in compile_filters(filters).select(tree) for el in matches]
+
+
+def _median_ms(repeat: int, body) -> tuple:
+    runs = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = body()
+        runs.append((time.perf_counter() - start) * 1000)
+    return statistics.median(runs), result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--pages", nargs="+", default=["huge_dom", "catalog", "link_farm"])
+    parser.add_argument("--counts", type=int, nargs="+", default=[1, 10, 50])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    pages = corpus.load()
+    print(f"{'page':<10} {'selectors':>9} {'exclude':>7} {'matches':>8} {'legacy ms':>10} {'compiled ms':>12} {'speedup':>8}")
+    for name in args.pages:
+        tree = lxml.html.fromstring(pages[name])
+        for count in args.counts:
+            for exclude in ([], EXCLUDE):
+                include = selectors(count)
+                old_ms, old = _median_ms(args.repeat, lambda: legacy(tree, include, exclude))
+                new_ms, new = _median_ms(args.repeat, lambda: compiled(tree, include, exclude))
+                assert old == new, f"{name}: compiled selectors disagree with CSSSelector"
+                print(f"{name:<10} {count:>9} {len(exclude):>7} {len(new):>8} {old_ms:>10.1f} {new_ms:>12.1f} "
+                      f"{old_ms / new_ms if new_ms else 0:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+"""Cold start of the backend as app.py runs it, and what a Streamlit rerun costs.
+
+Every measurement runs in a fresh interpreter. "import" is `import
+backend.main`, once as shipped (readability and htmldate load on first use)
+and once with them imported up front, as they used to be. "ready" is the
+time from launch until /health answers: the in-process thread app.py
+starts by default, and `uvicorn --workers N` (BACKEND_WORKERS). app.py used
+to sleep a fixed 2 s instead, on every rerun; a rerun now costs one check
+of a cached flag, and at most one /health probe.
+
+Usage: python -m benchmarks.bench_startup [--repeat 5] [--workers 2 4]
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import requests
+
+from benchmarks.bench_generate import _free_port
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+LEGACY_SLEEP = 2.0
+
+IMPORT = """
+import time
+start = time.perf_counter()
+{preload}
+import backend.main
+print((time.perf_counter() - start) * 1000)
+"""
+
+THREAD = """
+import threading
+
+def run():
+    from uvicorn import Config, Server
+    from backend.main import app
+    Server(Config(app=app, host="127.0.0.1", port={port}, log_level="warning")).run()
+
+threading.Thread(target=run, daemon=True).start()
+threading.Event().wait()
+"""
+
+
+def _python(code: str, env: dict) -> subprocess.Popen:
+    return subprocess.Popen([sys.executable, "-c", code], cwd=ROOT, env=env, stdout=subprocess.PIPE,
+                            stderr=subprocess.DEVNULL, text=True)
+
+
+def _import_ms(env: dict, preload: str) -> float:
+    process = _python(IMPORT.format(preload=preload), env)
+    out, _ = process.communicate()
+    return float(out.strip().splitlines()[-1])
+
+
+def _wait_ready(port: int, start: float, timeout: float = 60) -> float:
+    """Milliseconds from `start` until /health answers"""
+    while time.perf_counter() - start < timeout:
+        try:
+            if requests.get(f"http://127.0.0.1:{port}/health", timeout=1).status_code == 200:
+                return (time.perf_counter() - start) * 1000
+        except requests.RequestException:
+            pass
+        time.sleep(0.01)
+    raise RuntimeError(f"backend did not start within {timeout}s")
+
+
+def _ready_ms(command: list, port: int, env: dict) -> float:
+    start = time.perf_counter()
+    process = subprocess.Popen(command, cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        return _wait_ready(port, start)
+    finally:
+        process.terminate()
+        process.wait()
+
+
+def _probe_ms(port: int, env: dict) -> float:
+    process = _python(THREAD.format(port=port), env)
+    try:
+        _wait_ready(port, time.perf_counter())
+        runs = []
+        for _ in range(20):
+            start = time.perf_counter()
+            requests.get(f"http://127.0.0.1:{port}/health", timeout=1)
+            runs.append((time.perf_counter() - start) * 1000)
+        return statistics.median(runs)
+    finally:
+        process.terminate()
+        process.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--workers", type=int, nargs="+", default=[2, 4])
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        env = {**os.environ, "ENDPOINT_STORE_URL": f"sqlite:///{os.path.join(tmp, 'bench.db')}"}
+
+        rows = [
+            ("import (parsers up front)", [_import_ms(env, "import readability, htmldate") for _ in range(args.repeat)]),
+            ("import (lazy parsers)", [_import_ms(env, "") for _ in range(args.repeat)])
+        ]
+        runs = []
+        for _ in range(args.repeat):
+            port = _free_port()
+            runs.append(_ready_ms([sys.executable, "-c", THREAD.format(port=port)], port, env))
+        rows.append(("ready (thread)", runs))
+        for workers in args.workers:
+            runs = []
+            for _ in range(args.repeat):
+                port = _free_port()
+                command = [sys.executable, "-m", "uvicorn", "backend.main:app", "--port", str(port),
+                           "--workers", str(workers), "--log-level", "warning"]
+                runs.append(_ready_ms(command, port, env))
+            rows.append((f"ready ({workers} workers)", runs))
+        rows.append(("rerun (legacy sleep)", [LEGACY_SLEEP * 1000]))
+        rows.append(("rerun (/health probe)", [_probe_ms(_free_port(), env)]))
+
+    print(f"{'case':<28} {'median ms':>10} {'max ms':>8}")
+    for name, runs in rows:
+        print(f"{name:<28} {statistics.median(runs):>10.0f} {max(runs):>8.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""Peak RSS and time for extracting links and images from 1 MB - 500 MB pages.
+
+"streamed" is the default fetch path (incremental extraction above
+FETCH_BUFFER_BYTES); "buffered" raises the buffer limit to the cap, which is
+how every page used to be handled. Each measurement runs in a fresh child
+process.
+
+Usage: python -m benchmarks.bench_stream [--sizes 1 10 50 100 500]
+"""
+import argparse
+import asyncio
+import multiprocessing
+import resource
+import time
+
+from benchmarks.stubs import sized_server
+
+MB = 1024 * 1024
+PLAN = {"elements": ["images", "links"], "filters": {}, "structured_format": "list"}
+
+
+def _child(url: str, buffer_bytes: int, cap: int, queue):
+    from backend import scraper, security
+
+    security.ALLOWED_PRIVATE_HOSTS.add("127.0.0.1")
+    scraper.FETCH_MAX_BYTES = cap
+    scraper.FETCH_BUFFER_BYTES = buffer_bytes
+
+    async def run():
+        try:
+            return await scraper.extract_data(url, PLAN)
+        finally:
+            await scraper.close_client()
+
+    before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start = time.perf_counter()
+    results = asyncio.run(run())
+    elapsed = time.perf_counter() - start
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - before
+    queue.put((elapsed, peak / 1024, len(results["content"]["links"])))
+
+
+def _measure(url: str, buffer_bytes: int, cap: int) -> tuple:
+    ctx = multiprocessing.get_context("fork")
+    queue = ctx.Queue()
+    proc = ctx.Process(target=_child, args=(url, buffer_bytes, cap, queue))
+    proc.start()
+    result = queue.get()
+    proc.join()
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1, 10, 50, 100, 500], help="page sizes in MB")
+    parser.add_argument("--buffered", action="store_true", help="also measure the fully buffered path")
+    args = parser.parse_args()
+    cap = (max(args.sizes) + 1) * MB
+
+    # Import the parsing stack before forking so it isn't counted in the peaks
+    import backend.scraper  # noqa: F401
+
+    with sized_server() as server:
+        print(f"{'MB':>5} {'mode':>9} {'seconds':>8} {'peak MiB':>9} {'links':>8}")
+        for size in args.sizes:
+            modes = [("streamed", 8 * MB)] + ([("buffered", cap)] if args.buffered else [])
+            for mode, buffer_bytes in modes:
+                elapsed, peak, links = _measure(f"{server.url}/{size * MB}", buffer_bytes, cap)
+                print(f"{size:>5} {mode:>9} {elapsed:>8.2f} {peak:>9.1f} {links:>8}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""Table extraction time and payload size: column walker against pd.read_html.
+
+"before" is the old per-table path: serialize each <table>, re-parse it with
+pd.read_html and store html, markdown and records. "after" walks the parsed
+tree into column arrays; "render" adds the cost of rendering markdown on
+request. "cells match" counts tables whose cell values agree with pandas.
+
+Usage: python -m benchmarks.bench_tables [--repeat 5] [--pages tables report]
+"""
+import argparse
+import json
+import math
+import statistics
+import time
+from io import StringIO
+
+import lxml.html
+import pandas as pd
+
+from backend.extractors import html_of, table_record
+from backend.tables import render_table
+from benchmarks import corpus
+
+
+def legacy_tables(tree) -> list:
+    tables = []
+    for i, table in enumerate(tree.iter("table")):
+        table_html = html_of(table)
+        df = pd.read_html(StringIO(table_html))[0]
+        tables.append({"table_index": i, "html": table_html, "markdown": df.to_markdown(),
+                       "json": df.to_dict(orient="records")})
+    return tables
+
+
+def walker_tables(tree) -> list:
+    tables = (table_record(i, table) for i, table in enumerate(tree.iter("table")))
+    return [record for record in tables if record]
+
+
+def _json_safe(tables: list) -> list:
+    # Multi-row headers give pandas tuple column keys, which JSON can't encode
+    return [{**table, "json": [{str(k): v for k, v in row.items()} for row in table["json"]]} for table in tables]
+
+
+def _cells_match(tree, records: list) -> int:
+    matched = 0
+    for table, record in zip(tree.iter("table"), records):
+        df = pd.read_html(StringIO(html_of(table)))[0]
+        expected = [[None if isinstance(v, float) and math.isnan(v) else v for v in row] for row in df.values.tolist()]
+        matched += expected == [list(row) for row in zip(*record["values"])]
+    return matched
+
+
+def _time(fn, repeat: int) -> float:
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--pages", nargs="+", default=["tables", "report"])
+    args = parser.parse_args()
+
+    pages = corpus.load()
+    print(f"{'page':<8} {'tables':>6} {'before ms':>10} {'after ms':>9} {'render ms':>10} "
+          f"{'before KiB':>11} {'after KiB':>10} {'cells match':>12}")
+    for name in args.pages:
+        tree = lxml.html.document_fromstring(pages[name])
+        before = legacy_tables(tree)
+        after = walker_tables(tree)
+
+        before_ms = _time(lambda: legacy_tables(tree), args.repeat) * 1000
+        after_ms = _time(lambda: walker_tables(tree), args.repeat) * 1000
+        render_ms = _time(lambda: [render_table(record, "markdown") for record in after], args.repeat) * 1000
+        before_kib = len(json.dumps(_json_safe(before), default=str)) / 1024
+        after_kib = len(json.dumps(after)) / 1024
+        print(f"{name:<8} {len(after):>6} {before_ms:>10.1f} {after_ms:>9.1f} {render_ms:>10.1f} "
+              f"{before_kib:>11.1f} {after_kib:>10.1f} {_cells_match(tree, after):>8}/{len(after)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,51 @@
+"""Parse throughput of the ParserPool with 1/2/4/8 worker processes on the saved corpus.
+
+The "thread" row is the default mode (asyncio.to_thread) for comparison.
+Scaling is bounded by the number of CPU cores available.
+
+Usage: python -m benchmarks.bench_workers [--rounds 4]
+"""
+import argparse
+import asyncio
+import os
+import time
+
+from backend.scraper import parse_page
+from backend.workers import ParserPool
+from benchmarks import corpus
+from benchmarks.bench_parse import PLAN
+
+
+async def _run(pages: list, workers: int) -> float:
+    jobs = [("https://example.com/", page, "utf-8", 200, PLAN) for page in pages]
+    if not workers:
+        start = time.perf_counter()
+        await asyncio.gather(*(asyncio.to_thread(parse_page, *job) for job in jobs))
+        return time.perf_counter() - start
+
+    pool = ParserPool(workers=workers, max_queue=len(jobs))
+    # Warm up every worker so process start-up isn't timed
+    await asyncio.gather(*(pool.submit(*jobs[0]) for _ in range(workers)))
+    start = time.perf_counter()
+    await asyncio.gather(*(pool.submit(*job) for job in jobs))
+    elapsed = time.perf_counter() - start
+    await pool.close()
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rounds", type=int, default=4, help="passes over the corpus per measurement")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+    args = parser.parse_args()
+
+    pages = list(corpus.load().values()) * args.rounds
+    print(f"{len(pages)} pages, {os.cpu_count()} CPUs")
+    print(f"{'mode':>8} {'seconds':>8} {'pages/s':>8}")
+    for workers in [0, *args.workers]:
+        elapsed = asyncio.run(_run(pages, workers))
+        print(f"{workers or 'thread':>8} {elapsed:>8.2f} {len(pages) / elapsed:>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,287 @@
+"""Saved HTML fixtures for the extraction benchmarks.
+
+The pages in `benchmarks/corpus/` are generated deterministically by this
+module; run `python -m benchmarks.corpus` to rebuild them. The article
+layouts in `benchmarks/corpus/articles/` come with the paragraphs a reader
+would call the article, in `gold.json`.
+"""
+import json
+import random
+from pathlib import Path
+
+CORPUS_DIR = Path(__file__).parent / "corpus"
+ARTICLES_DIR = CORPUS_DIR / "articles"
+
+WORDS = (
+    "data api market price product review search update report city team season "
+    "record growth energy policy design service network model value quality store "
+    "global local customer support release version result analysis system"
+).split()
+
+
+def _sentence(rng: random.Random, n: int = 12) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(n)).capitalize() + "."
+
+
+def _page(title: str, body: str, extra_head: str = "") -> str:
+    nav = "".join(f'<li><a href="/section/{w}">{w.title()}</a></li>' for w in WORDS[:12])
+    return (
+        f"<!DOCTYPE html><html><head><meta charset=\"utf-8\"><title>{title}</title>{extra_head}</head>"
+        f"<body><header><nav><ul>{nav}</ul></nav></header>{body}"
+        f"<footer><p>Copyright 2024</p><a href=\"/about\">About</a> <a href=\"/contact\">Contact</a></footer>"
+        f"</body></html>"
+    )
+
+
+def article(rng: random.Random) -> str:
+    paragraphs = []
+    for i in range(60):
+        if i % 8 == 0:
+            paragraphs.append(f"<h2>{_sentence(rng, 5)}</h2>")
+        paragraphs.append(f"<p>{' '.join(_sentence(rng) for _ in range(5))} <a href=\"/ref/{i}\">source</a></p>")
+    sidebar = "".join(f'<li><a href="/story/{i}">{_sentence(rng, 6)}</a></li>' for i in range(40))
+    body = (
+        f"<main><article><h1>{_sentence(rng, 8)}</h1>"
+        f"<time datetime=\"2024-03-18\">March 18, 2024</time>{''.join(paragraphs)}</article>"
+        f"<aside><h3>Related</h3><ul>{sidebar}</ul></aside></main>"
+    )
+    head = '<meta property="article:published_time" content="2024-03-18T09:30:00Z">'
+    return _page("Article", body, head)
+
+
+def link_farm(rng: random.Random) -> str:
+    groups = []
+    for g in range(50):
+        items = "".join(
+            f'<li><a href="/dir/{g}/{i}?ref=list" title="{rng.choice(WORDS)}">{_sentence(rng, 4)}</a></li>'
+            for i in range(80)
+        )
+        groups.append(f"<section><h2>Group {g}</h2><ul>{items}</ul></section>")
+    return _page("Directory", "".join(groups))
+
+
+def tables(rng: random.Random) -> str:
+    blocks = []
+    for t in range(25):
+        head = "".join(f"<th>{w.title()}</th>" for w in rng.sample(WORDS, 6))
+        rows = "".join(
+            "<tr>" + f"<td>{rng.choice(WORDS)}</td>" + "".join(
+                f"<td>{rng.randint(0, 99999) / 100}</td>" for _ in range(5)
+            ) + "</tr>"
+            for _ in range(60)
+        )
+        blocks.append(f"<h3>Table {t}</h3><table><thead><tr>{head}</tr></thead><tbody>{rows}</tbody></table>")
+    return _page("Statistics", "".join(blocks))
+
+
+def report(rng: random.Random) -> str:
+    """Financial-report style tables: grouped headers, rowspans, thousands separators"""
+    blocks = []
+    for t in range(40):
+        quarters = "".join(f"<th>Q{q}</th>" for q in range(1, 5))
+        head = (
+            '<tr><th rowspan="2">Region</th><th rowspan="2">Segment</th>'
+            f'<th colspan="4">{2020 + t % 4}</th><th rowspan="2">Total</th></tr>'
+            f"<tr>{quarters}</tr>"
+        )
+        rows = []
+        for region in range(6):
+            for segment in range(4):
+                region_cell = f'<td rowspan="4">{rng.choice(WORDS).title()}</td>' if segment == 0 else ""
+                values = [rng.randint(0, 2_000_000) for _ in range(4)]
+                cells = "".join(f"<td>{v:,}</td>" for v in values)
+                rows.append(f"<tr>{region_cell}<td>{rng.choice(WORDS)}</td>{cells}<td>{sum(values):,}</td></tr>")
+        foot = '<tr><td colspan="2">Note</td><td colspan="5">n/a</td></tr>' if t % 5 == 0 else ""
+        blocks.append(f"<h3>Report {t}</h3><table>{head}{''.join(rows)}{foot}</table>")
+    return _page("Annual report", "".join(blocks))
+
+
+def gallery(rng: random.Random) -> str:
+    tiles = "".join(
+        f'<figure><a href="/photo/{i}"><img src="/img/{i}.jpg" data-src="/img/{i}@2x.jpg" '
+        f'alt="{_sentence(rng, 5)}" width="320" height="240"></a><figcaption>{_sentence(rng, 6)}</figcaption></figure>'
+        for i in range(600)
+    )
+    return _page("Gallery", f'<div class="gallery">{tiles}</div>')
+
+
+def catalog(rng: random.Random) -> str:
+    cards = "".join(
+        f'<div class="product" data-sku="{i}"><a href="/p/{i}"><img src="/thumb/{i}.webp" alt="Product {i}"></a>'
+        f'<h3 class="name"><a href="/p/{i}">{_sentence(rng, 4)}</a></h3>'
+        f'<span class="price">${rng.randint(100, 99999) / 100}</span>'
+        f'<p class="desc">{_sentence(rng, 20)}</p>'
+        f'<ul class="tags">{"".join(f"<li>{rng.choice(WORDS)}</li>" for _ in range(4))}</ul></div>'
+        for i in range(400)
+    )
+    return _page("Catalog", f'<div class="grid">{cards}</div>')
+
+
+def huge_dom(rng: random.Random) -> str:
+    """A forum-thread style page: tens of thousands of elements, replies nested deep"""
+    threads = []
+    for t in range(400):
+        depth = 200 if t == 0 else rng.randint(3, 40)
+        opening = "".join(
+            f'<div class="reply" id="r{t}-{d}"><span class="author"><a href="/u/{rng.randint(0, 999)}">'
+            f'{rng.choice(WORDS)}</a></span><p>{_sentence(rng, 6)}</p>'
+            for d in range(depth)
+        )
+        threads.append(f'<section class="thread"><h3><a href="/t/{t}">{_sentence(rng, 5)}</a></h3>{opening}{"</div>" * depth}</section>')
+    return _page("Forum", f'<div id="threads">{"".join(threads)}</div>')
+
+
+GENERATORS = {
+    "article": article,
+    "link_farm": link_farm,
+    "tables": tables,
+    "report": report,
+    "gallery": gallery,
+    "catalog": catalog,
+    "huge_dom": huge_dom
+}
+
+
+# Article layouts: each returns (page, the article's paragraphs)
+
+
+def _prose(rng: random.Random, count: int, sentences: int = 4) -> list:
+    return [" ".join(_sentence(rng) for _ in range(sentences)) for _ in range(count)]
+
+
+def _links(rng: random.Random, prefix: str, count: int) -> str:
+    return "".join(f'<li><a href="/{prefix}/{i}">{_sentence(rng, 6)}</a></li>' for i in range(count))
+
+
+def blog(rng: random.Random) -> tuple:
+    """div.post-content, a widget sidebar, and a comment thread nearly as long as the post"""
+    paragraphs = _prose(rng, 14)
+    comments = "".join(
+        f'<div class="comment"><span class="author">{rng.choice(WORDS)}</span><p>{text}</p></div>'
+        for text in _prose(rng, 20, 2)
+    )
+    body = (
+        f'<div class="wrapper"><div class="post"><h1 class="post-title">{_sentence(rng, 7)}</h1>'
+        f'<div class="post-meta">Posted on March 4, 2024</div>'
+        f'<div class="post-content">{"".join(f"<p>{text}</p>" for text in paragraphs)}</div></div>'
+        f'<div class="widget"><h3>Archives</h3><ul>{_links(rng, "archive", 30)}</ul></div>'
+        f'<div id="comments"><h3>20 comments</h3>{comments}</div></div>'
+    )
+    return _page("Blog", body), paragraphs
+
+
+def news(rng: random.Random) -> tuple:
+    """<article> with promo boxes between paragraphs and a byline"""
+    paragraphs = _prose(rng, 18, 3)
+    parts = []
+    for i, text in enumerate(paragraphs):
+        parts.append(f"<p>{text}</p>")
+        if i % 6 == 5:
+            parts.append(f'<div class="related-promo"><h4>Read more</h4><ul>{_links(rng, "story", 3)}</ul></div>')
+    body = (
+        f'<main><article><h1>{_sentence(rng, 9)}</h1><p class="byline">By <a href="/staff/1">Staff</a></p>'
+        f'{"".join(parts)}</article><section class="most-read"><ul>{_links(rng, "popular", 20)}</ul></section></main>'
+    )
+    return _page("News", body), paragraphs
+
+
+def split(rng: random.Random) -> tuple:
+    """The story split across sibling divs, separated by adverts"""
+    paragraphs = _prose(rng, 16)
+    blocks = []
+    for i in range(0, len(paragraphs), 4):
+        blocks.append(f'<div class="story-body">{"".join(f"<p>{text}</p>" for text in paragraphs[i:i + 4])}</div>')
+        blocks.append(f'<div class="advert"><a href="/ad/{i}"><img src="/ad/{i}.png" alt="Advert"></a></div>')
+    body = f'<div class="story"><h1>{_sentence(rng, 8)}</h1>{"".join(blocks)}</div>'
+    return _page("Story", body), paragraphs
+
+
+def div_content(rng: random.Random) -> tuple:
+    """No semantic tags at all: div#content next to a link directory"""
+    paragraphs = _prose(rng, 12, 5)
+    headings = "".join(
+        (f"<h2>{_sentence(rng, 5)}</h2>" if i % 4 == 0 else "") + f"<p>{text}</p>" for i, text in enumerate(paragraphs)
+    )
+    body = (
+        f'<div id="page"><div id="content"><h1>{_sentence(rng, 6)}</h1>{headings}</div>'
+        f'<div id="directory"><ul>{_links(rng, "dir", 120)}</ul></div></div>'
+    )
+    return _page("Page", body), paragraphs
+
+
+def tutorial(rng: random.Random) -> tuple:
+    """A technical post: code blocks, lists and quotes between paragraphs, a table of contents nav"""
+    paragraphs = _prose(rng, 12)
+    parts = []
+    for i, text in enumerate(paragraphs):
+        parts.append(f"<p>{text}</p>")
+        if i % 3 == 1:
+            parts.append(f"<pre><code>{rng.choice(WORDS)} = {rng.randint(0, 99)}</code></pre>")
+        if i % 4 == 2:
+            parts.append(f'<ul>{"".join(f"<li>{_sentence(rng, 5)}</li>" for _ in range(4))}</ul>')
+    toc = f'<nav class="toc"><ol>{_links(rng, "docs", 25)}</ol></nav>'
+    body = f'<div class="layout">{toc}<div class="entry"><h1>{_sentence(rng, 6)}</h1>{"".join(parts)}</div></div>'
+    return _page("Tutorial", body), paragraphs
+
+
+def line_breaks(rng: random.Random) -> tuple:
+    """Old-style markup: the text in one div, paragraphs separated by <br><br>"""
+    paragraphs = _prose(rng, 10, 5)
+    body = (
+        f'<table width="100%"><tr><td class="menu"><ul>{_links(rng, "menu", 15)}</ul></td>'
+        f'<td><div class="text"><b>{_sentence(rng, 6)}</b><br><br>{"<br><br>".join(paragraphs)}</div></td></tr></table>'
+    )
+    return _page("Archive", body), paragraphs
+
+
+def brief(rng: random.Random) -> tuple:
+    """A two-paragraph news brief under a long list of headlines"""
+    paragraphs = _prose(rng, 2, 2)
+    body = (
+        f'<article><h1>{_sentence(rng, 6)}</h1>{"".join(f"<p>{text}</p>" for text in paragraphs)}</article>'
+        f'<div class="headlines"><ul>{_links(rng, "story", 40)}</ul></div>'
+    )
+    return _page("Brief", body), paragraphs
+
+
+ARTICLE_GENERATORS = {
+    "blog": blog,
+    "news": news,
+    "split": split,
+    "div_content": div_content,
+    "tutorial": tutorial,
+    "line_breaks": line_breaks,
+    "brief": brief
+}
+
+
+def build():
+    """(Re)generate every fixture page"""
+    CORPUS_DIR.mkdir(exist_ok=True)
+    for name, generate in GENERATORS.items():
+        (CORPUS_DIR / f"{name}.html").write_text(generate(random.Random(name)), encoding="utf-8")
+    ARTICLES_DIR.mkdir(exist_ok=True)
+    gold = {}
+    for name, generate in ARTICLE_GENERATORS.items():
+        page, gold[name] = generate(random.Random(name))
+        (ARTICLES_DIR / f"{name}.html").write_text(page, encoding="utf-8")
+    (ARTICLES_DIR / "gold.json").write_text(json.dumps(gold, indent=1), encoding="utf-8")
+
+
+def load() -> dict:
+    """Return {name: page bytes} for every saved fixture"""
+    return {path.stem: path.read_bytes() for path in sorted(CORPUS_DIR.glob("*.html"))}
+
+
+def load_articles() -> dict:
+    """Return {name: (page bytes, gold paragraphs)} for every saved article layout"""
+    gold = json.loads((ARTICLES_DIR / "gold.json").read_text(encoding="utf-8"))
+    return {path.stem: (path.read_bytes(), gold[path.stem]) for path in sorted(ARTICLES_DIR.glob("*.html"))}
+
+
+if __name__ == "__main__":
+    build()
+    for name, page in load().items():
+        print(f"{name:<10} {len(page) / 1024:>8.1f} KiB")
+    for name, (page, _) in load_articles().items():
+        print(f"{name:<12} {len(page) / 1024:>6.1f} KiB")
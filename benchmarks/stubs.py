@@ -0,0 +1,274 @@
+"""Local stand-ins for target websites and the AI server used by the benchmarks."""
+import gzip
+import hashlib
+import json
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DEFAULT_PLAN = {
+    "elements": ["text", "images", "links"],
+    "filters": {},
+    "structured_format": "list"
+}
+
+SAMPLE_PAGE = """<html><head><title>Stub page</title>
+<meta property="article:published_time" content="2024-01-15"></head><body>
+<article><h1>Stub article</h1>{paragraphs}</article>
+<ul>{links}</ul>
+<div>{images}</div>
+</body></html>"""
+
+
+def sample_page(paragraphs: int = 20, links: int = 100, images: int = 20) -> str:
+    """Build a moderately sized HTML page"""
+    return SAMPLE_PAGE.format(
+        paragraphs="".join(f"<p>Paragraph {i} with some filler text to score.</p>" for i in range(paragraphs)),
+        links="".join(f'<li><a href="/item/{i}">Item {i}</a></li>' for i in range(links)),
+        images="".join(f'<img src="/img/{i}.jpg" alt="Image {i}">' for i in range(images))
+    )
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def _send(self, body: bytes, content_type: str, status: int = 200, headers: dict = None):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class StubServer:
+    """Serve a socketserver (an HTTP handler class by default) on an ephemeral localhost port"""
+
+    def __init__(self, handler=None, httpd=None, scheme: str = "http", host: str = "127.0.0.1"):
+        self.httpd = httpd or ThreadingHTTPServer((host, 0), handler)
+        self.httpd.daemon_threads = True
+        self.scheme = scheme
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"{self.scheme}://{host}:{port}"
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+def site_server(pages: dict = None, latency: float = 0.0, etags: bool = False, host: str = "127.0.0.1") -> StubServer:
+    """Serve `pages` (path -> HTML); unknown paths get the sample page.
+
+    Other loopback addresses (127.0.0.2, ...) stand in for distinct hosts.
+    """
+    pages = pages or {}
+    default = sample_page().encode()
+
+    class SiteHandler(_Handler):
+        def do_GET(self):
+            time.sleep(latency)
+            page = pages.get(self.path.split("?")[0])
+            body = page.encode() if isinstance(page, str) else (page or default)
+            if not etags:
+                self._send(body, "text/html; charset=utf-8")
+                return
+            etag = '"%s"' % hashlib.md5(body).hexdigest()
+            if self.headers.get("If-None-Match") == etag:
+                self.send_response(304)
+                self.send_header("ETag", etag)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            self._send(body, "text/html; charset=utf-8", headers={"ETag": etag, "Cache-Control": "no-cache"})
+
+    return StubServer(SiteHandler, host=host)
+
+
+def rate_limited_server(rate: float = 20.0, burst: int = 5, retry_after: int = 1,
+                        latency: float = 0.02, capacity: int = 8) -> StubServer:
+    """A site that answers 429 + Retry-After above `rate` requests/s and slows down when overloaded.
+
+    Each request in flight beyond `capacity` adds another `latency` to every
+    response, like a server queueing work. `server.counters` records what it saw.
+    """
+    body = sample_page().encode()
+    lock = threading.Lock()
+    state = {"tokens": float(burst), "refilled": time.monotonic(), "in_flight": 0}
+    counters = {"ok": 0, "throttled": 0, "peak_in_flight": 0}
+
+    class LimitedHandler(_Handler):
+        def do_GET(self):
+            with lock:
+                now = time.monotonic()
+                state["tokens"] = min(burst, state["tokens"] + (now - state["refilled"]) * rate)
+                state["refilled"] = now
+                allowed = state["tokens"] >= 1
+                if allowed:
+                    state["tokens"] -= 1
+                    state["in_flight"] += 1
+                    counters["ok"] += 1
+                    counters["peak_in_flight"] = max(counters["peak_in_flight"], state["in_flight"])
+                    overload = max(0, state["in_flight"] - capacity)
+                else:
+                    counters["throttled"] += 1
+            if not allowed:
+                self._send(b"slow down", "text/plain", 429, {"Retry-After": str(retry_after)})
+                return
+            try:
+                time.sleep(latency * (1 + overload))
+                self._send(body, "text/html; charset=utf-8")
+            finally:
+                with lock:
+                    state["in_flight"] -= 1
+
+    # A deep accept backlog, so bursts queue at the server instead of in SYN retransmits
+    httpd = type("LimitedServer", (ThreadingHTTPServer,), {"request_queue_size": 256})(("127.0.0.1", 0), LimitedHandler)
+    server = StubServer(httpd=httpd)
+    server.counters = counters
+    return server
+
+
+def sized_server() -> StubServer:
+    """Serve /<n> as an HTML page of about n bytes, generated as it streams out"""
+    filler = " ".join(["Filler text for a very long page."] * 120)
+    block = (
+        f'<div class="row"><p>{filler}</p><a href="/item">Item</a> <img src="/i.jpg" alt="i"></div>\n'
+    ).encode()
+    head = b"<!DOCTYPE html><html><head><meta charset=\"utf-8\"><title>Big</title></head><body>\n"
+    tail = b"</body></html>"
+
+    class SizedHandler(_Handler):
+        def do_GET(self):
+            blocks = max(1, int(self.path.strip("/").split("?")[0] or 0) // len(block))
+            self.send_response(200)
+            self.send_header("Content-Type", "text/html; charset=utf-8")
+            self.send_header("Content-Length", str(len(head) + blocks * len(block) + len(tail)))
+            self.end_headers()
+            self.wfile.write(head)
+            batch = block * 64
+            for _ in range(blocks // 64):
+                self.wfile.write(batch)
+            self.wfile.write(block * (blocks % 64))
+            self.wfile.write(tail)
+
+    return StubServer(SizedHandler)
+
+
+def crawl_site_server(posts: int = 300, per_page: int = 10, latency: float = 0.01) -> StubServer:
+    """A blog to crawl: paginated index, posts, tags, robots.txt and a gzipped sitemap index.
+
+    Links include fragments, reordered query strings, images, an off-site
+    host, a /private/ area robots.txt disallows and a URL with a quote that
+    validate_url rejects. `server.counters`
+    records requests per path (query sorted, as the crawler normalizes
+    it) and the peak number in flight.
+    """
+    lock = threading.Lock()
+    counters = {"paths": Counter(), "in_flight": 0, "peak_in_flight": 0}
+    pages = -(-posts // per_page)
+
+    def post(i: int) -> str:
+        related = "".join(f'<li><a href="/blog/post-{(i * 7 + k) % posts + 1}">Related {k}</a></li>' for k in range(3))
+        body = "".join(f"<p>Post {i}, paragraph {k}. " + "Filler text about the topic of this post. " * 6 + "</p>"
+                       for k in range(5))
+        nav = f'<a href="/blog/post-{i + 1}#comments">Next</a>' if i < posts else ""
+        return (f'<html><head><title>Post {i}</title></head><body><nav><a href="/">Home</a></nav>'
+                f'<article><h1>Post {i}</h1>{body}<img src="/img/{i}.jpg" alt="Figure {i}"></article>'
+                f'<ul>{related}</ul>{nav} <a href="/tag/t{i % 5}">Tag</a> '
+                f'<a href="https://elsewhere.example/{i}">Elsewhere</a></body></html>')
+
+    def index(n: int) -> str:
+        first = (n - 1) * per_page + 1
+        items = "".join(f'<li><a href="/blog/post-{i}">Post {i}</a></li>'
+                        for i in range(first, min(posts, first + per_page - 1) + 1))
+        more = f'<a href="/blog/page/{n + 1}?b=2&amp;a=1">Older</a> <a href="/blog/page/{n + 1}?a=1&amp;b=2">Older</a>' \
+            if n < pages else ""
+        return f"<html><body><h1>Page {n}</h1><ul>{items}</ul>{more}</body></html>"
+
+    def route(path: str, host: str):
+        base = f"http://{host}"
+        if path == "/":
+            return ('<html><body><a href="/blog/page/1?a=1&amp;b=2">Blog</a> <a href="/about">About</a> '
+                    '<a href="/private/drafts">Drafts</a> <a href="/img/logo.png">Logo</a> '
+                    '<a href="/blog/post-1#top">Latest</a> <a href="/blog/it\'s-a-trap">Trap</a>'
+                    '</body></html>'), "text/html"
+        if path == "/about":
+            return "<html><body><p>About this blog.</p></body></html>", "text/html"
+        if path.startswith("/blog/page/"):
+            return index(int(path.rsplit("/", 1)[1])), "text/html"
+        if path.startswith("/blog/post-"):
+            return post(int(path.rsplit("-", 1)[1])), "text/html"
+        if path.startswith(("/tag/", "/private/")):
+            return '<html><body><a href="/blog/post-1">Post 1</a></body></html>', "text/html"
+        if path == "/robots.txt":
+            return f"User-agent: *\nDisallow: /private/\nSitemap: {base}/sitemap_index.xml\n", "text/plain"
+        if path == "/sitemap_index.xml":
+            return ('<?xml version="1.0"?><sitemapindex xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">'
+                    f"<sitemap><loc>{base}/sitemap-posts.xml.gz</loc></sitemap>"
+                    f"<sitemap><loc>{base}/sitemap-pages.xml</loc></sitemap></sitemapindex>"), "application/xml"
+        if path == "/sitemap-pages.xml":
+            return ('<?xml version="1.0"?><urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">'
+                    f"<url><loc>{base}/</loc></url><url><loc>{base}/about</loc></url></urlset>"), "application/xml"
+        if path == "/sitemap-posts.xml.gz":
+            urls = "".join(f"<url><loc>{base}/blog/post-{i}</loc><priority>{0.9 if i > posts - 20 else 0.4}</priority></url>"
+                           for i in range(1, posts + 1))
+            xml = f'<?xml version="1.0"?><urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">{urls}</urlset>'
+            return gzip.compress(xml.encode()), "application/gzip"
+        return None, None
+
+    class CrawlHandler(_Handler):
+        def do_GET(self):
+            path, _, query = self.path.partition("?")
+            with lock:
+                counters["paths"][path + ("?" + "&".join(sorted(query.split("&"))) if query else "")] += 1
+                counters["in_flight"] += 1
+                counters["peak_in_flight"] = max(counters["peak_in_flight"], counters["in_flight"])
+            try:
+                time.sleep(latency)
+                body, content_type = route(path, self.headers.get("Host", ""))
+                if body is None:
+                    self._send(b"not found", "text/plain", 404)
+                    return
+                self._send(body.encode() if isinstance(body, str) else body, content_type)
+            finally:
+                with lock:
+                    counters["in_flight"] -= 1
+
+    server = StubServer(CrawlHandler)
+    server.counters = counters
+    return server
+
+
+def ai_server(plan: dict = None, latency: float = 0.0) -> StubServer:
+    """Speak the `/api/v1/generate` protocol, answering every prompt with `plan`"""
+    text = json.dumps(plan or DEFAULT_PLAN)
+
+    class AIHandler(_Handler):
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length", 0))
+            self.rfile.read(length)
+            time.sleep(latency)
+            body = json.dumps({"results": [{"text": text}]}).encode()
+            self._send(body, "application/json")
+
+    return StubServer(AIHandler)
+
+
+def redis_server():
+    """A Redis-protocol stand-in (fakeredis, from benchmarks/requirements.txt) on an ephemeral port, for RedisStore runs"""
+    from fakeredis import TcpFakeServer
+
+    return StubServer(httpd=TcpFakeServer(("127.0.0.1", 0)), scheme="redis")
@@ -0,0 +1,158 @@
+"""Reproducible benchmark suite: per-extractor timings, /generate load and peak memory.
+
+Everything runs offline: the saved corpus (benchmarks/corpus/) is served
+by a local fixture server, and a stub speaks the AI_SERVER_URL
+/api/v1/generate protocol with a configurable latency. Results are written
+as JSON together with the commit they were measured on; pass --compare to
+print the change against an earlier run.
+
+Usage: python -m benchmarks.suite [--out bench.json] [--compare old.json]
+       [--repeat 5] [--requests 64] [--levels 1 4 16] [--site-latency 0] [--ai-latency 0.2]
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import resource
+import statistics
+import subprocess
+import time
+
+from backend import metrics
+from backend.scraper import parse_page
+from benchmarks import corpus
+from benchmarks.bench_generate import _free_port, _run_level, _start_backend
+from benchmarks.bench_parse import _peak_rss
+from benchmarks.stubs import ai_server, site_server
+
+# Every extractor, so each one shows up as a parse.* stage
+PLAN = {
+    "elements": ["text", "images", "tables", "links"],
+    "filters": {"include_selectors": ["h3 a", ".price"]},
+    "structured_format": "list"
+}
+
+
+def _commit() -> str:
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True)
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], capture_output=True, text=True)
+        return out.stdout.strip() + ("-dirty" if dirty.stdout.strip() else "")
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def extractors(pages: dict, repeat: int) -> dict:
+    """Median milliseconds per parse_page stage for every corpus page"""
+    results = {}
+    for name, page in pages.items():
+        runs = []
+        for _ in range(repeat):
+            trace = metrics.start_trace()
+            start = time.perf_counter()
+            parse_page("https://example.com/", page, "utf-8", 200, PLAN)
+            total = (time.perf_counter() - start) * 1000
+            runs.append({**metrics.trace_summary(trace), "total": total})
+        stages = {stage: round(statistics.median(run.get(stage, 0.0) for run in runs), 3) for stage in runs[0]}
+        results[name] = {
+            "bytes": len(page),
+            "ms": stages,
+            "peak_rss_kib": _peak_rss("after", page)
+        }
+    return results
+
+
+def generate(pages: dict, levels: list, requests: int, site_latency: float, ai_latency: float) -> list:
+    """End-to-end /generate throughput and latency percentiles at each concurrency level"""
+    served = {f"/{name}.html": page for name, page in pages.items()}
+    with site_server(served, latency=site_latency) as site, ai_server(latency=ai_latency) as ai:
+        from backend import ai_interpreter
+        os.environ["AI_SERVER_URL"] = ai.url
+        ai_interpreter.AI_SERVER_URL = ai.url
+
+        port = _free_port()
+        server = _start_backend(port)
+        rows = []
+        try:
+            for level in levels:
+                row = asyncio.run(_run_level(f"http://127.0.0.1:{port}", site.url, level, requests, list(served)))
+                # The backend runs in-process, so this is the server's high-water mark so far
+                row["peak_rss_mib"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+                rows.append(row)
+        finally:
+            server.should_exit = True
+    return rows
+
+
+def _flat(results: dict) -> dict:
+    """{metric path: value} for the numbers worth comparing across runs"""
+    flat = {}
+    for page, row in results["extractors"].items():
+        for stage, ms in row["ms"].items():
+            flat[f"extractors.{page}.{stage}_ms"] = ms
+        flat[f"extractors.{page}.peak_rss_kib"] = row["peak_rss_kib"]
+    for row in results["generate"]:
+        for key in ("throughput_rps", "p50_ms", "p90_ms", "p99_ms", "peak_rss_mib"):
+            flat[f"generate.c{row['concurrency']}.{key}"] = row[key]
+    return flat
+
+
+def compare(old: dict, new: dict):
+    before, after = _flat(old), _flat(new)
+    print(f"\n{old['commit']} -> {new['commit']}")
+    print(f"{'metric':<44} {'before':>10} {'after':>10} {'change':>8}")
+    for key, value in after.items():
+        if key not in before:
+            continue
+        change = f"{value / before[key] - 1:+.0%}" if before[key] else "n/a"
+        print(f"{key:<44} {before[key]:>10.2f} {value:>10.2f} {change:>8}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--out", default="bench.json", help="where to write the JSON results")
+    parser.add_argument("--compare", help="earlier JSON results to compare against")
+    parser.add_argument("--pages", nargs="+", help="corpus pages to use (default: all)")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--requests", type=int, default=64, help="/generate calls per concurrency level")
+    parser.add_argument("--levels", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--site-latency", type=float, default=0.0, help="fixture server latency in seconds")
+    parser.add_argument("--ai-latency", type=float, default=0.2, help="stub AI server latency in seconds")
+    args = parser.parse_args()
+
+    pages = corpus.load()
+    if args.pages:
+        pages = {name: pages[name] for name in args.pages}
+
+    results = {
+        "commit": _commit(),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "cpus": os.cpu_count(),
+        "config": {k: v for k, v in vars(args).items() if k not in ("out", "compare")},
+        "extractors": extractors(pages, args.repeat),
+        "generate": generate(pages, args.levels, args.requests, args.site_latency, args.ai_latency)
+    }
+
+    print(f"{'page':<10} {'KiB':>7} {'total ms':>9} {'peak KiB':>9}  slowest stages")
+    for name, row in results["extractors"].items():
+        stages = sorted(((ms, stage) for stage, ms in row["ms"].items() if stage != "total"), reverse=True)[:3]
+        slowest = ", ".join(f"{stage} {ms:.1f}" for ms, stage in stages)
+        print(f"{name:<10} {row['bytes'] / 1024:>7.0f} {row['ms']['total']:>9.1f} {row['peak_rss_kib']:>9}  {slowest}")
+    print(f"\n{'conc':>5} {'rps':>8} {'p50 ms':>8} {'p90 ms':>8} {'p99 ms':>8} {'RSS MiB':>8}")
+    for row in results["generate"]:
+        print(f"{row['concurrency']:>5} {row['throughput_rps']:>8.2f} {row['p50_ms']:>8.1f} "
+              f"{row['p90_ms']:>8.1f} {row['p99_ms']:>8.1f} {row['peak_rss_mib']:>8.1f}")
+
+    with open(args.out, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"\nwrote {args.out}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(json.load(f), results)
+
+
+if __name__ == "__main__":
+    main()